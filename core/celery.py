@@ -1,6 +1,8 @@
 # core/celery.py
 import os
+import time
 from celery import Celery
+from celery.signals import before_task_publish, task_postrun, task_prerun, worker_process_shutdown
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
@@ -10,4 +12,70 @@ app.autodiscover_tasks()
 
 # FORCE SOLO ON WINDOWS
 if os.name == 'nt':
-    app.conf.worker_pool = 'solo'
\ No newline at end of file
+    app.conf.worker_pool = 'solo'
+
+
+@worker_process_shutdown.connect
+def close_scan_sessions(**kwargs):
+    # Release the keep-alive pools held by scanner_tasks.sessions
+    from scanner.scanner_tasks.sessions import close_sessions
+    close_sessions()
+
+
+@worker_process_shutdown.connect
+def kill_scan_tools(**kwargs):
+    # Don't leave nmap/nikto process groups running after the worker exits
+    from scanner.scanner_tasks.sandbox import kill_all_tools
+    kill_all_tools()
+
+
+@worker_process_shutdown.connect
+def flush_scan_metrics(**kwargs):
+    # Don't lose the last few seconds of counters (scanner_tasks.metrics flushes on a timer)
+    from scanner.scanner_tasks import metrics
+    metrics.flush()
+
+
+@worker_process_shutdown.connect
+def flush_scan_traces(**kwargs):
+    # Same for the spans still waiting on scanner_tasks.tracing's exporter
+    from scanner.scanner_tasks import tracing
+    tracing.flush()
+
+
+@worker_process_shutdown.connect
+def flush_scan_updates(**kwargs):
+    # And the WebSocket messages still queued in scanner_tasks.publisher, e.g. a scan's final update
+    from scanner.scanner_tasks import publisher
+    publisher.flush(timeout=5)
+
+
+@before_task_publish.connect
+def stamp_published_at(headers=None, **kwargs):
+    # Lets the worker measure how long the task sat in its queue, and continue the sender's trace
+    if headers is not None:
+        from scanner.scanner_tasks import tracing
+        headers['published_at'] = time.time()
+        if tracing.current():
+            headers['traceparent'] = tracing.current().traceparent
+
+
+@task_prerun.connect
+def observe_task_wait(task=None, **kwargs):
+    published_at = task.request.get('published_at')
+    if published_at:  # not set for eager calls
+        from scanner.scanner_tasks import metrics
+        queue = (task.request.delivery_info or {}).get('routing_key') or 'celery'
+        metrics.observe('celery_task_wait_seconds', max(time.time() - published_at, 0), task=task.name, queue=queue)
+
+
+@task_prerun.connect
+def start_task_span(task=None, **kwargs):
+    from scanner.scanner_tasks import tracing
+    tracing.task_started(task)
+
+
+@task_postrun.connect
+def end_task_span(task=None, state=None, **kwargs):
+    from scanner.scanner_tasks import tracing
+    tracing.task_finished(task, state)
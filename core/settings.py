@@ -253,6 +253,103 @@ CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', f"{REDIS_URL}/0")
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 
+# ========================= SCANNER =========================
+# "sequential" runs checks one after another, "threaded" runs them on a bounded pool per tier,
+# "async" runs them on the worker's shared event loop (pair with `celery worker --pool threads`
+# so one process can drive many scans at once), "fanout" splits them into Celery subtasks by
+# cost class and merges the results in a chord callback
+SCAN_EXECUTION_MODE = os.getenv('SCAN_EXECUTION_MODE', 'threaded')
+SCAN_TIER_CONCURRENCY = {
+    'free': int(os.getenv('SCAN_CONCURRENCY_FREE', 4)),
+    'pro': int(os.getenv('SCAN_CONCURRENCY_PRO', 6)),
+    'enterprise': int(os.getenv('SCAN_CONCURRENCY_ENTERPRISE', 8)),
+}
+# nmap/nikto run only on this queue, under rlimits (see scanner_tasks/sandbox.py). Empty when no heavy
+# worker is deployed: they then run in the scan's own task (fanout: on the default queue)
+SCAN_HEAVY_QUEUE = os.getenv('SCAN_HEAVY_QUEUE', 'heavy')
+SCAN_TOOL_CPU_SECONDS = int(os.getenv('SCAN_TOOL_CPU_SECONDS', 300))
+SCAN_TOOL_MEMORY_MB = int(os.getenv('SCAN_TOOL_MEMORY_MB', 512))
+# Reachability preflight connect timeout (s) and connection failures before a host's breaker trips
+SCAN_PREFLIGHT_TIMEOUT = float(os.getenv('SCAN_PREFLIGHT_TIMEOUT', 3))
+SCAN_BREAKER_THRESHOLD = int(os.getenv('SCAN_BREAKER_THRESHOLD', 3))
+# Cross-scan result cache (scanner_tasks/result_cache.py): default TTLs (s) for cheap checks and nmap/nikto
+SCAN_RESULT_CACHE = os.getenv('SCAN_RESULT_CACHE', 'True') == 'True'
+SCAN_RESULT_CACHE_TTL = int(os.getenv('SCAN_RESULT_CACHE_TTL', 60 * 15))
+SCAN_RESULT_CACHE_HEAVY_TTL = int(os.getenv('SCAN_RESULT_CACHE_HEAVY_TTL', 60 * 60 * 24))
+# Incremental re-scans: carry forward checks whose HTTP inputs are unchanged, re-evaluating after N days anyway
+SCAN_INCREMENTAL = os.getenv('SCAN_INCREMENTAL', 'True') == 'True'
+SCAN_INCREMENTAL_MAX_AGE_DAYS = int(os.getenv('SCAN_INCREMENTAL_MAX_AGE_DAYS', 7))
+# Portfolio (batch) scans: domains a firm may have queued or running in batches, per tier (0: no
+# bulk scans on that plan), and batch scans running at once across all firms
+SCAN_BATCH_MAX_DOMAINS = {
+    'free': int(os.getenv('SCAN_BATCH_MAX_DOMAINS_FREE', 0)),
+    'pro': int(os.getenv('SCAN_BATCH_MAX_DOMAINS_PRO', 0)),
+    'enterprise': int(os.getenv('SCAN_BATCH_MAX_DOMAINS', 500)),
+}
+SCAN_BATCH_MAX_INFLIGHT = int(os.getenv('SCAN_BATCH_MAX_INFLIGHT', 20))
+# A batch scan still RUNNING this long (s) after it started is presumed lost with its worker and gives up its slot
+SCAN_BATCH_STALE_AFTER = int(os.getenv('SCAN_BATCH_STALE_AFTER', 60 * 60 * 2))
+# Outbound politeness (scanner_tasks/limiter.py): requests/s and burst per target host, cluster-wide
+# requests/s per tier, and total in-flight requests across every worker; waits give up after MAX_WAIT s
+SCAN_LIMITER = os.getenv('SCAN_LIMITER', 'True') == 'True'
+SCAN_LIMITER_REDIS_URL = os.getenv('SCAN_LIMITER_REDIS_URL', REDIS_URL)
+SCAN_HOST_RATE = float(os.getenv('SCAN_HOST_RATE', 5))
+SCAN_HOST_BURST = int(os.getenv('SCAN_HOST_BURST', 10))
+SCAN_TIER_RATE = {
+    'free': float(os.getenv('SCAN_TIER_RATE_FREE', 20)),
+    'pro': float(os.getenv('SCAN_TIER_RATE_PRO', 50)),
+    'enterprise': float(os.getenv('SCAN_TIER_RATE_ENTERPRISE', 100)),
+}
+SCAN_MAX_INFLIGHT = int(os.getenv('SCAN_MAX_INFLIGHT', 200))
+SCAN_LIMITER_MAX_WAIT = float(os.getenv('SCAN_LIMITER_MAX_WAIT', 30))
+# Worker DNS cache: answers kept for their TTL clamped to MIN..MAX s, failures for NEGATIVE_TTL s
+SCAN_DNS_TIMEOUT = float(os.getenv('SCAN_DNS_TIMEOUT', 3))
+SCAN_DNS_MIN_TTL = int(os.getenv('SCAN_DNS_MIN_TTL', 30))
+SCAN_DNS_MAX_TTL = int(os.getenv('SCAN_DNS_MAX_TTL', 3600))
+SCAN_DNS_NEGATIVE_TTL = int(os.getenv('SCAN_DNS_NEGATIVE_TTL', 30))
+# Largest response body a check may read (bytes); the rest of the page is never downloaded
+SCAN_MAX_BODY_BYTES = int(os.getenv('SCAN_MAX_BODY_BYTES', 2 * 1024 * 1024))
+# HTML parser for scanned pages: auto (selectolax > lxml > html.parser, whichever is installed) or one of those
+SCAN_HTML_BACKEND = os.getenv('SCAN_HTML_BACKEND', 'auto')
+# Link discovery: footer hub pages ("Legal", "Policies") followed when the homepage lacks a link
+SCAN_LINK_HUB_PAGES = int(os.getenv('SCAN_LINK_HUB_PAGES', 2))
+# Site crawl (scanner_tasks/crawler.py): pages and link depth per tier (1 page = homepage only),
+# and page fetches in flight per scan, each still under the per-host rate above
+SCAN_CRAWL_MAX_PAGES = {
+    'free': int(os.getenv('SCAN_CRAWL_PAGES_FREE', 1)),
+    'pro': int(os.getenv('SCAN_CRAWL_PAGES_PRO', 25)),
+    'enterprise': int(os.getenv('SCAN_CRAWL_PAGES_ENTERPRISE', 200)),
+}
+SCAN_CRAWL_MAX_DEPTH = {
+    'free': int(os.getenv('SCAN_CRAWL_DEPTH_FREE', 0)),
+    'pro': int(os.getenv('SCAN_CRAWL_DEPTH_PRO', 2)),
+    'enterprise': int(os.getenv('SCAN_CRAWL_DEPTH_ENTERPRISE', 3)),
+}
+SCAN_CRAWL_CONCURRENCY = int(os.getenv('SCAN_CRAWL_CONCURRENCY', 4))
+# Live scan progress (scanner_tasks/progress.py): row writes and WebSocket updates, at most one per interval (s)
+SCAN_PROGRESS_SAVE_INTERVAL = float(os.getenv('SCAN_PROGRESS_SAVE_INTERVAL', 2))
+SCAN_PROGRESS_SEND_INTERVAL = float(os.getenv('SCAN_PROGRESS_SEND_INTERVAL', 0.5))
+# Worker WebSocket publisher (scanner_tasks/publisher.py): messages waiting before new ones are dropped,
+# messages per batch, and the timeout (s) of one channel-layer send
+SCAN_WS_QUEUE_SIZE = int(os.getenv('SCAN_WS_QUEUE_SIZE', 1000))
+SCAN_WS_BATCH_SIZE = int(os.getenv('SCAN_WS_BATCH_SIZE', 100))
+SCAN_WS_SEND_TIMEOUT = float(os.getenv('SCAN_WS_SEND_TIMEOUT', 5))
+# Prometheus metrics (scanner_tasks/metrics.py): Redis the per-process counters are summed in, seconds
+# between flushes, and the bearer token a scraper sends to /scanner/metrics/ (unset: staff sessions only)
+SCAN_METRICS_REDIS_URL = os.getenv('SCAN_METRICS_REDIS_URL', REDIS_URL)
+SCAN_METRICS_FLUSH_INTERVAL = float(os.getenv('SCAN_METRICS_FLUSH_INTERVAL', 10))
+SCAN_METRICS_TOKEN = os.getenv('SCAN_METRICS_TOKEN', '')
+# Scan tracing (scanner_tasks/tracing.py): spans kept in Redis for the trace page (TTL in s), and
+# optionally appended to a JSONL file and/or POSTed to an OTLP/HTTP collector (e.g. http://otel:4318/v1/traces)
+SCAN_TRACING = os.getenv('SCAN_TRACING', 'True') == 'True'
+SCAN_TRACE_REDIS_URL = os.getenv('SCAN_TRACE_REDIS_URL', REDIS_URL)
+SCAN_TRACE_TTL = int(os.getenv('SCAN_TRACE_TTL', 60 * 60 * 24 * 3))
+SCAN_TRACE_FILE = os.getenv('SCAN_TRACE_FILE', '')
+SCAN_TRACE_OTLP_ENDPOINT = os.getenv('SCAN_TRACE_OTLP_ENDPOINT', '')
+# Keep-alive pools owned by each worker process: hosts kept warm, connections per host
+SCAN_HTTP_POOL_HOSTS = int(os.getenv('SCAN_HTTP_POOL_HOSTS', 50))
+SCAN_HTTP_POOL_SIZE = int(os.getenv('SCAN_HTTP_POOL_SIZE', 20))
+
 # ========================= DEFAULT AUTO FIELD =========================
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -2,6 +2,7 @@
 
 import os
 import json
+import time
 from django.db import models
 from django.utils import timezone
 from django.core.serializers.json import DjangoJSONEncoder
@@ -11,6 +12,39 @@ from django.template.loader import render_to_string
 from weasyprint import HTML
 from django.conf import settings
 from django.utils.html import strip_tags
+from scanner.scanner_tasks.clauses import ClauseSet
+from scanner.scanner_tasks import metrics, tracing
+
+# Keyword -> GDPR articles for map_gdpr_articles(). Extend as needed: the keywords are
+# compiled into one matcher, so a finding's title is scanned once however long this gets.
+GDPR_MAP = {
+    "lawful basis": ["Article 6"],
+    "consent": ["Article 6", "Article 7"],
+    "data subject": ["Article 12", "Article 15"],
+    "access": ["Article 15"],
+    "portability": ["Article 20"],
+    "erasure": ["Article 17"],
+    "right to be forgotten": ["Article 17"],
+    "security": ["Article 32"],
+    "breach": ["Article 33", "Article 34"],
+    "processor": ["Article 28"],
+    "processor agreement": ["Article 28"],
+    "data protection": ["Article 24", "Article 32"],
+    "privacy policy": ["Article 12", "Article 13"],
+    "cookie": ["Article 7", "Recital 30"],
+    "tracking": ["Article 6", "Recital 30"],
+    "consent banner": ["Article 7"],
+    "child": ["Article 8"],
+    "minimisation": ["Article 5"],
+    "retention": ["Article 5"],
+    "encryption": ["Article 32"],
+    "mfa": ["Article 32"],
+    "incident response": ["Article 33"],
+    "dsar": ["Article 15", "Article 12"],
+    "data subject access": ["Article 15"],
+}
+GDPR_CLAUSES = ClauseSet({keyword: (keyword,) for keyword in GDPR_MAP})
+
 
 class ComplianceReport(models.Model):
     """
@@ -65,43 +99,11 @@ class ComplianceReport(models.Model):
         if findings is None:
             findings = self.findings
 
-        # Simple keyword -> GDPR article mapping. Extend as needed.
-        gdpr_map = {
-            "lawful basis": ["Article 6"],
-            "consent": ["Article 6", "Article 7"],
-            "data subject": ["Article 12", "Article 15"],
-            "access": ["Article 15"],
-            "portability": ["Article 20"],
-            "erasure": ["Article 17"],
-            "right to be forgotten": ["Article 17"],
-            "security": ["Article 32"],
-            "breach": ["Article 33", "Article 34"],
-            "processor": ["Article 28"],
-            "processor agreement": ["Article 28"],
-            "data protection": ["Article 24", "Article 32"],
-            "privacy policy": ["Article 12", "Article 13"],
-            "cookie": ["Article 7", "Recital 30"],
-            "tracking": ["Article 6", "Recital 30"],
-            "consent banner": ["Article 7"],
-            "child": ["Article 8"],
-            "minimisation": ["Article 5"],
-            "retention": ["Article 5"],
-            "encryption": ["Article 32"],
-            "mfa": ["Article 32"],
-            "incident response": ["Article 33"],
-            "dsar": ["Article 15", "Article 12"],
-            "data subject access": ["Article 15"],
-        }
-
         # Normalize and map
         updated = []
         for f in findings:
             title = (f.get('title') or f.get('description') or "").lower()
-            gdpr_articles = set()
-            for kw, arts in gdpr_map.items():
-                if kw in title:
-                    for a in arts:
-                        gdpr_articles.add(a)
+            gdpr_articles = {a for match in GDPR_CLAUSES.scan(title) for a in GDPR_MAP[match.clause]}
             if not gdpr_articles:
                 # fallback: category based mapping
                 cat = (f.get('category') or "").lower()
@@ -280,6 +282,7 @@ class ComplianceReport(models.Model):
     # ------------------------------------------------------------------ #
     # PDF generator (passes the new computed fields to template)
     # ------------------------------------------------------------------ #
+    @tracing.traced("ComplianceReport.generate_pdf")
     def generate_pdf(self, request=None):
         """
         Generate PDF using reports/pdf_template.html and store into pdf_file.
@@ -320,7 +323,12 @@ class ComplianceReport(models.Model):
 
         base_url = request.build_absolute_uri('/') if request else settings.MEDIA_ROOT
 
-        pdf_bytes = HTML(string=html_string, base_url=base_url).write_pdf()
+        started = time.perf_counter()
+        with tracing.span("write_pdf", stage="render") as span:
+            pdf_bytes = HTML(string=html_string, base_url=base_url).write_pdf()
+            span.set(bytes=len(pdf_bytes))
+        metrics.observe("pdf_render_seconds", time.perf_counter() - started, source="report")
+        metrics.observe("pdf_size_bytes", len(pdf_bytes), source="report")
 
         filename = f"report_{self.pk}_{self.scan.domain}.pdf"
         self.pdf_file.save(filename, ContentFile(pdf_bytes), save=True)
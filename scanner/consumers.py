@@ -51,6 +51,7 @@ class ScanProgressConsumer(WebsocketConsumer):
 import json
 from channels.generic.websocket import WebsocketConsumer
 from asgiref.sync import async_to_sync
+from .scanner_tasks import metrics
 
 class ScanProgressConsumer(WebsocketConsumer):
     def connect(self):
@@ -62,12 +63,14 @@ class ScanProgressConsumer(WebsocketConsumer):
             self.channel_name
         )
         self.accept()
+        metrics.inc("websocket_connections", consumer="scan")
 
     def disconnect(self, close_code):
         async_to_sync(self.channel_layer.group_discard)(
             self.room_group_name,
             self.channel_name
         )
+        metrics.inc("websocket_connections", -1, consumer="scan")
 
     def scan_update(self, event):
         self.send(text_data=json.dumps({
@@ -98,6 +101,7 @@ class NotificationConsumer(WebsocketConsumer):
                 self.channel_name
             )
             self.accept()
+            metrics.inc("websocket_connections", consumer="notifications")
 
     def disconnect(self, close_code):
         if not self.scope["user"].is_anonymous:
@@ -105,6 +109,7 @@ class NotificationConsumer(WebsocketConsumer):
                 self.room_name,
                 self.channel_name
             )
+            metrics.inc("websocket_connections", -1, consumer="notifications")
 
     def scan_notification(self, event):
         self.send(text_data=json.dumps({
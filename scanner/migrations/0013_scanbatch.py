@@ -0,0 +1,43 @@
+# Generated by Django 5.1.1 on 2026-10-18 10:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0012_alter_scanresult_status'),
+        ('users', '0008_alter_firmprofile_subscription_tier'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, default='', max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('status', models.CharField(choices=[('PENDING', 'PENDING'), ('RUNNING', 'RUNNING'), ('COMPLETED', 'COMPLETED')], default='PENDING', max_length=10)),
+                ('firm', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scan_batches', to='users.firmprofile')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='scanresult',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='scans', to='scanner.scanbatch'),
+        ),
+        migrations.AddIndex(
+            model_name='scanbatch',
+            index=models.Index(fields=['firm', 'created_at'], name='scanner_sca_firm_id_101c1a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scanbatch',
+            index=models.Index(fields=['status'], name='scanner_sca_status_690f2d_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0013_scanbatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanresult',
+            name='profile',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0014_scanresult_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanresult',
+            name='trace_id',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
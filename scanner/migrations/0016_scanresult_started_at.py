@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanner', '0015_scanresult_trace_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanresult',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -11,6 +11,45 @@ import json
 import uuid
 
 
+class ScanBatch(models.Model):
+    """A portfolio of domains submitted together; its scans are fed to the workers by pump_batches."""
+    STATUS_CHOICES = [
+        ("PENDING", "PENDING"),
+        ("RUNNING", "RUNNING"),
+        ("COMPLETED", "COMPLETED"),
+    ]
+
+    firm = models.ForeignKey(FirmProfile, on_delete=models.CASCADE, related_name="scan_batches")
+    name = models.CharField(max_length=200, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    total = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="PENDING")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["firm", "created_at"]),
+            models.Index(fields=["status"]),
+        ]
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Batch {self.pk} – {self.name or self.total} – {self.status}"
+
+    def aggregate_progress(self):
+        """Per-status counts plus overall progress (0–100) across the batch's scans."""
+        counts = dict(
+            self.scans.values_list("status").annotate(n=models.Count("id")).order_by()
+        )
+        summary = {status.lower(): counts.get(status, 0) for status, _ in ScanResult.STATUS_CHOICES}
+        finished = summary["completed"] + summary["failed"] + summary["cancelled"]
+        running = self.scans.filter(status="RUNNING").aggregate(p=models.Sum("progress"))["p"] or 0
+        summary["total"] = self.total
+        summary["finished"] = finished
+        summary["progress"] = int((finished * 100 + running) / self.total) if self.total else 100
+        return summary
+
+
 class ScanResult(models.Model):
     STATUS_CHOICES = [
         ("PENDING", "PENDING"),
@@ -21,8 +60,10 @@ class ScanResult(models.Model):
     ]
 
     firm = models.ForeignKey(FirmProfile, on_delete=models.CASCADE, related_name="scans")
+    batch = models.ForeignKey(ScanBatch, on_delete=models.SET_NULL, null=True, blank=True, related_name="scans")
     domain = models.CharField(max_length=255)
     scan_date = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)  # last set RUNNING; batch scans stale after SCAN_BATCH_STALE_AFTER
     completed_at = models.DateTimeField(null=True, blank=True)
 
     # Progress
@@ -41,6 +82,10 @@ class ScanResult(models.Model):
     anomaly_score = models.FloatField(null=True, blank=True)
 
     scan_log = EncryptedTextField(blank=True)
+    # Per-check timings and traffic (scanner_tasks/profiling.py); staff only
+    profile = models.JSONField(default=dict, blank=True)
+    # Trace of the scan (scanner_tasks/tracing.py): StartScanView → Celery → checks → PDF; staff only
+    trace_id = models.CharField(max_length=32, blank=True, default="")
     pdf_report_path = models.CharField(max_length=500, null=True, blank=True)
 
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="PENDING")
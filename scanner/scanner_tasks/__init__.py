@@ -1,6 +1,9 @@
 # scanner/scanner_tasks/__init__.py
 # This can be empty, or you can expose things like:
 __all__ = [
-    "helpers", "gdpr", "owasp", "encryption", "hipaa", "iso27001",
+    "helpers", "context", "cancel", "aio", "publisher", "progress", "profiling", "metrics", "tracing", "sessions", "limiter",
+    "resolver", "parsing", "clauses", "links", "crawler", "registry", "sandbox", "preflight",
+    "result_cache", "incremental", "runner",
+    "gdpr", "owasp", "encryption", "hipaa", "iso27001",
     "pcidss", "soc2", "cis", "nist"
-]
\ No newline at end of file
+]
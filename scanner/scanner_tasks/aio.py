@@ -0,0 +1,26 @@
+# scanner_tasks/aio.py
+
+import asyncio
+import threading
+
+_loop = None
+_lock = threading.Lock()
+
+
+def engine_loop() -> asyncio.AbstractEventLoop:
+    """Event loop shared by every scan in this worker process, run on a daemon thread."""
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="scan-engine", daemon=True).start()
+    return _loop
+
+
+def submit(coro):
+    """Schedule coro on the engine loop from any other thread; returns a concurrent Future."""
+    return asyncio.run_coroutine_threadsafe(coro, engine_loop())
+
+
+def run_sync(coro):
+    return submit(coro).result()
@@ -0,0 +1,23 @@
+# scanner_tasks/cancel.py
+
+# Cancellation channel between CancelScanView and running scans. A Redis flag
+# (through the Django cache) is cheap enough to poll between every check.
+
+from django.core.cache import cache
+
+CANCEL_TTL = 60 * 60 * 6
+
+
+def _key(scan_id) -> str:
+    return f"scan:{scan_id}:cancelled"
+
+
+def request_cancel(scan_id):
+    cache.set(_key(scan_id), 1, timeout=CANCEL_TTL)
+
+
+def is_cancelled(scan_id) -> bool:
+    try:
+        return bool(cache.get(_key(scan_id)))
+    except Exception:
+        return False  # cache down: keep scanning rather than crash
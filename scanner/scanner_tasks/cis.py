@@ -1,6 +1,10 @@
 # scanner_tasks/cis.py
 
-def check_cis_benchmark_1_4(domain: str):
+from .context import ScanContext
+from .registry import check_meta
+
+@check_meta(network=False)
+def check_cis_benchmark_1_4(domain: str, ctx: ScanContext | None = None):
     return {
         "title": "Account Lockout (CIS)",
         "status": "warn",
@@ -0,0 +1,151 @@
+# scanner_tasks/clauses.py
+
+# Multi-keyword text matching shared by link discovery (links.py), the policy-text
+# checks and report article mapping. Keyword groups ("clauses") are compiled once,
+# at import, into one Aho-Corasick automaton; a document is then scanned in a
+# single pass whatever the number of rules, and every hit comes back with its
+# offsets so results can quote the sentence that satisfied them.
+# Uses pyahocorasick (C) when installed, a pure-Python automaton otherwise.
+
+from collections import defaultdict, deque
+from dataclasses import dataclass
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+class Automaton:
+    """Aho-Corasick over a fixed keyword set: finditer() reports every occurrence of every keyword."""
+
+    def __init__(self, keywords):
+        self.keywords = tuple(dict.fromkeys(keywords))
+        if ahocorasick is not None:
+            self._native = ahocorasick.Automaton()
+            for idx, keyword in enumerate(self.keywords):
+                self._native.add_word(keyword, idx)
+            self._native.make_automaton()
+            return
+
+        self._native = None
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for idx, keyword in enumerate(self.keywords):
+            state = 0
+            for ch in keyword:
+                if ch not in self._goto[state]:
+                    self._goto[state][ch] = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = self._goto[state][ch]
+            self._out[state] += (idx,)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def finditer(self, text: str):
+        """(start, end, keyword) for every occurrence, in order of end offset."""
+        if not self.keywords or not text:
+            return
+        if self._native is not None:
+            for last, idx in self._native.iter(text):
+                keyword = self.keywords[idx]
+                yield last - len(keyword) + 1, last + 1, keyword
+            return
+        goto, fail, out, state = self._goto, self._fail, self._out, 0
+        for pos, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for idx in out[state]:
+                keyword = self.keywords[idx]
+                yield pos - len(keyword) + 1, pos + 1, keyword
+
+    def findall(self, text: str) -> set:
+        return {keyword for _, _, keyword in self.finditer(text)}
+
+
+@dataclass(frozen=True)
+class Match:
+    clause: str
+    keyword: str
+    start: int
+    end: int
+
+
+class Matches:
+    """Clauses found in one document; cheap to query any number of times."""
+
+    def __init__(self, text: str, matches):
+        self.text = text
+        self._by_clause = defaultdict(list)
+        for match in matches:
+            self._by_clause[match.clause].append(match)
+
+    def __contains__(self, clause: str) -> bool:
+        return clause in self._by_clause
+
+    def __iter__(self):
+        for matches in self._by_clause.values():
+            yield from matches
+
+    def get(self, clause: str) -> list:
+        return self._by_clause.get(clause, [])
+
+    def keywords(self, clause: str) -> set:
+        return {match.keyword for match in self.get(clause)}
+
+    def snippet(self, clause: str, width: int = 80) -> str | None:
+        """The text around the first match of clause, whitespace collapsed; None if it didn't match."""
+        matches = self.get(clause)
+        if not matches:
+            return None
+        first = min(matches, key=lambda m: m.start)
+        pad = max(width - (first.end - first.start), 0) // 2
+        start, end = max(first.start - pad, 0), min(first.end + pad, len(self.text))
+        snippet = " ".join(self.text[start:end].split())
+        return f"{'…' if start else ''}{snippet}{'…' if end < len(self.text) else ''}"
+
+
+class ClauseSet:
+    """Named keyword groups compiled into one automaton. Keywords are matched lowercase, as substrings."""
+
+    def __init__(self, clauses: dict):
+        self.clauses = {name: tuple(k.lower() for k in keywords) for name, keywords in clauses.items()}
+        self._owners = defaultdict(list)  # keyword -> clauses listing it
+        for name, keywords in self.clauses.items():
+            for keyword in keywords:
+                self._owners[keyword].append(name)
+        self._automaton = Automaton(self._owners)
+
+    def scan(self, text: str) -> Matches:
+        """Every clause occurrence in text, in one pass. text should already be lowercased."""
+        return Matches(text, (
+            Match(clause, keyword, start, end)
+            for start, end, keyword in self._automaton.finditer(text)
+            for clause in self._owners[keyword]
+        ))
+
+
+# Clauses the policy-text checks look for; one scan of a page answers all of them
+POLICY = ClauseSet({
+    "gdpr.dsar": ("dsar", "data subject access request"),
+    "gdpr.dpia": ("dpia", "data protection impact assessment"),
+    "gdpr.retention": ("retention period", "data will be deleted"),
+    "gdpr.dpo": ("data protection officer", "dpo"),
+    "gdpr.terms": ("gdpr", "controller", "erase", "dpo"),
+    "ccpa": ("ccpa", "california"),
+    "auth.mfa": ("mfa", "2fa", "two-factor"),
+    "iso.registration": ("registration",),
+})
@@ -0,0 +1,574 @@
+# scanner_tasks/context.py
+
+import asyncio
+import contextvars
+import hashlib
+import ssl
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+import httpx
+import requests
+import urllib3
+from bs4 import BeautifulSoup
+from django.conf import settings
+from .sessions import get_session, get_async_client
+from . import limiter, parsing, profiling, resolver, tracing
+from .clauses import POLICY, Matches
+from .cancel import is_cancelled
+
+# Failures to open a connection at all, the only ones that count towards a host's circuit breaker.
+# A certificate that doesn't verify, a read timeout or a dropped connection mean the host is up
+# (and may be worth reporting on); HTTP errors don't count either.
+CONNECTION_ERRORS = (requests.exceptions.ConnectionError, httpx.ConnectError, httpx.ConnectTimeout)
+
+
+# Headers that differ between identical responses; left out of input fingerprints
+VOLATILE_HEADERS = {
+    "date", "age", "expires", "etag", "last-modified", "content-length", "content-encoding",
+    "transfer-encoding", "connection", "keep-alive", "via", "server-timing", "report-to", "nel",
+    "x-request-id", "x-runtime", "x-cache", "x-cache-hits", "x-served-by", "x-timer", "x-varnish",
+    "cf-ray", "x-amz-cf-id", "x-amz-cf-pop", "x-amzn-requestid", "x-amzn-trace-id",
+}
+
+# Bodies of other content types are never downloaded: checks only look at their status and headers
+TEXT_TYPES = ("text/", "html", "xml", "json", "javascript")
+CHUNK_SIZE = 64 * 1024
+
+# Sets collecting the HTTP inputs read by the running check (see ScanContext.tracking)
+_reads = contextvars.ContextVar("scan_reads", default=())
+
+
+class HostUnreachable(requests.exceptions.ConnectionError):
+    """Raised instead of fetching once a host's circuit breaker is open."""
+
+
+def input_key(method: str, url: str, allow_redirects: bool, verify: bool = True) -> str:
+    # "k" (as in curl -k) marks a read that skipped certificate checks; strict keys keep their old form
+    return f"{method}|{int(allow_redirects)}{'' if verify else 'k'}|{url}"
+
+
+def parse_input_key(key: str):
+    method, flags, url = key.split("|", 2)
+    return method, url, flags.startswith("1"), "k" not in flags
+
+
+def _header_items(response):
+    if isinstance(response, httpx.Response):
+        return response.headers.multi_items()
+    raw = getattr(response.raw, "headers", None)  # urllib3 keeps repeated Set-Cookie headers apart
+    return raw.items() if raw is not None else response.headers.items()
+
+
+def _cookie_shape(value: str) -> str:
+    # Cookie name and attributes, not its (per-visitor) value or expiry
+    name, _, rest = value.partition("=")
+    attrs = sorted(
+        a.strip().lower() for a in rest.split(";")[1:]
+        if a.strip().lower().split("=")[0] not in ("expires", "max-age")
+    )
+    return f"{name.strip()}; {'; '.join(attrs)}"
+
+
+def fingerprint(response) -> str:
+    """Hash of what a check can observe in response: status, final URL, stable headers and body."""
+    lines = []
+    for name, value in _header_items(response):
+        name = name.lower()
+        if name in VOLATILE_HEADERS:
+            continue
+        lines.append(f"{name}: {_cookie_shape(value) if name == 'set-cookie' else value}")
+    digest = hashlib.sha256(f"{response.status_code} {response.url}\n".encode())
+    digest.update("\n".join(sorted(lines)).encode())
+    digest.update(response.content or b"")
+    return digest.hexdigest()
+
+
+def _textual(headers) -> bool:
+    content_type = headers.get("Content-Type", "").lower()
+    return not content_type or any(t in content_type for t in TEXT_TYPES)
+
+
+class KeywordScan:
+    """
+    Streaming "any of these keywords in the body?": fed chunk by chunk, it
+    says stop as soon as one matches, so the rest of the page is never read.
+    Case-insensitive for ASCII, like text.lower() on the pages checks search.
+    """
+
+    def __init__(self, keywords):
+        self.needles = [(k, k.lower().encode()) for k in keywords]
+        self.overlap = max((len(n) for _, n in self.needles), default=1) - 1
+        self.tail = b""
+        self.found = None
+
+    def __call__(self, chunk: bytes) -> bool:
+        window = self.tail + chunk.lower()
+        for keyword, needle in self.needles:
+            if needle in window:
+                self.found = keyword
+                return True
+        self.tail = window[-self.overlap:] if self.overlap else b""  # a match may straddle two chunks
+        return False
+
+    def first_in(self, body: bytes) -> str | None:
+        self(body)
+        return self.found
+
+
+def _read_body(response, stop=None):
+    """
+    Load at most SCAN_MAX_BODY_BYTES of a streamed requests response (nothing
+    for non-text types), then hand the connection back. stop(chunk) returning
+    True ends the read early. Sets response.truncated if the body is partial.
+    """
+    limit = settings.SCAN_MAX_BODY_BYTES
+    body, truncated = bytearray(), not _textual(response.headers)
+    try:
+        if not truncated:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                body += chunk
+                if len(body) > limit or (stop and stop(chunk)):
+                    truncated = True
+                    break
+    except Exception:
+        response.close()
+        raise
+    if truncated:
+        response.close()  # unread data left on the socket: drop the connection, don't pool it
+    response._content, response._content_consumed = bytes(body[:limit]), True
+    response.truncated = truncated
+    response.bytes_read = len(body)
+
+
+async def _aread_body(response, stop=None, raw=False):
+    """
+    _read_body() for a streamed httpx response. raw: any content type, and
+    chunks only go to stop() (the caller parses as it reads; nothing is kept).
+    """
+    limit = settings.SCAN_MAX_BODY_BYTES
+    body, read, truncated = bytearray(), 0, not raw and not _textual(response.headers)
+    try:
+        if not truncated:
+            async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                read += len(chunk)
+                if not raw:
+                    body += chunk
+                if read > limit or (stop and stop(chunk)):
+                    truncated = True
+                    break
+    finally:
+        await response.aclose()
+    response._content = bytes(body[:limit])
+    response.truncated = truncated
+    response.bytes_read = read
+
+
+class ScanContext:
+    """
+    Per-scan state handed to every check.
+
+    Responses are memoized by (method, url, allow_redirects) so the homepage
+    and policy pages are downloaded once per scan, no matter how many checks
+    read them. Each page is parsed once (parsing.py) and the ParsedPage is
+    kept for the life of the scan; checks must treat it as read-only.
+
+    Safe to share between threads: concurrent checks asking for the same URL
+    wait on one download instead of racing each other. Async checks use the
+    a*-methods, which share the same memo through the worker's pooled httpx
+    client on the engine loop (see aio.py / sessions.py).
+
+    Each host has a circuit breaker: after SCAN_BREAKER_THRESHOLD consecutive
+    connection failures (or a failed preflight) further fetches raise
+    HostUnreachable immediately instead of waiting out another timeout.
+
+    Each host is resolved once per scan (resolve()) through the worker's DNS
+    cache, and every connection the scan opens goes to that pinned address.
+
+    Every fetch first takes a permit from the cluster-wide limiter (per target
+    host, per tier, global in-flight cap; see limiter.py). Bodies are streamed
+    and capped at SCAN_MAX_BODY_BYTES; non-text bodies aren't downloaded at
+    all, and search() stops reading at the first keyword it finds.
+
+    Inside tracking(test_name) every URL a check reads, memoized or not, is
+    recorded as one of its inputs, and every fresh response is fingerprinted,
+    so the next scan can tell which checks saw nothing change (incremental.py).
+    """
+
+    def __init__(self, domain: str, scan_id=None, tier: str = "free", pins=None):
+        self.domain = domain
+        self.scan_id = scan_id
+        self.tier = tier
+        self.timings = {"dns": [], "parse": []}
+        self.profiles = {}  # test name -> profiling.CheckProfile, filled in by runner.py
+        self.totals = profiling.CheckProfile()  # every request of the scan, in a check or not
+        self.span = tracing.current()  # parent of the check spans, which run on other threads / the engine loop
+        self._cancelled = False
+        self.base_url = f"https://{domain}"
+        self._responses = {}
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._async_locks = {}
+        self._memo = {}
+        self._failures = {}
+        self._tripped = {}
+        self._memo_reads = {}
+        self._inputs = {}
+        self._fingerprints = {}
+        self._validators = {}
+        for host, address in (pins or {}).items():
+            # Fan-out subtasks connect where the parent scan's preflight did
+            self._memo[("dns", host)] = resolver.Resolution(host=host, addresses=(address,), cached=True)
+
+    def _key_lock(self, key) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def cancelled(self) -> bool:
+        """Cheap poll of the scan's cancel flag (one Redis GET); sticky once set."""
+        if not self._cancelled and self.scan_id is not None:
+            self._cancelled = is_cancelled(self.scan_id)
+        return self._cancelled
+
+    # ------------------------------------------------------------------ #
+    # Circuit breaker
+    # ------------------------------------------------------------------ #
+    def trip(self, host: str, reason: str):
+        with self._lock:
+            self._tripped.setdefault(host, reason)
+
+    def unreachable(self, host: str | None = None) -> str | None:
+        """Why host (the scanned domain by default) is written off, or None."""
+        return self._tripped.get(host or self.domain)
+
+    def _record(self, url: str, error: Exception | None):
+        host = urlparse(url).hostname or ""
+        with self._lock:
+            if error is None:
+                self._failures[host] = 0
+                return
+            if not self._is_down(error):
+                return
+            self._failures[host] = self._failures.get(host, 0) + 1
+            if self._failures[host] >= getattr(settings, "SCAN_BREAKER_THRESHOLD", 3):
+                self._tripped.setdefault(host, f"{self._failures[host]} connection failures ({error})")
+
+    @staticmethod
+    def _is_down(error: Exception) -> bool:
+        if not isinstance(error, CONNECTION_ERRORS) or isinstance(error, (HostUnreachable, requests.exceptions.SSLError)):
+            return False
+        if error.args and isinstance(error.args[0], urllib3.exceptions.ProtocolError):
+            return False  # requests' "Connection aborted": connected, then dropped
+        while error is not None:  # httpx raises a failed TLS handshake as ConnectError
+            if isinstance(error, ssl.SSLError):
+                return False
+            error = error.__cause__ or error.__context__
+        return True
+
+    def _guard(self, url: str):
+        reason = self.unreachable(urlparse(url).hostname or "")
+        if reason:
+            raise HostUnreachable(reason)
+
+    def once(self, key, factory):
+        """Compute factory() once per scan for key; concurrent callers wait for the first."""
+        with self._key_lock(("once", key)):
+            if key not in self._memo:
+                reads = set()
+                token = _reads.set(_reads.get() + (reads,))
+                try:
+                    self._memo[key] = factory()
+                finally:
+                    _reads.reset(token)
+                self._memo_reads[key] = reads
+        # Later callers depend on whatever the first one fetched
+        for sink in _reads.get():
+            sink |= self._memo_reads.get(key, set())
+        return self._memo[key]
+
+    # ------------------------------------------------------------------ #
+    # DNS
+    # ------------------------------------------------------------------ #
+    def resolve(self, host: str | None = None) -> resolver.Resolution:
+        """host (the scanned domain by default), resolved once per scan and pinned."""
+        host = (host or self.domain).lower().rstrip(".")
+
+        def lookup():
+            result = resolver.resolve(host)
+            self.timings["dns"].append({"host": host, "ms": round(result.elapsed_ms, 1), "cached": result.cached})
+            return result
+
+        return self.once(("dns", host), lookup)
+
+    def address(self, host: str) -> str | None:
+        return self.resolve(host).address
+
+    def pins(self) -> dict:
+        return {key[1]: value.address for key, value in list(self._memo.items())
+                if isinstance(key, tuple) and key[0] == "dns" and value.address}
+
+    # ------------------------------------------------------------------ #
+    # Input tracking
+    # ------------------------------------------------------------------ #
+    @contextmanager
+    def tracking(self, test_name: str):
+        reads = set()
+        token = _reads.set(_reads.get() + (reads,))
+        try:
+            yield reads
+        finally:
+            _reads.reset(token)
+            with self._lock:
+                self._inputs[test_name] = sorted(reads)
+
+    def _note(self, method: str, url: str, allow_redirects: bool, verify: bool = True):
+        for sink in _reads.get():
+            sink.add(input_key(method, url, allow_redirects, verify))
+
+    def _remember(self, key: str, response):
+        self._fingerprints[key] = fingerprint(response)
+        self._validators[key] = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+
+    def inputs_of(self, test_name: str) -> list | None:
+        return self._inputs.get(test_name)
+
+    def input_state(self, key: str) -> dict | None:
+        """Fingerprint + validators of an input fetched in this scan, or None if it failed."""
+        if key not in self._fingerprints:
+            return None
+        return {"fingerprint": self._fingerprints[key], **self._validators.get(key, {})}
+
+    def revalidate(self, key: str, previous: dict) -> bool:
+        """
+        Re-request an input of a previous scan, conditionally where it had
+        validators. True if it is unchanged (304, or the same fingerprint).
+        A full response is kept, so a check that does re-run won't fetch it again.
+        Inputs are re-read as the check read them, lenient about certificates or not.
+        """
+        method, url, allow_redirects, verify = parse_input_key(key)
+        headers = {}
+        if method == "GET":  # a 304 to HEAD could omit headers the checks look at
+            if previous.get("etag"):
+                headers["If-None-Match"] = previous["etag"]
+            if previous.get("last_modified"):
+                headers["If-Modified-Since"] = previous["last_modified"]
+        try:
+            response = self._fetch(
+                method, url, 10, {"headers": headers, "allow_redirects": allow_redirects, "verify": verify}
+            )
+        except Exception:
+            return False  # the check re-runs and meets the failure itself; don't count it twice towards the breaker
+
+        if headers and response.status_code == 304:
+            with self._lock:
+                self._fingerprints[key] = previous["fingerprint"]
+                self._validators[key] = {
+                    "etag": response.headers.get("ETag", previous.get("etag")),
+                    "last_modified": response.headers.get("Last-Modified", previous.get("last_modified")),
+                }
+            return True
+
+        with self._key_lock((method, url, allow_redirects, verify)):
+            self._responses.setdefault((method, url, allow_redirects, verify), response)
+            self._remember(key, response)
+        return self._fingerprints[key] == previous["fingerprint"]
+
+    # ------------------------------------------------------------------ #
+    # HTTP
+    # ------------------------------------------------------------------ #
+    def request(self, method: str, url: str, timeout: int = 10, **kwargs):
+        method = method.upper()
+        allow_redirects = kwargs.setdefault("allow_redirects", method != "HEAD")
+        # Strict and lenient (verify=False) callers never share a response: on a bad certificate
+        # one gets an SSLError, the other the page
+        verify = kwargs.get("verify", True)
+        key = (method, url, allow_redirects, verify)
+        self._note(method, url, allow_redirects, verify)
+
+        with self._key_lock(key):
+            cached = self._responses.get(key)
+            if cached is None:
+                try:
+                    cached = self._fetch(method, url, timeout, kwargs)
+                    self._remember(input_key(method, url, allow_redirects, verify), cached)
+                except Exception as e:
+                    self._record(url, e)
+                    cached = e
+                self._responses[key] = cached
+
+        if isinstance(cached, Exception):
+            raise cached
+        return cached
+
+    def _fetch(self, method: str, url: str, timeout, kwargs, stop=None):
+        self._guard(url)
+        with limiter.permit(url, self.tier), resolver.pinned(self), profiling.request(self.totals) as req:
+            response = get_session().request(method, url, timeout=timeout, stream=True, **kwargs)
+            req.first_byte(response.elapsed.total_seconds() * 1000)
+            _read_body(response, stop)
+            req.bytes = response.bytes_read
+        limiter.observe(url, response.status_code, response.headers.get("Retry-After"))
+        self._record(url, None)
+        return response
+
+    def get(self, url: str | None = None, **kwargs):
+        return self.request("GET", url or self.base_url, **kwargs)
+
+    def search(self, url: str | None, keywords, timeout: int = 10, **kwargs) -> tuple:
+        """
+        (status code, first of keywords found case-insensitively in the body
+        of GET url, or None). Reuses a response the scan already has; otherwise streams the
+        page and stops at the first match. A page read only partway is neither
+        shared with other checks nor fingerprinted, so a check that matched
+        early is simply re-run by the next incremental scan.
+        """
+        url = url or self.base_url
+        allow_redirects = kwargs.setdefault("allow_redirects", True)
+        verify = kwargs.get("verify", True)
+        key = ("GET", url, allow_redirects, verify)
+        self._note("GET", url, allow_redirects, verify)
+
+        with self._key_lock(key):
+            cached = self._responses.get(key)
+            if cached is None:
+                scan = KeywordScan(keywords)
+                try:
+                    response = self._fetch("GET", url, timeout, kwargs, stop=scan)
+                except Exception as e:
+                    self._record(url, e)
+                    self._responses[key] = e
+                    raise
+                if scan.found:
+                    return response.status_code, scan.found
+                self._responses[key] = response
+                self._remember(input_key("GET", url, allow_redirects, verify), response)
+                return response.status_code, None
+
+        if isinstance(cached, Exception):
+            raise cached
+        return cached.status_code, KeywordScan(keywords).first_in(cached.content)
+
+    def head(self, url: str | None = None, **kwargs):
+        return self.request("HEAD", url or self.base_url, **kwargs)
+
+    # ------------------------------------------------------------------ #
+    # Async HTTP (engine loop only)
+    # ------------------------------------------------------------------ #
+    async def arequest(self, method: str, url: str, timeout: int = 10, **kwargs):
+        method = method.upper()
+        allow_redirects = kwargs.pop("allow_redirects", method != "HEAD")
+        verify = kwargs.pop("verify", True)
+        key = (method, url, allow_redirects, verify)
+        self._note(method, url, allow_redirects, verify)
+
+        async with self._async_locks.setdefault(key, asyncio.Lock()):
+            cached = self._responses.get(key)
+            if cached is None:
+                try:
+                    cached = await self._afetch(method, url, timeout, verify, allow_redirects, kwargs)
+                    self._remember(input_key(method, url, allow_redirects, verify), cached)
+                except Exception as e:
+                    self._record(url, e)
+                    cached = e
+                self._responses[key] = cached
+
+        if isinstance(cached, Exception):
+            raise cached
+        return cached
+
+    async def _afetch(self, method: str, url: str, timeout, verify, allow_redirects, kwargs, stop=None, raw=False):
+        self._guard(url)
+        client = get_async_client(verify)
+        async with limiter.apermit(url, self.tier):
+            with resolver.pinned(self), profiling.request(self.totals) as req:
+                request = client.build_request(method, url, timeout=timeout, **kwargs)
+                request.extensions["trace"] = req.trace  # TLS and TTFB from httpcore's own events
+                response = await client.send(request, stream=True, follow_redirects=allow_redirects)
+                await _aread_body(response, stop, raw)
+                req.bytes = response.bytes_read
+        await limiter.aobserve(url, response.status_code, response.headers.get("Retry-After"))
+        self._record(url, None)
+        return response
+
+    async def aget(self, url: str | None = None, **kwargs):
+        return await self.arequest("GET", url or self.base_url, **kwargs)
+
+    async def astream(self, url: str, consume, timeout: int = 10):
+        """
+        GET url, handing each body chunk to consume(chunk) until it returns
+        True; for documents parsed as they arrive (sitemaps). Nothing is
+        memoized or kept: the response comes back without a body.
+        """
+        try:
+            return await self._afetch("GET", url, timeout, True, True, {}, stop=consume, raw=True)
+        except Exception as e:
+            self._record(url, e)
+            raise
+
+    async def asearch(self, url: str | None, keywords, timeout: int = 10, **kwargs) -> tuple:
+        """search() for async checks."""
+        url = url or self.base_url
+        allow_redirects = kwargs.pop("allow_redirects", True)
+        verify = kwargs.pop("verify", True)
+        key = ("GET", url, allow_redirects, verify)
+        self._note("GET", url, allow_redirects, verify)
+
+        async with self._async_locks.setdefault(key, asyncio.Lock()):
+            cached = self._responses.get(key)
+            if cached is None:
+                scan = KeywordScan(keywords)
+                try:
+                    response = await self._afetch("GET", url, timeout, verify, allow_redirects, kwargs, stop=scan)
+                except Exception as e:
+                    self._record(url, e)
+                    self._responses[key] = e
+                    raise
+                if scan.found:
+                    return response.status_code, scan.found
+                self._responses[key] = response
+                self._remember(input_key("GET", url, allow_redirects, verify), response)
+                return response.status_code, None
+
+        if isinstance(cached, Exception):
+            raise cached
+        return cached.status_code, KeywordScan(keywords).first_in(cached.content)
+
+    async def ahead(self, url: str | None = None, **kwargs):
+        return await self.arequest("HEAD", url or self.base_url, **kwargs)
+
+    # ------------------------------------------------------------------ #
+    # Parsed documents
+    # ------------------------------------------------------------------ #
+    def page(self, url: str | None = None, **kwargs) -> parsing.ParsedPage:
+        """Anchors, forms, scripts and visible text of url (homepage by default), parsed once."""
+        url = url or self.base_url
+        key = (url, kwargs.get("verify", True))  # like request(): a lenient parse never answers a strict caller
+        self._note("GET", url, kwargs.get("allow_redirects", True), key[1])
+        with self._key_lock(("page", *key)):
+            if key not in self._pages:
+                page = parsing.parse(self.get(url, **kwargs).text, url)
+                self.timings["parse"].append({"url": url, "ms": round(page.parse_ms, 1), "backend": page.backend})
+                self._pages[key] = page
+        return self._pages[key]
+
+    def soup(self, url: str | None = None, **kwargs) -> BeautifulSoup:
+        """BeautifulSoup tree of url, for checks the ParsedPage extracts don't cover. Do not mutate it."""
+        return self.page(url, **kwargs).soup
+
+    def clauses(self, url: str | None = None) -> Matches:
+        """POLICY clauses (clauses.py) in url's visible text, found in one pass and kept for the scan."""
+        url = url or self.base_url
+        return self.once(("clauses", url), lambda: POLICY.scan(self.page_text(url)))
+
+    def page_text(self, url: str | None = None, timeout: int = 10, verify: bool = False) -> str:
+        """Lowercased visible text of url, or "" if it can't be fetched. Lenient about certificates by default."""
+        url = url or self.base_url
+        try:
+            self.get(url, timeout=timeout, verify=verify).raise_for_status()
+            return self.page(url, verify=verify).text
+        except Exception:
+            return ""
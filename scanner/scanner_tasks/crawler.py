@@ -0,0 +1,231 @@
+# scanner_tasks/crawler.py
+
+# The site crawl behind crawl_sitemap and the multi-page checks (cookies, forms,
+# scripts). It runs once per scan, on the engine loop:
+#   - robots.txt is read first: its rules are obeyed and its Sitemap: lines followed,
+#   - sitemaps and sitemap indexes (plain or .gz) are parsed as they stream in and
+#     the download stops as soon as the frontier holds enough URLs,
+#   - a deduplicated frontier is worked by SCAN_CRAWL_CONCURRENCY fetches at a time,
+#     each through ScanContext, so every request takes a limiter permit (per-host
+#     politeness) and every page lands in the scan's page store, parsed once.
+# Pages and link depth are capped per tier (SCAN_CRAWL_MAX_PAGES / _MAX_DEPTH).
+
+import asyncio
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from urllib.parse import urldefrag, urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+from xml.etree.ElementTree import ParseError, XMLPullParser
+from django.conf import settings
+from . import aio, profiling
+from .context import HostUnreachable, ScanContext
+from .parsing import ParsedPage
+
+ROBOTS_AGENT = "*"
+MAX_SITEMAPS = 5  # sitemap documents read per crawl, index children included
+SKIP_EXTENSIONS = (
+    ".pdf", ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".ico", ".css", ".js", ".json", ".xml",
+    ".zip", ".gz", ".mp3", ".mp4", ".mov", ".woff", ".woff2", ".ttf", ".doc", ".docx", ".xls", ".xlsx",
+)
+
+
+@dataclass(frozen=True)
+class Crawl:
+    pages: tuple = ()        # URLs in the page store, homepage first, then by depth
+    robots_status: int | None = None
+    sitemaps: tuple = ()     # (url, status code or None) of every sitemap read
+    disallowed: int = 0      # URLs left out because robots.txt disallows them
+
+    @property
+    def sitemap_ok(self) -> bool:
+        return any(status == 200 for _, status in self.sitemaps)
+
+
+def limits(tier: str) -> tuple:
+    """(max pages, max link depth) for tier."""
+    pages = settings.SCAN_CRAWL_MAX_PAGES
+    depth = settings.SCAN_CRAWL_MAX_DEPTH
+    return pages.get(tier, pages["free"]), depth.get(tier, depth["free"])
+
+
+def scope(tier: str) -> str:
+    """Tag for results that depend on how much of the site tier crawls (result cache, incremental)."""
+    pages, depth = limits(tier)
+    return f"crawl{pages}d{depth}"
+
+
+def _normalize(url: str) -> str:
+    url, _ = urldefrag(url)
+    parts = urlparse(url)
+    return parts._replace(scheme=parts.scheme.lower(), netloc=parts.netloc.lower(), path=parts.path or "/").geturl()
+
+
+class _SitemapReader:
+    """Streaming <loc> collector for one sitemap or sitemap index; says stop once it has enough."""
+
+    def __init__(self, want: int):
+        self.want = want
+        self.pages, self.children = [], []
+        self._parser = XMLPullParser(events=("start", "end"))
+        self._gunzip = None
+        self._first = True
+        self._index = False
+
+    def __call__(self, chunk: bytes) -> bool:
+        if self._first:
+            self._first = False
+            if chunk[:2] == b"\x1f\x8b":  # sitemap.xml.gz served as a file, not as Content-Encoding
+                self._gunzip = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self._gunzip is not None:
+            chunk = self._gunzip.decompress(chunk)
+        try:
+            self._parser.feed(chunk)
+            for event, element in self._parser.read_events():
+                name = element.tag.rsplit("}", 1)[-1]
+                if event == "start":
+                    self._index = self._index or name == "sitemapindex"
+                elif name == "loc" and element.text:
+                    (self.children if self._index else self.pages).append(element.text.strip())
+                elif name in ("url", "sitemap"):
+                    element.clear()
+        except (ParseError, zlib.error):
+            return True  # not a sitemap after all (an HTML 404 page, say)
+        return len(self.pages) >= self.want or len(self.children) >= MAX_SITEMAPS
+
+
+async def _robots(ctx: ScanContext, root: str):
+    parser = RobotFileParser()
+    try:
+        response = await ctx.aget(f"{root}/robots.txt", timeout=10)
+    except HostUnreachable:
+        raise
+    except Exception:
+        parser.allow_all = True
+        return parser, None
+    if response.status_code in (401, 403):
+        parser.disallow_all = True
+    elif response.status_code >= 400:
+        parser.allow_all = True
+    else:
+        parser.parse(response.text.splitlines())
+    return parser, response.status_code
+
+
+async def _read_sitemaps(ctx: ScanContext, urls, want: int):
+    """Page URLs from the sitemaps (following indexes) and the (url, status) of each one read."""
+    queue, pages, read = deque(dict.fromkeys(urls)), [], []
+    while queue and len(read) < MAX_SITEMAPS:
+        url = queue.popleft()
+        reader = _SitemapReader(want - len(pages))
+        try:
+            response = await ctx.astream(url, reader)
+            read.append((url, response.status_code))
+        except HostUnreachable:
+            raise
+        except Exception:
+            read.append((url, None))
+            continue
+        if response.status_code == 200:
+            pages += reader.pages
+            queue.extend(reader.children)
+        if len(pages) >= want:
+            break
+    return pages[:want], read
+
+
+async def crawl(ctx: ScanContext) -> Crawl:
+    max_pages, max_depth = limits(ctx.tier)
+    parts = urlparse(_normalize(ctx.base_url))
+    root, host = f"{parts.scheme}://{parts.netloc}", parts.hostname
+    robots, robots_status = await _robots(ctx, root)
+
+    frontier, seen, disallowed = deque(), {}, 0
+
+    def push(url, depth):
+        nonlocal disallowed
+        url, _ = urldefrag(url)
+        key = _normalize(url)
+        if key in seen or urlparse(key).hostname != host or urlparse(key).path.lower().endswith(SKIP_EXTENSIONS):
+            return
+        seen[key] = (depth, len(seen))
+        if not robots.can_fetch(ROBOTS_AGENT, url):
+            disallowed += 1
+            return
+        frontier.append((url, depth))  # as written, not normalized: ctx.base_url is the homepage's memo key
+
+    push(ctx.base_url, 0)
+    # Always look at the sitemap (crawl_sitemap reports on it); read only as much of it as the tier can use
+    sitemap_pages, sitemaps = await _read_sitemaps(
+        ctx, robots.site_maps() or [f"{root}/sitemap.xml"], want=max(max_pages - 1, 0)
+    )
+    for url in sitemap_pages:
+        push(url, 1)
+
+    async def fetch(url, depth):
+        try:
+            response = await ctx.aget(url, timeout=10)
+        except HostUnreachable:
+            raise
+        except Exception:
+            return url, depth, None
+        if response.status_code != 200 or "html" not in response.headers.get("Content-Type", "").lower():
+            return url, depth, None
+        try:
+            # Parse off the loop; the ParsedPage goes to the scan's page store for the checks
+            return url, depth, await asyncio.to_thread(ctx.page, url)
+        except HostUnreachable:
+            raise
+        except Exception:
+            return url, depth, None
+
+    crawled, pending = [], set()
+    while frontier or pending:
+        cancelled = await asyncio.to_thread(ctx.cancelled)
+        while not cancelled and frontier and len(pending) < settings.SCAN_CRAWL_CONCURRENCY \
+                and len(crawled) + len(pending) < max_pages:
+            pending.add(asyncio.ensure_future(fetch(*frontier.popleft())))
+        if not pending:
+            break
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            try:
+                url, depth, page = task.result()
+            except HostUnreachable:
+                for other in pending:
+                    other.cancel()
+                raise
+            if page is None:
+                continue
+            crawled.append(url)
+            if depth < max_depth:
+                for anchor in page.anchors:
+                    push(urljoin(url, anchor.href), depth + 1)
+
+    return Crawl(
+        pages=tuple(sorted(crawled, key=lambda url: seen[_normalize(url)])),
+        robots_status=robots_status,
+        sitemaps=tuple(sitemaps),
+        disallowed=disallowed,
+    )
+
+
+def site(ctx: ScanContext) -> Crawl:
+    """The scan's crawl, run on the first call; concurrent callers wait for it."""
+    def run():
+        # Its requests count towards the check that started the crawl
+        result = aio.run_sync(profiling.within(profiling.current(), crawl(ctx)))
+        for url in result.pages:
+            ctx.page(url)  # already in the store: this only records the pages as the caller's inputs
+        return result
+    return ctx.once(("crawl",), run)
+
+
+async def asite(ctx: ScanContext) -> Crawl:
+    """site() for async checks: waits on a worker thread, never on the loop the crawl runs on."""
+    return await asyncio.to_thread(site, ctx)
+
+
+def pages(ctx: ScanContext) -> list[ParsedPage]:
+    """Every crawled page of the scan, homepage first (empty if even the homepage failed)."""
+    return [ctx.page(url) for url in site(ctx).pages]
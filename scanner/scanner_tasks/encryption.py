@@ -2,26 +2,53 @@
 
 import socket
 import ssl
+from dataclasses import dataclass
+from datetime import date
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
+from .context import ScanContext
+from .registry import check_meta
 
-def check_ssl_tls(domain):
+
+@dataclass(frozen=True)
+class TLSProbe:
+    """Outcome of one TLS handshake. Shared by every check in a scan, so it is immutable."""
+    host: str
+    protocol: str | None = None
+    cipher: str | None = None
+    expiry: date | None = None
+    error: str | None = None
+
+
+def probe_tls(host: str, timeout: int = 10, address: str | None = None) -> TLSProbe:
     try:
         context = ssl.create_default_context()
-        with socket.create_connection((domain, 443), timeout=10) as sock:
-            with context.wrap_socket(sock, server_hostname=domain) as ssock:
+        with socket.create_connection((address or host, 443), timeout=timeout) as sock:
+            with context.wrap_socket(sock, server_hostname=host) as ssock:
                 cert = ssock.getpeercert(binary_form=True)
                 x509_cert = x509.load_der_x509_certificate(cert, default_backend())
-                expiry = x509_cert.not_valid_after_utc.date()
-                protocol = ssock.version()
-                cipher = ssock.cipher()[0]
-                status = "pass" if protocol in ["TLSv1.3", "TLSv1.2"] and "RSA" not in cipher else "warn"
-                return {
-                    "title": "SSL/TLS",
-                    "status": status,
-                    "details": f"{protocol} | {cipher} | Expires: {expiry}",
-                    "standard": "PCI DSS Req 4.1",
-                    "module": "Encryption",
-                }
+                return TLSProbe(
+                    host=host,
+                    protocol=ssock.version(),
+                    cipher=ssock.cipher()[0],
+                    expiry=x509_cert.not_valid_after_utc.date(),
+                )
     except Exception as e:
-        return {"title": "SSL/TLS", "status": "fail", "details": f"Error: {str(e)}", "module": "Encryption"}
\ No newline at end of file
+        return TLSProbe(host=host, error=str(e))
+
+
+@check_meta(incremental=False)
+def check_ssl_tls(domain, ctx: ScanContext | None = None):
+    # One handshake per scan and host; callers get a fresh dict they may re-tag
+    ctx = ctx or ScanContext(domain)
+    probe = ctx.once(("tls", domain), lambda: probe_tls(domain, address=ctx.address(domain)))
+    if probe.error:
+        return {"title": "SSL/TLS", "status": "fail", "details": f"Error: {probe.error}", "module": "Encryption"}
+    status = "pass" if probe.protocol in ["TLSv1.3", "TLSv1.2"] and "RSA" not in probe.cipher else "warn"
+    return {
+        "title": "SSL/TLS",
+        "status": status,
+        "details": f"{probe.protocol} | {probe.cipher} | Expires: {probe.expiry}",
+        "standard": "PCI DSS Req 4.1",
+        "module": "Encryption",
+    }
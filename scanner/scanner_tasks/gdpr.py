@@ -1,24 +1,29 @@
 # scanner_tasks/gdpr.py
 
-from .helpers import _find_link, _fetch_page_text
-import requests
+from .helpers import _find_link
+from .context import HostUnreachable, ScanContext
+from .registry import check_meta
+from . import crawler
 
-def check_gdpr_dsar(domain: str):
-    url = _find_link(domain, ["dsar", "data subject", "access my data"])
-    text = _fetch_page_text(f"https://{domain}")
-    found = any(k in text for k in ["dsar", "data subject access request"])
+def check_gdpr_dsar(domain: str, ctx: ScanContext | None = None):
+    ctx = ctx or ScanContext(domain)
+    url = _find_link(domain, ["dsar", "data subject", "access my data"], ctx=ctx)
+    clauses = ctx.clauses(ctx.base_url)
+    found = "gdpr.dsar" in clauses
     status = "pass" if found or url else "fail"
     return {
         "title": "DSAR Endpoint (GDPR Art. 15)",
         "status": status,
         "details": f"DSAR page: {'Found' if url else 'Missing'}",
+        "evidence": clauses.snippet("gdpr.dsar"),
         "standard": "GDPR Art. 15",
         "risk_level": "high" if status == "fail" else "low",
         "module": "GDPR",
     }
 
-def check_gdpr_dpia(domain: str):
-    policy_url = _find_link(domain, ["privacy policy", "privacy"])
+def check_gdpr_dpia(domain: str, ctx: ScanContext | None = None):
+    ctx = ctx or ScanContext(domain)
+    policy_url = _find_link(domain, ["privacy policy", "privacy"], ctx=ctx)
     if not policy_url:
         return {
             "title": "DPIA Reference (GDPR Art. 35)",
@@ -28,20 +33,22 @@ def check_gdpr_dpia(domain: str):
             "risk_level": "high",
             "module": "GDPR",
         }
-    text = _fetch_page_text(policy_url)
-    found = any(p in text for p in ["dpia", "data protection impact assessment"])
+    clauses = ctx.clauses(policy_url)
+    found = "gdpr.dpia" in clauses
     status = "pass" if found else "warn"
     return {
         "title": "DPIA Mentioned (GDPR Art. 35)",
         "status": status,
         "details": f"DPIA reference: {'Found' if found else 'Missing'}",
+        "evidence": clauses.snippet("gdpr.dpia"),
         "standard": "GDPR Art. 35",
         "risk_level": "high" if status == "warn" else "low",
         "module": "GDPR",
     }
 
-def check_gdpr_retention(domain: str):
-    policy_url = _find_link(domain, ["privacy policy"])
+def check_gdpr_retention(domain: str, ctx: ScanContext | None = None):
+    ctx = ctx or ScanContext(domain)
+    policy_url = _find_link(domain, ["privacy policy"], ctx=ctx)
     if not policy_url:
         return {
             "title": "Retention Policy (GDPR Art. 5)",
@@ -51,20 +58,22 @@ def check_gdpr_retention(domain: str):
             "risk_level": "high",
             "module": "GDPR",
         }
-    text = _fetch_page_text(policy_url)
-    found = any(p in text for p in ["retention period", "data will be deleted"])
+    clauses = ctx.clauses(policy_url)
+    found = "gdpr.retention" in clauses
     status = "pass" if found else "warn"
     return {
         "title": "Data Retention Policy",
         "status": status,
         "details": f"Retention clause: {'Present' if found else 'Missing'}",
+        "evidence": clauses.snippet("gdpr.retention"),
         "standard": "GDPR Art. 5(1)(e)",
         "risk_level": "high" if status == "warn" else "low",
         "module": "GDPR",
     }
 
-def check_gdpr_dpo(domain: str):
-    policy_url = _find_link(domain, ["privacy", "contact"])
+def check_gdpr_dpo(domain: str, ctx: ScanContext | None = None):
+    ctx = ctx or ScanContext(domain)
+    policy_url = _find_link(domain, ["privacy", "contact"], ctx=ctx)
     if not policy_url:
         return {
             "title": "DPO Contact (GDPR Art. 37)",
@@ -74,37 +83,49 @@ def check_gdpr_dpo(domain: str):
             "risk_level": "high",
             "module": "GDPR",
         }
-    text = _fetch_page_text(policy_url)
-    found = any(p in text for p in ["data protection officer", "dpo"])
+    clauses = ctx.clauses(policy_url)
+    found = "gdpr.dpo" in clauses
     status = "pass" if found else "warn"
     return {
         "title": "DPO Appointed",
         "status": status,
         "details": f"DPO contact: {'Found' if found else 'Not mentioned'}",
+        "evidence": clauses.snippet("gdpr.dpo"),
         "standard": "GDPR Art. 37",
         "risk_level": "medium",
         "module": "GDPR",
     }
 
-def crawl_sitemap(domain):
+@check_meta(crawl=True, incremental=False)  # sitemaps are streamed, not fingerprinted
+async def crawl_sitemap(domain, ctx: ScanContext | None = None):
+    ctx = ctx or ScanContext(domain)
     try:
-        sitemap_ok = requests.head(f"https://{domain}/sitemap.xml", timeout=10).status_code == 200
-        robots_ok = requests.head(f"https://{domain}/robots.txt", timeout=10).status_code == 200
+        crawl = await crawler.asite(ctx)
+        sitemap_ok = crawl.sitemap_ok
+        robots_ok = crawl.robots_status == 200
         status = "pass" if sitemap_ok and robots_ok else "warn"
         return {
             "title": "Sitemap & Robots",
             "status": status,
-            "details": f"Sitemap: {'OK' if sitemap_ok else 'Missing'} | Robots: {'OK' if robots_ok else 'Missing'}",
+            "details": f"Sitemap: {'OK' if sitemap_ok else 'Missing'} | Robots: {'OK' if robots_ok else 'Missing'}"
+                       f" | {len(crawl.pages)} pages crawled",
             "standard": "GDPR Art. 35",
             "module": "GDPR",
         }
+    except HostUnreachable:
+        raise
     except:
         return {"title": "Sitemap", "status": "warn", "details": "Not accessible", "module": "GDPR"}
 
-def check_cookies(domain):
+@check_meta(crawl=True)
+def check_cookies(domain, ctx: ScanContext | None = None):
+    ctx = ctx or ScanContext(domain)
     try:
-        response = requests.get(f"https://{domain}", timeout=10)
-        banner = any(x in response.text.lower() for x in ["cookie", "consent"])
+        _, found = ctx.search(ctx.base_url, ["cookie", "consent"], timeout=10)
+        banner = found is not None
+        if not banner:
+            # Banner scripts are often only on some templates; crawled pages are already fetched
+            banner = any(ctx.search(url, ["cookie", "consent"])[1] for url in crawler.site(ctx).pages[1:])
         status = "pass" if banner else "fail"
         return {
             "title": "Cookie Consent",
@@ -114,24 +135,30 @@ def check_cookies(domain):
             "risk_level": "high" if not banner else "low",
             "module": "GDPR",
         }
+    except HostUnreachable:
+        raise
     except:
         return {"title": "Cookies", "status": "fail", "details": "Site down", "module": "GDPR"}
 
-def check_privacy_policy(domain):
+def check_privacy_policy(domain, ctx: ScanContext | None = None):
+    ctx = ctx or ScanContext(domain)
     try:
-        policy_url = _find_link(domain, ["privacy", "policy"])
+        policy_url = _find_link(domain, ["privacy", "policy"], ctx=ctx)
         if not policy_url:
             return {"title": "Privacy Policy", "status": "fail", "details": "Not found", "module": "GDPR"}
-        text = _fetch_page_text(policy_url)
-        gdpr_score = sum(1 for k in ['gdpr', 'controller', 'erase', 'dpo'] if k in text)
-        ccpa = any(k in text for k in ['ccpa', 'california'])
+        clauses = ctx.clauses(policy_url)
+        gdpr_score = len(clauses.keywords("gdpr.terms"))
+        ccpa = "ccpa" in clauses
         status = "pass" if gdpr_score >= 2 and ccpa else "warn"
         return {
             "title": "Privacy Policy",
             "status": status,
             "details": f"GDPR: {gdpr_score}/4 | CCPA: {'Yes' if ccpa else 'No'}",
+            "evidence": clauses.snippet("gdpr.terms"),
             "standard": "GDPR, CCPA",
             "module": "GDPR",
         }
+    except HostUnreachable:
+        raise
     except:
         return {"title": "Policy", "status": "fail", "details": "Error", "module": "GDPR"}
\ No newline at end of file
@@ -1,8 +1,11 @@
 # scanner_tasks/helpers.py
 
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+from dataclasses import dataclass, field
+from urllib.parse import urlparse
+from requests.structures import CaseInsensitiveDict
+from .context import HostUnreachable, ScanContext
+from .sessions import get_session
+from . import links
 
 SCANNER_API_URL = "https://api.complylaw-scanner.com/v1/scan"
 SCANNER_API_KEY = "your-api-key-here"
@@ -12,38 +15,70 @@ def connect_to_external_scanner(domain: str):
         return None
     try:
         payload = {"domain": domain, "api_key": SCANNER_API_KEY}
-        resp = requests.post(SCANNER_API_URL, json=payload, timeout=10)
+        resp = get_session().post(SCANNER_API_URL, json=payload, timeout=10)
         if resp.status_code == 200:
             return resp.json()
     except Exception:
         pass
     return None
 
-def _fetch_page_text(url: str, timeout: int = 10) -> str:
+def _fetch_page_text(url: str, timeout: int = 10, ctx: ScanContext | None = None) -> str:
+    ctx = ctx or ScanContext(urlparse(url).hostname or "")
+    return ctx.page_text(url, timeout=timeout)
+
+def _find_link(domain: str, keywords: list, base_url: str | None = None, ctx: ScanContext | None = None) -> str | None:
+    # Served from the scan's link index (links.py): the homepage's anchors are scanned once for all callers
+    ctx = ctx or ScanContext(domain)
     try:
-        r = requests.get(url, timeout=timeout, allow_redirects=True, verify=False)
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-        for tag in soup(["script", "style", "nav", "footer"]):
-            tag.decompose()
-        return soup.get_text(separator=" ").lower()
+        return links.find_link(ctx, keywords, base_url)
+    except HostUnreachable:
+        raise
     except Exception:
-        return ""
+        return None
+
+@dataclass(frozen=True)
+class HeaderSnapshot:
+    """
+    Homepage headers as seen by both a HEAD and the final GET, taken once per scan.
+    Header rules read .headers; nothing here triggers another request.
+    """
+    head: CaseInsensitiveDict = field(default_factory=CaseInsensitiveDict)
+    get: CaseInsensitiveDict = field(default_factory=CaseInsensitiveDict)
+    redirect_chain: tuple = ()  # ((status, url), ...) ending with the final response
+    final_url: str = ""
 
-def _find_link(domain: str, keywords: list, base_url: str | None = None) -> str | None:
-    if not base_url:
-        base_url = f"https://{domain}"
+    @property
+    def headers(self) -> CaseInsensitiveDict:
+        # Some servers only send e.g. CSP on GET; HEAD wins on conflicts (historic behaviour)
+        merged = CaseInsensitiveDict(self.get)
+        merged.update(self.head)
+        return merged
+
+
+def _take_header_snapshot(ctx: ScanContext) -> HeaderSnapshot:
     try:
-        soup = BeautifulSoup(requests.get(base_url, timeout=10).text, "html.parser")
-        for a in soup.find_all("a", href=True):
-            if any(k in a.get_text(strip=True).lower() for k in keywords):
-                return urljoin(base_url, a["href"])
+        head = CaseInsensitiveDict(ctx.head(timeout=10, allow_redirects=True).headers)
+    except HostUnreachable:
+        raise
     except Exception:
-        pass
-    return None
-
-def _get_headers(domain: str):
+        head = CaseInsensitiveDict()
     try:
-        return requests.head(f"https://{domain}", timeout=10, allow_redirects=True).headers
-    except:
-        return {}
\ No newline at end of file
+        final = ctx.get(timeout=10)
+    except HostUnreachable:
+        raise
+    except Exception:
+        return HeaderSnapshot(head=head)
+    chain = tuple((r.status_code, str(r.url)) for r in [*final.history, final])
+    return HeaderSnapshot(
+        head=head,
+        get=CaseInsensitiveDict(final.headers),
+        redirect_chain=chain,
+        final_url=str(final.url),
+    )
+
+def _header_snapshot(domain: str, ctx: ScanContext | None = None) -> HeaderSnapshot:
+    ctx = ctx or ScanContext(domain)
+    return ctx.once(("headers", domain), lambda: _take_header_snapshot(ctx))
+
+def _get_headers(domain: str, ctx: ScanContext | None = None):
+    return _header_snapshot(domain, ctx).headers
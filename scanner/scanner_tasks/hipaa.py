@@ -1,28 +1,33 @@
 # scanner_tasks/hipaa.py
 
 from .encryption import check_ssl_tls
-import requests
-from bs4 import BeautifulSoup
+from .context import HostUnreachable, ScanContext
+from .registry import check_meta
+from . import crawler
 
-def check_hipaa_encryption(domain: str):
-    result = check_ssl_tls(domain)
+@check_meta(incremental=False)
+def check_hipaa_encryption(domain: str, ctx: ScanContext | None = None):
+    result = check_ssl_tls(domain, ctx)
     result["module"] = "HIPAA"
     result["standard"] = "HIPAA §164.312"
     return result
 
-def check_forms(domain):
+@check_meta(crawl=True)
+def check_forms(domain, ctx: ScanContext | None = None):
+    ctx = ctx or ScanContext(domain)
     try:
-        response = requests.get(f"https://{domain}", timeout=10)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        forms = soup.find_all('form')
-        encrypted = all(f.get('action', '').startswith('https') for f in forms if f.get('action'))
+        pages = crawler.pages(ctx) or [ctx.page(timeout=10)]
+        forms = [form for page in pages for form in page.forms]
+        encrypted = all(f.action.startswith('https') for f in forms if f.action)
         status = "pass" if encrypted else "fail"
         return {
             "title": "Data Forms",
             "status": status,
-            "details": f"{len(forms)} forms | HTTPS: {'Yes' if encrypted else 'No'}",
+            "details": f"{len(forms)} forms on {len(pages)} pages | HTTPS: {'Yes' if encrypted else 'No'}",
             "standard": "HIPAA",
             "module": "HIPAA",
         }
+    except HostUnreachable:
+        raise
     except:
         return {"title": "Forms", "status": "error", "details": "Failed", "module": "HIPAA"}
\ No newline at end of file
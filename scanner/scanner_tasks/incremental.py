@@ -0,0 +1,108 @@
+# scanner_tasks/incremental.py
+
+# Incremental re-scans. Each completed scan stores, per check, the HTTP inputs it
+# read and a fingerprint + validators (ETag / Last-Modified) of every input:
+#   raw_data["incremental"] = {"inputs": {key: state}, "checks": {test name: entry}}
+# The next scan of the same firm/domain revalidates those inputs with conditional
+# requests and carries forward every check whose inputs all came back unchanged.
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .context import ScanContext
+from .crawler import scope
+from .registry import get_meta
+
+CARRYABLE_STATUSES = ("pass", "fail", "warn")
+
+
+@dataclass
+class Baseline:
+    scan_id: int
+    inputs: dict
+    checks: dict
+    unchanged: set = field(default_factory=set)
+
+    def carry_forward(self, tests, tier: str = "free") -> dict:
+        """{test name: result} for the tests that need not run again."""
+        carried = {}
+        for test_name, test_func in tests:
+            entry = self.checks.get(test_name)
+            if entry and _carryable(entry, test_func, tier) and set(entry["inputs"]) <= self.unchanged:
+                carried[test_name] = {**entry["result"], "carried_from": self.scan_id}
+        return carried
+
+
+def _scope(test_func, tier: str) -> str | None:
+    return scope(tier) if get_meta(test_func, "crawl", False) else None
+
+
+def _carryable(entry, test_func, tier: str) -> bool:
+    evaluated = parse_datetime(entry.get("evaluated_at") or "")
+    max_age = timedelta(days=settings.SCAN_INCREMENTAL_MAX_AGE_DAYS)
+    return (
+        get_meta(test_func, "incremental", True)
+        and get_meta(test_func, "network", True)
+        and entry.get("version") == get_meta(test_func, "version", 1)
+        and entry.get("scope") == _scope(test_func, tier)  # an upgraded firm's crawl covers more pages
+        and entry["inputs"]  # a check that read nothing over HTTP (TLS, nmap) can't be revalidated
+        and evaluated is not None and timezone.now() - evaluated < max_age
+    )
+
+
+def load_baseline(previous) -> Baseline | None:
+    """Inputs and per-check results recorded by a previous (completed) scan, if it has any."""
+    if previous is None:
+        return None
+    data = previous.get_raw_data().get("incremental")
+    if not data or not data.get("checks"):
+        return None
+    return Baseline(scan_id=previous.pk, inputs=data["inputs"], checks=data["checks"])
+
+
+def revalidate(ctx: ScanContext, baseline: Baseline, workers: int = 4) -> set:
+    """Conditionally re-request every input of the baseline; returns (and stores) the unchanged ones."""
+    keys = sorted({key for entry in baseline.checks.values() for key in entry["inputs"]} & set(baseline.inputs))
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="scan-revalidate") as pool:
+        fresh = list(pool.map(lambda key: ctx.revalidate(key, baseline.inputs[key]), keys))
+    baseline.unchanged = {key for key, same in zip(keys, fresh) if same}
+    return baseline.unchanged
+
+
+def build_record(ctx: ScanContext, tests, results, baseline: Baseline | None = None, carried=None) -> dict:
+    """This scan's contribution to raw_data["incremental"]."""
+    record = {"inputs": {}, "checks": {}}
+    now = timezone.now().isoformat()
+    carried = carried or {}
+    for (test_name, test_func), result in zip(tests, results):
+        if test_name in carried and baseline:
+            entry = baseline.checks[test_name]
+        else:
+            inputs = ctx.inputs_of(test_name)
+            if not inputs or result.get("status") not in CARRYABLE_STATUSES or result.get("cached"):
+                continue
+            entry = {
+                "result": result,
+                "inputs": inputs,
+                "version": get_meta(test_func, "version", 1),
+                "evaluated_at": now,
+            }
+            if _scope(test_func, ctx.tier):
+                entry["scope"] = _scope(test_func, ctx.tier)
+        states = {key: ctx.input_state(key) for key in entry["inputs"]}
+        if all(states.values()):  # an input that failed to load can't vouch for anything next time
+            record["checks"][test_name] = entry
+            record["inputs"].update(states)
+    return record
+
+
+def merge_records(records) -> dict:
+    merged = {"inputs": {}, "checks": {}}
+    for record in records:
+        if record:
+            merged["inputs"].update(record["inputs"])
+            merged["checks"].update(record["checks"])
+    return merged
@@ -1,18 +1,21 @@
 # scanner_tasks/iso27001.py
 
-from .helpers import _find_link, _fetch_page_text
+from .helpers import _find_link
+from .context import ScanContext
 
-def check_iso27001_access_control(domain: str):
-    policy_url = _find_link(domain, ["terms", "aup"])
+def check_iso27001_access_control(domain: str, ctx: ScanContext | None = None):
+    ctx = ctx or ScanContext(domain)
+    policy_url = _find_link(domain, ["terms", "aup"], ctx=ctx)
     if not policy_url:
         return {"title": "Access Policy (ISO)", "status": "warn", "details": "Missing", "standard": "ISO A.9", "module": "ISO 27001"}
-    text = _fetch_page_text(policy_url)
-    found = "registration" in text
+    clauses = ctx.clauses(policy_url)
+    found = "iso.registration" in clauses
     status = "pass" if found else "warn"
     return {
         "title": "User Access Policy",
         "status": status,
         "details": f"Defined: {'Yes' if found else 'No'}",
+        "evidence": clauses.snippet("iso.registration"),
         "standard": "ISO 27001 A.9.2.1",
         "module": "ISO 27001",
     }
\ No newline at end of file
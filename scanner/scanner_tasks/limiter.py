@@ -0,0 +1,206 @@
+# scanner_tasks/limiter.py
+
+# Cluster-wide politeness for outbound scan traffic. Every HTTP call a check makes
+# through ScanContext first takes a permit from Redis:
+#   - a token bucket per target host (SCAN_HOST_RATE/s, bursts of SCAN_HOST_BURST),
+#   - a token bucket per subscription tier (SCAN_TIER_RATE), so one tier can't eat the egress,
+#   - a lease in a global in-flight set (SCAN_MAX_INFLIGHT), released when the response is in.
+# A 429/503 with Retry-After pauses the host for everyone. Leases expire on their own,
+# so a worker killed mid-request can't leak capacity. If Redis is down, requests go
+# through unthrottled rather than failing the scan.
+
+import asyncio
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlparse
+import redis
+from django.conf import settings
+
+LEASE_TTL = 60          # seconds an in-flight permit lives if never released
+MAX_SLEEP = 1.0         # re-check at least this often while waiting
+TOOL_LOCK_TTL = 60 * 15
+RETRY_REDIS_AFTER = 30  # after a Redis error, run unthrottled this long instead of paying timeouts
+
+# KEYS: host bucket, tier bucket, in-flight set, host pause
+# ARGV: host rate, host burst, tier rate, tier burst, max in-flight, lease id, lease ttl
+# Returns "0" when the permit is granted, otherwise seconds to wait before retrying.
+# Redis' own clock is used, so workers with drifting clocks still share one bucket.
+_ACQUIRE = """
+local paused = redis.call('PTTL', KEYS[4])
+if paused > 0 then
+    return tostring(paused / 1000)
+end
+
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', now)
+if redis.call('ZCARD', KEYS[3]) >= tonumber(ARGV[5]) then
+    return '0.05'
+end
+
+local function refill(key, rate, burst)
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    return math.min(burst, tokens + (now - ts) * rate)
+end
+
+local host_rate, host_burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local tier_rate, tier_burst = tonumber(ARGV[3]), tonumber(ARGV[4])
+local host_tokens = refill(KEYS[1], host_rate, host_burst)
+local tier_tokens = refill(KEYS[2], tier_rate, tier_burst)
+if host_tokens < 1 or tier_tokens < 1 then
+    return tostring(math.max((1 - host_tokens) / host_rate, (1 - tier_tokens) / tier_rate, 0.01))
+end
+
+redis.call('HSET', KEYS[1], 'tokens', host_tokens - 1, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(host_burst / host_rate) + 60)
+redis.call('HSET', KEYS[2], 'tokens', tier_tokens - 1, 'ts', now)
+redis.call('EXPIRE', KEYS[2], math.ceil(tier_burst / tier_rate) + 60)
+redis.call('ZADD', KEYS[3], now + tonumber(ARGV[7]), ARGV[6])
+return '0'
+"""
+
+_client = None
+_script = None
+_lock = threading.Lock()
+_down_until = 0.0
+
+
+def _redis():
+    global _client, _script
+    with _lock:
+        if _client is None:
+            _client = redis.from_url(settings.SCAN_LIMITER_REDIS_URL, socket_timeout=1, socket_connect_timeout=1)
+            _script = _client.register_script(_ACQUIRE)
+    return _client, _script
+
+
+def _host(url: str) -> str:
+    return (urlparse(url).hostname or "").lower()
+
+
+def _available() -> bool:
+    return time.monotonic() >= _down_until
+
+
+def _try_acquire(host: str, tier: str, lease: str) -> float | None:
+    """0 when granted, else seconds to wait; None if Redis is unavailable (fail open)."""
+    global _down_until
+    if not _available():
+        return None
+    try:
+        _, script = _redis()
+        tier_rate = settings.SCAN_TIER_RATE.get(tier, settings.SCAN_TIER_RATE["free"])
+        wait = script(
+            keys=[
+                f"ratelimit:host:{host}",
+                f"ratelimit:tier:{tier}",
+                "ratelimit:inflight",
+                f"ratelimit:host:{host}:paused",
+            ],
+            args=[
+                settings.SCAN_HOST_RATE, settings.SCAN_HOST_BURST,
+                tier_rate, tier_rate * 2, settings.SCAN_MAX_INFLIGHT, lease, LEASE_TTL,
+            ],
+        )
+        return float(wait)
+    except redis.RedisError:
+        _down_until = time.monotonic() + RETRY_REDIS_AFTER
+        return None
+
+
+def _release(lease: str):
+    try:
+        _redis()[0].zrem("ratelimit:inflight", lease)
+    except redis.RedisError:
+        pass
+
+
+def enabled() -> bool:
+    return settings.SCAN_LIMITER
+
+
+@contextmanager
+def permit(url: str, tier: str = "free"):
+    """Block until url's host, the tier and the cluster all have room for one more request."""
+    if not enabled():
+        yield
+        return
+    lease, host = uuid.uuid4().hex, _host(url)
+    deadline = time.monotonic() + settings.SCAN_LIMITER_MAX_WAIT
+    while True:
+        wait = _try_acquire(host, tier, lease)
+        if not wait or time.monotonic() + wait > deadline:
+            break  # granted, Redis down, or waited long enough: better a slow scan than a stuck one
+        time.sleep(min(wait, MAX_SLEEP))
+    try:
+        yield
+    finally:
+        if wait == 0:
+            _release(lease)
+
+
+@asynccontextmanager
+async def apermit(url: str, tier: str = "free"):
+    """permit() for the engine loop: waits with asyncio.sleep, and talks to Redis from a thread."""
+    if not enabled():
+        yield
+        return
+    lease, host = uuid.uuid4().hex, _host(url)
+    deadline = time.monotonic() + settings.SCAN_LIMITER_MAX_WAIT
+    while True:
+        # Usually sub-millisecond, but a slow or unreachable Redis would stall every scan on the loop
+        wait = await asyncio.to_thread(_try_acquire, host, tier, lease)
+        if not wait or time.monotonic() + wait > deadline:
+            break
+        await asyncio.sleep(min(wait, MAX_SLEEP))
+    try:
+        yield
+    finally:
+        if wait == 0:
+            await asyncio.to_thread(_release, lease)
+
+
+def observe(url: str, status_code: int, retry_after: str | None):
+    """Honour a target's 429/503 Retry-After for every worker, not just the one that got it."""
+    if not enabled() or status_code not in (429, 503) or not retry_after or not _available():
+        return
+    try:
+        seconds = min(float(retry_after), settings.SCAN_LIMITER_MAX_WAIT)
+    except ValueError:
+        return  # HTTP-date form: not worth parsing for a pause this short
+    try:
+        _redis()[0].set(f"ratelimit:host:{_host(url)}:paused", 1, px=max(int(seconds * 1000), 1))
+    except redis.RedisError:
+        pass
+
+
+async def aobserve(url: str, status_code: int, retry_after: str | None):
+    """observe() for the engine loop."""
+    if status_code in (429, 503):
+        await asyncio.to_thread(observe, url, status_code, retry_after)
+
+
+@contextmanager
+def exclusive_tool(host: str):
+    """One nmap/nikto run per target host across the cluster; waits for the previous one."""
+    if not enabled() or not _available():
+        yield
+        return
+    try:
+        lock = _redis()[0].lock(f"ratelimit:tool:{host.lower()}", timeout=TOOL_LOCK_TTL, blocking_timeout=TOOL_LOCK_TTL)
+        acquired = lock.acquire()
+    except redis.RedisError:
+        lock, acquired = None, False
+    try:
+        yield
+    finally:
+        if acquired:
+            try:
+                lock.release()
+            except redis.RedisError:
+                pass
@@ -0,0 +1,171 @@
+# scanner_tasks/links.py
+
+# Keyword → link discovery ("where is the privacy policy / terms / login page?").
+# Each page's anchors are indexed once per scan: one Aho-Corasick pass (clauses.py)
+# over the lowercased anchor texts records, for every keyword any check has asked
+# for, the first anchor containing it, so each lookup afterwards is a dict probe.
+# When the page has no match, discovery goes on to hub pages linked from its
+# footer ("Legal", "Policies", ...) and then to the site's sitemap.xml, fetching
+# each of those at most once per scan and only while something is still missing.
+
+import re
+import threading
+from urllib.parse import urljoin, urlparse
+from django.conf import settings
+from .clauses import Automaton
+from .context import HostUnreachable, ScanContext
+
+# Footer links worth following when the homepage itself doesn't link what a check wants
+HUB_KEYWORDS = ("legal", "policies", "policy", "privacy", "terms", "imprint", "impressum",
+                "compliance", "trust", "about", "company")
+MAX_SITEMAP_URLS = 5000
+_LOC = re.compile(rb"<loc>\s*([^<\s]+)\s*</loc>", re.IGNORECASE)
+
+# Every keyword asked for in this worker; new indexes cover them all in their one pass
+_vocabulary = set()
+_vocabulary_lock = threading.Lock()
+
+
+def _learn(groups):
+    with _vocabulary_lock:
+        for group in groups:
+            _vocabulary.update(group)
+
+
+def _known() -> frozenset:
+    with _vocabulary_lock:
+        return frozenset(_vocabulary)
+
+
+class LinkIndex:
+    """
+    (text, url) entries in preference order, indexed by keyword. find() returns
+    the best match of a keyword group: its earliest-listed keyword wins, then
+    the earliest entry. Keywords the index wasn't built with are scanned for on
+    first use, so any group works; thread-safe.
+    """
+
+    def __init__(self, entries, keywords=()):
+        self.entries = tuple(entries)
+        self._first = {}  # keyword -> index of the first entry whose text contains it
+        self._scanned = set()
+        self._lock = threading.Lock()
+        self._scan(keywords)
+
+    def _scan(self, keywords):
+        automaton = Automaton(k for k in keywords if k not in self._scanned)
+        if automaton.keywords:
+            for idx, (text, _) in enumerate(self.entries):
+                for keyword in automaton.findall(text):
+                    self._first.setdefault(keyword, idx)
+        self._scanned.update(automaton.keywords)
+
+    def find(self, keywords) -> str | None:
+        keywords = [k.lower() for k in keywords]
+        if not self._scanned.issuperset(keywords):
+            with self._lock:
+                self._scan(keywords)
+        for keyword in keywords:
+            if keyword in self._first:
+                return self.entries[self._first[keyword]][1]
+        return None
+
+    def find_all(self, groups) -> list:
+        return [self.find(group) for group in groups]
+
+
+def page_index(ctx: ScanContext, url: str) -> LinkIndex:
+    """Anchor index of url, built once per scan."""
+    def build():
+        page = ctx.page(url)
+        return LinkIndex(
+            ((anchor.text.lower(), urljoin(url, anchor.href)) for anchor in page.anchors),
+            keywords=_known() | set(HUB_KEYWORDS),
+        )
+    return ctx.once(("links", url), build)
+
+
+def _same_site(url: str, base_url: str) -> bool:
+    host, base = urlparse(url).hostname or "", urlparse(base_url).hostname or ""
+    return host == base or host.endswith(f".{base}") or base.endswith(f".{host}")
+
+
+def _hub_pages(ctx: ScanContext, base_url: str):
+    """Indexes of same-site pages linked from base_url's footer, fetched lazily, best hubs first."""
+    def hubs():
+        anchors = [anchor for anchor in ctx.page(base_url).anchors if anchor.footer]
+        footer = LinkIndex(((a.text.lower(), urljoin(base_url, a.href)) for a in anchors), HUB_KEYWORDS)
+        urls = dict.fromkeys(footer.find([keyword]) for keyword in HUB_KEYWORDS)
+        urls = [u for u in urls if u and _same_site(u, base_url) and u.rstrip("/") != base_url.rstrip("/")]
+        return urls[:settings.SCAN_LINK_HUB_PAGES]
+
+    try:
+        urls = ctx.once(("link-hubs", base_url), hubs)
+    except HostUnreachable:
+        raise
+    except Exception:
+        return
+    for url in urls:
+        try:
+            yield page_index(ctx, url)
+        except HostUnreachable:
+            raise
+        except Exception:
+            continue  # a dead hub page doesn't stop discovery
+
+
+def _sitemap_index(ctx: ScanContext, base_url: str) -> LinkIndex | None:
+    """/sitemap.xml URLs indexed by their path words ("/privacy-policy/" → "privacy policy"), shortest first."""
+    parts = urlparse(base_url)
+    sitemap_url = f"{parts.scheme}://{parts.netloc}/sitemap.xml"
+
+    def build():
+        try:
+            response = ctx.get(sitemap_url, timeout=10)
+        except HostUnreachable:
+            raise
+        except Exception:
+            return None
+        if response.status_code != 200:
+            return None
+        urls = [m.decode(errors="replace") for m in _LOC.findall(response.content)[:MAX_SITEMAP_URLS]]
+        urls = [u for u in urls if _same_site(u, base_url)]
+        entries = sorted(
+            ((re.sub(r"[-_/.]+", " ", urlparse(u).path).strip().lower(), u) for u in urls),
+            key=lambda entry: len(entry[0]),
+        )
+        return LinkIndex(entries, _known())
+
+    return ctx.once(("link-sitemap", sitemap_url), build)
+
+
+def find_links(ctx: ScanContext, groups, base_url: str | None = None) -> list:
+    """
+    Best link for each keyword group, in one pass over base_url's anchors
+    (homepage by default). Groups with no match there are looked up in the
+    footer's hub pages, then in the sitemap; None where nothing matched.
+    """
+    base_url = base_url or ctx.base_url
+    groups = [[k.lower() for k in group] for group in groups]
+    _learn(groups)
+
+    found = page_index(ctx, base_url).find_all(groups)
+
+    def fill(index):
+        for i, group in enumerate(groups):
+            if found[i] is None:
+                found[i] = index.find(group)
+        return all(found)
+
+    if not all(found):
+        for index in _hub_pages(ctx, base_url):
+            if fill(index):
+                return found
+        sitemap = _sitemap_index(ctx, base_url)
+        if sitemap is not None:
+            fill(sitemap)
+    return found
+
+
+def find_link(ctx: ScanContext, keywords, base_url: str | None = None) -> str | None:
+    return find_links(ctx, [keywords], base_url)[0]
@@ -0,0 +1,179 @@
+# scanner_tasks/metrics.py
+
+# Prometheus metrics for scans, checks, Celery queues, PDFs and WebSockets.
+# Recording is a dict update under a lock: inc() and observe() never touch Redis,
+# so they cost nothing on the scan path. One "metrics-flush" daemon thread per
+# process adds what accumulated to a single Redis hash every
+# SCAN_METRICS_FLUSH_INTERVAL seconds (one pipeline of HINCRBYFLOAT), so web and
+# worker processes all sum into the same series. If Redis is down the deltas stay
+# here and go out with the next flush.
+# The hash holds exposition-format series ('scanner_scans_total{status="completed",tier="pro"}'),
+# histograms as cumulative _bucket/_sum/_count series. render() is what views.prometheus_metrics
+# serves: those series plus what is only known at scrape time (Celery queue lengths,
+# result cache hits and misses). Gauges are summed deltas too: a process killed with
+# WebSocket connections open leaves them counted until the hash is reset.
+
+import os
+import threading
+import time
+import redis
+from django.conf import settings
+from . import publisher, result_cache
+
+PREFIX = "scanner_"
+KEY = "metrics:series"
+
+SECONDS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+BYTES = (10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000, 10_000_000)
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    "scans_total": ("counter", "Finished scans by tier and final status.", None),
+    "scan_duration_seconds": ("histogram", "Time from scan creation to completion, queue wait included.", SECONDS),
+    "check_runs_total": ("counter", "Check runs by outcome: ok, error (the check raised) or cached.", None),
+    "check_duration_seconds": ("histogram", "Wall time of one check run; cached results excluded.", SECONDS),
+    "celery_task_wait_seconds": ("histogram", "Time a Celery task sat in its queue before starting.", SECONDS),
+    "pdf_render_seconds": ("histogram", "WeasyPrint render time of one PDF report.", SECONDS),
+    "pdf_size_bytes": ("histogram", "Size of one rendered PDF report.", BYTES),
+    "websocket_connections": ("gauge", "Open WebSocket connections by consumer.", None),
+    "ws_messages_total": ("counter", "Worker WebSocket messages by outcome (scanner_tasks/publisher.py).", None),
+}
+# Read at scrape time instead of recorded
+SCRAPED = {
+    "celery_queue_length": ("gauge", "Tasks waiting in a Celery queue.", None),
+    "result_cache_requests_total": ("counter", "Cross-scan result cache lookups by outcome.", None),
+}
+
+_lock = threading.Lock()
+_pending = {}    # series -> amount recorded since the last flush
+_published = {}  # publisher.stats() at the last flush
+_pid = None
+_client = None
+_broker = None
+
+
+def _redis():
+    global _client
+    if _client is None:
+        _client = redis.from_url(settings.SCAN_METRICS_REDIS_URL, socket_timeout=1, socket_connect_timeout=1)
+    return _client
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _series(name: str, labels: dict, **extra) -> str:
+    # extra goes last so that le ends every bucket, as Prometheus prints it
+    pairs = [f'{key}="{_escape(value)}"' for key, value in [*sorted(labels.items()), *extra.items()]]
+    return f"{PREFIX}{name}{{{','.join(pairs)}}}" if pairs else f"{PREFIX}{name}"
+
+
+def _add(updates: dict):
+    global _pid
+    with _lock:
+        if _pid != os.getpid():  # first use, or a forked worker that inherited its parent's buffer
+            _pending.clear()
+            _published.clear()
+            _pid = os.getpid()
+            threading.Thread(target=_run, name="metrics-flush", daemon=True).start()
+        for series, amount in updates.items():
+            _pending[series] = _pending.get(series, 0) + amount
+
+
+def inc(name: str, amount: float = 1, **labels):
+    """Add amount to a counter, or to a gauge (negative to decrease it)."""
+    _add({_series(name, labels): amount})
+
+
+def observe(name: str, value: float, **labels):
+    """Record one value in a histogram."""
+    updates = {_series(f"{name}_bucket", labels, le=f"{bound:g}"): 1 for bound in METRICS[name][2] if value <= bound}
+    updates[_series(f"{name}_bucket", labels, le="+Inf")] = 1
+    updates[_series(f"{name}_sum", labels)] = value
+    updates[_series(f"{name}_count", labels)] = 1
+    _add(updates)
+
+
+def _run():
+    while True:
+        time.sleep(settings.SCAN_METRICS_FLUSH_INTERVAL)
+        flush()
+
+
+def _collect():
+    # The publisher counts per process; turn its totals into deltas like everything else
+    stats = publisher.stats()
+    for outcome in ("sent", "coalesced", "dropped", "failed"):
+        delta = stats[outcome] - _published.get(outcome, 0)
+        if delta:
+            inc("ws_messages_total", delta, outcome=outcome)
+        _published[outcome] = stats[outcome]
+
+
+def flush():
+    """Add what this process recorded since the last flush to the shared series."""
+    _collect()
+    with _lock:
+        batch = dict(_pending)
+        _pending.clear()
+    if not batch:
+        return
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        for series, amount in batch.items():
+            pipe.hincrbyfloat(KEY, series, amount)
+        pipe.execute()
+    except Exception:
+        _add(batch)  # Redis down: keep the deltas for the next flush
+
+
+def _scraped() -> dict:
+    global _broker
+    series = {}
+    try:
+        if _broker is None:
+            _broker = redis.from_url(settings.CELERY_BROKER_URL, socket_timeout=1, socket_connect_timeout=1)
+        for queue in ("celery", settings.SCAN_HEAVY_QUEUE):
+            series[_series("celery_queue_length", {"queue": queue})] = _broker.llen(queue)
+    except Exception:
+        pass  # broker down, or not Redis
+    for outcome, count in result_cache.stats().items():
+        series[_series("result_cache_requests_total", {"outcome": outcome})] = count
+    return series
+
+
+def _family(series: str) -> str:
+    name = series.split("{", 1)[0]
+    for suffix in ("_bucket", "_sum", "_count"):
+        base = name.removesuffix(suffix)
+        if base != name and METRICS.get(base[len(PREFIX):], ("",))[0] == "histogram":
+            return base
+    return name
+
+
+def _order(series: str):
+    # Buckets by bound, not alphabetically
+    head, sep, bound = series.partition('le="')
+    return head, float(bound.rstrip('"}').replace("+Inf", "inf")) if sep else 0
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render() -> str:
+    """All series in the Prometheus text exposition format (0.0.4)."""
+    try:
+        series = {field.decode(): float(value) for field, value in _redis().hgetall(KEY).items()}
+    except Exception:
+        series = {}
+    series.update(_scraped())
+    families = {}
+    for field, value in series.items():
+        families.setdefault(_family(field), []).append((field, value))
+    lines = []
+    for name, (kind, help_text, _) in {**METRICS, **SCRAPED}.items():
+        lines += [f"# HELP {PREFIX}{name} {help_text}", f"# TYPE {PREFIX}{name} {kind}"]
+        lines += [f"{field} {_number(value)}" for field, value in sorted(families.get(PREFIX + name, []), key=lambda s: _order(s[0]))]
+    return "\n".join(lines) + "\n"
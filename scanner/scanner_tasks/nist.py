@@ -1,14 +1,18 @@
 # scanner_tasks/nist.py
 
 import nmap
-import requests
-from bs4 import BeautifulSoup
+from .context import HostUnreachable, ScanContext
+from .registry import check_meta
+from .sandbox import run_tool
+from .limiter import exclusive_tool
+from . import crawler
 
-def check_third_party_scripts(domain):
+@check_meta(crawl=True)
+def check_third_party_scripts(domain, ctx: ScanContext | None = None):
+    ctx = ctx or ScanContext(domain)
     try:
-        response = requests.get(f"https://{domain}", timeout=10)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        external = [s['src'] for s in soup.find_all('script', src=True) if domain not in s['src']]
+        pages = crawler.pages(ctx) or [ctx.page(timeout=10)]
+        external = list(dict.fromkeys(src for page in pages for src in page.scripts if domain not in src))
         status = "warn" if len(external) > 8 else "pass"
         return {
             "title": "Third-Party Scripts",
@@ -17,13 +21,23 @@ def check_third_party_scripts(domain):
             "standard": "NIST",
             "module": "Supply Chain",
         }
+    except HostUnreachable:
+        raise
     except:
         return {"title": "Scripts", "status": "error", "details": "Failed", "module": "Supply Chain"}
 
-def run_nmap_vuln_scan(domain):
+@check_meta(cost="heavy")
+def run_nmap_vuln_scan(domain, ctx: ScanContext | None = None):
+    ctx = ctx or ScanContext(domain)
     try:
+        # Run the binary ourselves (rlimits, kill on cancel) and let python-nmap parse the XML
+        cmd = ['nmap', '-oX', '-', '--top-ports', '100', '-sV', '--script', 'vuln', domain]
+        with exclusive_tool(domain):
+            result = run_tool(cmd, timeout=600, should_stop=ctx.cancelled)
+        if not result.ok:
+            raise RuntimeError(result.killed or f"nmap exited {result.returncode}")
         nm = nmap.PortScanner()
-        nm.scan(domain, arguments='--top-ports 100 -sV --script vuln')
+        nm.analyse_nmap_xml_scan(nmap_xml_output=result.stdout)
         vulns = []
         for host in nm.all_hosts():
             for proto in nm[host].all_protocols():
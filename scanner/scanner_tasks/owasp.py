@@ -1,14 +1,18 @@
 # scanner_tasks/owasp.py
 
-import requests
-from .helpers import _get_headers, _find_link, _fetch_page_text
+from .helpers import _get_headers, _find_link
 from .encryption import check_ssl_tls
-import subprocess
+from .context import HostUnreachable, ScanContext
+from .registry import check_meta
+from .sandbox import run_tool
+from .limiter import exclusive_tool
+import asyncio
 import json
 
-def check_broken_access_control(domain: str):
+async def check_broken_access_control(domain: str, ctx: ScanContext | None = None):
+    ctx = ctx or ScanContext(domain)
     try:
-        resp = requests.get(f"https://{domain}/admin", timeout=10, allow_redirects=False)
+        resp = await ctx.aget(f"{ctx.base_url}/admin", timeout=10, allow_redirects=False)
         status = "fail" if resp.status_code in [200, 301, 302] else "pass"
         return {
             "title": "Admin Endpoint Exposure (A01)",
@@ -18,11 +22,14 @@ def check_broken_access_control(domain: str):
             "risk_level": "high" if status == "fail" else "low",
             "module": "OWASP",
         }
+    except HostUnreachable:
+        raise
     except:
         return {"title": "Access Control", "status": "pass", "details": "/admin not found", "module": "OWASP"}
 
-def check_crypto_failures(domain: str):
-    result = check_ssl_tls(domain)
+@check_meta(incremental=False)
+def check_crypto_failures(domain: str, ctx: ScanContext | None = None):
+    result = check_ssl_tls(domain, ctx)
     if result["status"] in ["warn", "fail"]:
         result.update({
             "title": "Weak TLS (A02)",
@@ -32,17 +39,18 @@ def check_crypto_failures(domain: str):
         })
     return result
 
-def check_sql_injection(domain: str):
+async def check_sql_injection(domain: str, ctx: ScanContext | None = None):
+    ctx = ctx or ScanContext(domain)
     payloads = ["' OR '1'='1", "1; DROP TABLE users--"]
-    vulnerable = False
-    for p in payloads:
-        try:
-            r = requests.get(f"https://{domain}/search?q={p}", timeout=8)
-            if any(err in r.text.lower() for err in ["sql", "syntax"]):
-                vulnerable = True
-                break
-        except:
-            pass
+    # Each probe stops reading at the first SQL error marker
+    searches = await asyncio.gather(
+        *(ctx.asearch(f"{ctx.base_url}/search?q={p}", ["sql", "syntax"], timeout=8) for p in payloads),
+        return_exceptions=True,
+    )
+    for s in searches:
+        if isinstance(s, HostUnreachable):
+            raise s  # no answer is not the same as no SQL error
+    vulnerable = any(not isinstance(s, Exception) and s[1] for s in searches)
     status = "fail" if vulnerable else "pass"
     return {
         "title": "SQL Injection (A03)",
@@ -53,8 +61,8 @@ def check_sql_injection(domain: str):
         "module": "OWASP",
     }
 
-def check_missing_security_headers(domain: str):
-    headers = _get_headers(domain)
+def check_missing_security_headers(domain: str, ctx: ScanContext | None = None):
+    headers = _get_headers(domain, ctx)
     required = ["Content-Security-Policy", "X-Frame-Options", "X-Content-Type-Options"]
     missing = [h for h in required if h not in headers]
     status = "fail" if missing else "pass"
@@ -67,10 +75,11 @@ def check_missing_security_headers(domain: str):
         "module": "OWASP",
     }
 
-def check_security_misconfig(domain: str):
+async def check_security_misconfig(domain: str, ctx: ScanContext | None = None):
+    ctx = ctx or ScanContext(domain)
     try:
-        resp = requests.get(f"https://{domain}/phpinfo.php", timeout=10)
-        if resp.status_code == 200 and "phpinfo()" in resp.text:
+        status_code, found = await ctx.asearch(f"{ctx.base_url}/phpinfo.php", ["phpinfo()"], timeout=10)
+        if status_code == 200 and found:
             return {
                 "title": "PHP Info Exposure (A05)",
                 "status": "fail",
@@ -79,12 +88,14 @@ def check_security_misconfig(domain: str):
                 "risk_level": "high",
                 "module": "OWASP",
             }
+    except HostUnreachable:
+        raise
     except:
         pass
     return {"title": "Misconfig", "status": "pass", "details": "No exposure", "module": "OWASP"}
 
-def check_outdated_software(domain: str):
-    headers = _get_headers(domain)
+def check_outdated_software(domain: str, ctx: ScanContext | None = None):
+    headers = _get_headers(domain, ctx)
     server = headers.get("Server", "").lower()
     powered = headers.get("X-Powered-By", "").lower()
     outdated = []
@@ -102,28 +113,32 @@ def check_outdated_software(domain: str):
         "module": "OWASP",
     }
 
-def check_auth_failures(domain: str):
-    login_url = _find_link(domain, ["login", "sign in"])
+def check_auth_failures(domain: str, ctx: ScanContext | None = None):
+    ctx = ctx or ScanContext(domain)
+    login_url = _find_link(domain, ["login", "sign in"], ctx=ctx)
     if not login_url:
         return {"title": "Login Not Found (A07)", "status": "warn", "details": "No login", "module": "OWASP"}
-    text = _fetch_page_text(login_url)
-    weak = not any(p in text for p in ["mfa", "2fa", "two-factor"])
+    clauses = ctx.clauses(login_url)
+    weak = "auth.mfa" not in clauses
     status = "warn" if weak else "pass"
     return {
         "title": "Weak Auth (A07)",
         "status": status,
         "details": f"MFA hint: {'Missing' if weak else 'Present'}",
+        "evidence": clauses.snippet("auth.mfa"),
         "standard": "OWASP A07:2021",
         "risk_level": "medium",
         "module": "OWASP",
     }
 
-def check_integrity_failures(domain: str):
+@check_meta(network=False)
+def check_integrity_failures(domain: str, ctx: ScanContext | None = None):
     return {"title": "Integrity (A08)", "status": "pass", "details": "No untrusted JS", "module": "OWASP"}
 
-def check_logging_monitoring(domain: str):
+async def check_logging_monitoring(domain: str, ctx: ScanContext | None = None):
+    ctx = ctx or ScanContext(domain)
     try:
-        r = requests.get(f"https://{domain}/error.log", timeout=10)
+        r = await ctx.aget(f"{ctx.base_url}/error.log", timeout=10)
         if r.status_code == 200:
             return {
                 "title": "Error Log Exposure (A09)",
@@ -133,18 +148,24 @@ def check_logging_monitoring(domain: str):
                 "risk_level": "high",
                 "module": "OWASP",
             }
+    except HostUnreachable:
+        raise
     except:
         pass
     return {"title": "Logging", "status": "pass", "details": "No leaks", "module": "OWASP"}
 
-def check_ssrf(domain: str):
+@check_meta(network=False)
+def check_ssrf(domain: str, ctx: ScanContext | None = None):
     return {"title": "SSRF (A10)", "status": "pass", "details": "Blocked", "module": "OWASP"}
 
-def run_nikto_scan(domain):
+@check_meta(cost="heavy")
+def run_nikto_scan(domain, ctx: ScanContext | None = None):
+    ctx = ctx or ScanContext(domain)
     try:
         cmd = ['nikto', '-h', f"https://{domain}", '-Format', 'json', '-output', '-']
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
-        if result.returncode == 0:
+        with exclusive_tool(domain):
+            result = run_tool(cmd, timeout=120, should_stop=ctx.cancelled)
+        if result.ok:
             data = json.loads(result.stdout)
             vulns = data.get('vulnerabilities', [])
             status = "fail" if vulns else "pass"
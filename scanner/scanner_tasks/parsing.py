@@ -0,0 +1,139 @@
+# scanner_tasks/parsing.py
+
+# One parse per fetched page. parse() picks the fastest HTML backend installed
+# (selectolax, then BeautifulSoup on lxml, then BeautifulSoup on html.parser) and
+# pulls out what the checks read: anchors, forms, script srcs and visible text.
+# Checks that need more get page.soup, a BeautifulSoup tree built on first use
+# (the bs4 backends hand over the tree they already parsed).
+
+import time
+from dataclasses import dataclass, field
+from functools import cached_property
+from bs4 import BeautifulSoup
+from django.conf import settings
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import lxml  # noqa: F401  (only needs to be importable for bs4's "lxml" builder)
+    BS4_FEATURES = "lxml"
+except ImportError:
+    BS4_FEATURES = "html.parser"
+
+# Subtrees whose text is not part of a page's visible text
+HIDDEN_TAGS = ("script", "style", "nav", "footer")
+
+
+def _footerish(tag: str, element_id, element_class) -> bool:
+    if isinstance(element_class, (list, tuple)):  # bs4 splits class into a list
+        element_class = " ".join(element_class)
+    return tag == "footer" or "footer" in f"{element_id or ''} {element_class or ''}".lower()
+
+
+@dataclass(frozen=True)
+class Anchor:
+    href: str
+    text: str             # stripped, as get_text(strip=True)
+    footer: bool = False  # inside <footer> or an element with "footer" in its id/class
+
+
+@dataclass(frozen=True)
+class Form:
+    action: str
+    method: str
+
+
+@dataclass(frozen=True)
+class ParsedPage:
+    """Read-only extracts of one page; shared by every check of the scan."""
+    url: str
+    anchors: tuple = ()
+    forms: tuple = ()
+    scripts: tuple = ()  # src of every external script, as written
+    text: str = ""       # lowercased visible text (no script/style/nav/footer)
+    backend: str = ""
+    parse_ms: float = 0
+    html: str = field(default="", repr=False)
+
+    @cached_property
+    def soup(self) -> BeautifulSoup:
+        """Full bs4 tree for checks that need more than the extracts. Do not mutate it."""
+        return BeautifulSoup(self.html, BS4_FEATURES)
+
+
+def backend() -> str:
+    choice = getattr(settings, "SCAN_HTML_BACKEND", "auto")
+    if choice == "auto":
+        return "selectolax" if LexborHTMLParser else BS4_FEATURES
+    if (choice == "selectolax" and not LexborHTMLParser) or (choice == "lxml" and BS4_FEATURES != "lxml"):
+        return BS4_FEATURES  # configured backend not installed on this worker
+    return choice
+
+
+def _in_footer_selectolax(node) -> bool:
+    node = node.parent
+    while node is not None:
+        if _footerish(node.tag, node.attributes.get("id"), node.attributes.get("class")):
+            return True
+        node = node.parent
+    return False
+
+
+def _in_footer_bs4(tag) -> bool:
+    return any(_footerish(parent.name, parent.get("id"), parent.get("class")) for parent in tag.parents)
+
+
+def _parse_selectolax(html: str) -> dict:
+    tree = LexborHTMLParser(html)
+    extracts = {
+        "anchors": tuple(
+            Anchor(node.attributes.get("href") or "", node.text(strip=True), _in_footer_selectolax(node))
+            for node in tree.css("a[href]")
+        ),
+        "forms": tuple(
+            Form(node.attributes.get("action") or "", (node.attributes.get("method") or "get").lower())
+            for node in tree.css("form")
+        ),
+        "scripts": tuple(node.attributes.get("src") or "" for node in tree.css("script[src]")),
+    }
+    tree.strip_tags(list(HIDDEN_TAGS))  # our own tree: nobody else sees it
+    root = tree.root
+    extracts["text"] = root.text(separator=" ").lower() if root is not None else ""
+    return extracts
+
+
+def _parse_bs4(html: str, features: str):
+    soup = BeautifulSoup(html, features)
+    # get_text() already leaves out script/style bodies and comments; skip nav/footer without mutating
+    text = " ".join(
+        s for s in soup.strings if not any(parent.name in HIDDEN_TAGS for parent in s.parents)
+    )
+    extracts = {
+        "anchors": tuple(
+            Anchor(a["href"], a.get_text(strip=True), _in_footer_bs4(a)) for a in soup.find_all("a", href=True)
+        ),
+        "forms": tuple(
+            Form(f.get("action") or "", (f.get("method") or "get").lower()) for f in soup.find_all("form")
+        ),
+        "scripts": tuple(s["src"] for s in soup.find_all("script", src=True)),
+        "text": text.lower(),
+    }
+    return extracts, soup
+
+
+def parse(html: str, url: str = "") -> ParsedPage:
+    name = backend()
+    start = time.perf_counter()
+    if name == "selectolax":
+        extracts, soup = _parse_selectolax(html), None
+    else:
+        extracts, soup = _parse_bs4(html, name)
+    page = ParsedPage(
+        url=url, backend=name, parse_ms=(time.perf_counter() - start) * 1000, html=html, **extracts
+    )
+    if soup is not None:
+        page.__dict__["soup"] = soup  # already parsed: seed the cached_property instead of parsing twice
+    return page
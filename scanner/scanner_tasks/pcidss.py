@@ -1,9 +1,10 @@
 # scanner_tasks/pcidss.py
 
 from .helpers import _get_headers
+from .context import ScanContext
 
-def check_pci_dss_logging(domain: str):
-    headers = _get_headers(domain)
+def check_pci_dss_logging(domain: str, ctx: ScanContext | None = None):
+    headers = _get_headers(domain, ctx)
     leaked = any(k in headers.get("Server", "") for k in ["Apache", "nginx", "IIS"])
     status = "fail" if leaked else "pass"
     return {
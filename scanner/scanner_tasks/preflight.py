@@ -0,0 +1,45 @@
+# scanner_tasks/preflight.py
+
+import socket
+from dataclasses import dataclass
+from django.conf import settings
+from . import resolver
+
+
+@dataclass(frozen=True)
+class Reachability:
+    host: str
+    addresses: tuple = ()
+    open_ports: tuple = ()
+    error: str | None = None
+
+    @property
+    def reachable(self) -> bool:
+        return bool(self.open_ports)
+
+    def summary(self) -> str:
+        if self.reachable:
+            return f"{self.host} → {self.addresses[0]} (ports {', '.join(map(str, self.open_ports))} open)"
+        return f"{self.host} unreachable: {self.error}"
+
+
+def preflight(host: str, ports=(443, 80), timeout: float | None = None, resolution=None) -> Reachability:
+    """
+    Resolve host and try a TCP connect on 443/80 before any check runs, so a
+    dead or typo'd domain costs a few seconds instead of every check's timeout.
+    Pass the scan's resolution (ScanContext.resolve) to probe the pinned address.
+    """
+    timeout = timeout or getattr(settings, "SCAN_PREFLIGHT_TIMEOUT", 3)
+    resolution = resolution or resolver.resolve(host)
+    if not resolution.addresses:
+        return Reachability(host=host, error=f"DNS lookup failed ({resolution.error or 'no addresses'})")
+    addresses = resolution.addresses
+
+    open_ports, last_error = [], None
+    for port in ports:
+        try:
+            with socket.create_connection((addresses[0], port), timeout=timeout):
+                open_ports.append(port)
+        except OSError as e:
+            last_error = f"port {port}: {e}"
+    return Reachability(host=host, addresses=addresses, open_ports=tuple(open_ports), error=last_error)
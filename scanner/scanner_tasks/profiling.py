@@ -0,0 +1,181 @@
+# scanner_tasks/profiling.py
+
+# Per-check instrumentation. runner.py runs every check inside measure(); while it
+# runs, each request it sends reports into its CheckProfile through a context
+# variable: ScanContext counts requests, bytes, timeouts and errors, and the
+# connection hooks time DNS and TCP connect (resolver.py), TLS (install() below for
+# requests, the httpcore trace extension for httpx) and time to first byte.
+# Connection phases only cost anything on new connections; reused keep-alive ones
+# show up as requests with a TTFB alone. Requests sent outside any check
+# (preflight, revalidation) only count in the scan totals.
+# summary() is what tasks.py stores on ScanResult.profile:
+#   {"checks": {test name: CheckProfile fields}, "scan": totals + DNS / parse timings}
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+import httpx
+import requests
+from urllib3 import connection as urllib3_connection
+
+PHASES = ("dns", "connect", "tls", "ttfb")
+TIMEOUTS = (requests.exceptions.Timeout, httpx.TimeoutException, TimeoutError)
+SUMMED = ("requests", "bytes", "dns_ms", "connect_ms", "tls_ms", "ttfb_ms", "timeouts", "errors")
+
+_check = contextvars.ContextVar("scan_check_profile", default=None)
+_request = contextvars.ContextVar("scan_request_phases", default=None)
+_original_ssl_wrap_socket = urllib3_connection.ssl_wrap_socket
+
+
+@dataclass
+class CheckProfile:
+    wall_ms: float = 0
+    cpu_ms: float | None = None  # thread CPU of a blocking check; None for coroutines (they share the loop)
+    requests: int = 0
+    bytes: int = 0
+    dns_ms: float = 0
+    connect_ms: float = 0
+    tls_ms: float = 0
+    ttfb_ms: float = 0
+    timeouts: int = 0
+    errors: int = 0
+    exception: str | None = None  # class name if the check itself raised
+    cached: bool = False          # result reused from the cross-scan cache
+
+    def __post_init__(self):
+        self._lock = threading.Lock()  # to_thread workers of one check report concurrently
+
+    def add(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                setattr(self, name, getattr(self, name) + amount)
+
+    def as_dict(self) -> dict:
+        return {name: round(value, 1) if isinstance(value, float) else value for name, value in asdict(self).items()}
+
+
+@contextmanager
+def measure(profile: CheckProfile, blocking: bool = True):
+    """Attribute what runs inside to profile; blocking: the check runs on this thread (CPU time is its own)."""
+    token = _check.set(profile)
+    start, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield profile
+    finally:
+        profile.wall_ms = (time.perf_counter() - start) * 1000
+        if blocking:
+            profile.cpu_ms = (time.thread_time() - cpu) * 1000
+        _check.reset(token)
+
+
+def current() -> CheckProfile | None:
+    return _check.get()
+
+
+async def within(profile: CheckProfile | None, coro):
+    """Await coro as part of profile's check; for work handed to the engine loop, which has its own context."""
+    _check.set(profile)  # this task's copy of the context only
+    return await coro
+
+
+def cpu_timed(profile: CheckProfile, func, *args):
+    """func(*args), adding the CPU time of the calling thread to profile (blocking checks run from the loop)."""
+    cpu = time.thread_time()
+    try:
+        return func(*args)
+    finally:
+        profile.cpu_ms = (time.thread_time() - cpu) * 1000
+
+
+class _Request:
+    def __init__(self):
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.bytes = 0
+        self._started = {}
+
+    def first_byte(self, elapsed_ms: float):
+        """requests' elapsed runs from send to headers, new connection included: keep the server's share."""
+        self.phases["ttfb"] = max(elapsed_ms - self.phases["dns"] - self.phases["connect"] - self.phases["tls"], 0)
+
+    async def trace(self, event: str, info: dict):
+        """httpcore trace extension: TLS handshake and request-headers-sent → response-headers-received."""
+        name, _, stage = event.rpartition(".")
+        now = time.perf_counter()
+        if stage == "started":
+            self._started[name] = now
+        elif stage == "complete" and name in self._started:
+            if name == "connection.start_tls":
+                self.phases["tls"] += (now - self._started[name]) * 1000
+            elif name.endswith("receive_response_headers"):
+                sent = self._started.get(name.replace("receive_response_headers", "send_request_headers"))
+                self.phases["ttfb"] += (now - (sent or self._started[name])) * 1000
+
+
+@contextmanager
+def request(totals: CheckProfile | None = None):
+    """One outbound request: its phases, bytes and outcome go to the running check and to totals."""
+    req = _Request()
+    token = _request.set(req)
+    outcome = {}
+    try:
+        yield req
+    except Exception as e:
+        outcome = {"timeouts": 1} if isinstance(e, TIMEOUTS) else {"errors": 1}
+        raise
+    finally:
+        _request.reset(token)
+        amounts = {"requests": 1, "bytes": req.bytes, **{f"{p}_ms": ms for p, ms in req.phases.items()}, **outcome}
+        check = _check.get()
+        for profile in (check, totals if totals is not check else None):
+            if profile is not None:
+                profile.add(**amounts)
+
+
+def phase(name: str, ms: float):
+    """Called by connection hooks: add ms to a phase of the request being sent, if any."""
+    req = _request.get()
+    if req is not None:
+        req.phases[name] += ms
+
+
+def _ssl_wrap_socket(*args, **kwargs):
+    start = time.perf_counter()
+    try:
+        return _original_ssl_wrap_socket(*args, **kwargs)
+    finally:
+        phase("tls", (time.perf_counter() - start) * 1000)
+
+
+def install():
+    """Time urllib3's TLS handshakes (requests); idempotent."""
+    urllib3_connection.ssl_wrap_socket = _ssl_wrap_socket
+
+
+def summary(ctx) -> dict:
+    """The profile of one ScanContext: its checks, its totals and its DNS / parse timings."""
+    totals = ctx.totals.as_dict()
+    dns, parse = ctx.timings["dns"], ctx.timings["parse"]
+    return {
+        "checks": {name: profile.as_dict() for name, profile in ctx.profiles.items()},
+        "scan": {
+            **{name: totals[name] for name in SUMMED},
+            "dns_lookups": len(dns),
+            "dns_lookup_ms": round(sum(t["ms"] for t in dns), 1),
+            "pages_parsed": len(parse),
+            "parse_ms": round(sum(t["ms"] for t in parse), 1),
+        },
+    }
+
+
+def merge(profiles) -> dict:
+    """One profile out of the summaries of a fanned-out scan's contexts."""
+    merged = {"checks": {}, "scan": {}}
+    for profile in profiles:
+        if not profile:
+            continue
+        merged["checks"].update(profile["checks"])
+        for name, value in profile["scan"].items():
+            merged["scan"][name] = round(merged["scan"].get(name, 0) + value, 1)
+    return merged
@@ -0,0 +1,57 @@
+# scanner_tasks/progress.py
+
+# Coalesced scan progress. The progress bar only ever shows the latest state, so
+# ScanProgress keeps it in memory and writes it through — the progress/current_step
+# UPDATE and the "scan.update" WebSocket message — at most once per
+# SCAN_PROGRESS_SAVE_INTERVAL / SCAN_PROGRESS_SEND_INTERVAL seconds, right away for
+# milestones, and always on flush(). A scan of 40 checks costs a handful of writes.
+# Messages go through the worker's publisher (publisher.py) and never block.
+
+import threading
+import time
+from django.conf import settings
+from . import publisher
+
+
+class ScanProgress:
+    """Progress of one scan, persisted and published at a bounded rate. Thread-safe."""
+
+    def __init__(self, scan):
+        self.scan = scan
+        self._lock = threading.Lock()
+        self._saved_at = self._sent_at = None  # monotonic time of the last row write / message
+        self._unsaved = self._unsent = False
+
+    def update(self, progress: int, step: str, milestone: bool = False):
+        with self._lock:
+            self.scan.progress = progress
+            self.scan.current_step = step
+            self._unsaved = self._unsent = True
+            now = time.monotonic()
+            self._write(
+                save=milestone or self._due(self._saved_at, now, settings.SCAN_PROGRESS_SAVE_INTERVAL),
+                send=milestone or self._due(self._sent_at, now, settings.SCAN_PROGRESS_SEND_INTERVAL),
+                now=now,
+            )
+
+    def flush(self):
+        """Write through whatever the last update() held back."""
+        with self._lock:
+            self._write(save=True, send=True, now=time.monotonic())
+
+    @staticmethod
+    def _due(last, now, interval) -> bool:
+        return last is None or now - last >= interval
+
+    def _write(self, save, send, now):
+        if save and self._unsaved:
+            self.scan.save(update_fields=['progress', 'current_step'])
+            self._saved_at, self._unsaved = now, False
+        if send and self._unsent:
+            publisher.publish(f"scan_{self.scan.id}", {
+                "type": "scan.update",
+                "progress": self.scan.progress,
+                "step": self.scan.current_step,
+                "status": "running",
+            })
+            self._sent_at, self._unsent = now, False
@@ -0,0 +1,119 @@
+# scanner_tasks/publisher.py
+
+# WebSocket fan-out from Celery workers. publish() appends to a bounded in-memory
+# queue and returns; it never waits on Redis. One "ws-publisher" daemon thread per
+# worker process runs its own event loop, holds the channel layer (and with it one
+# Redis connection pool) for the life of the process, and drains the queue in
+# batches of up to SCAN_WS_BATCH_SIZE:
+#   - a running scan.update superseded by a newer one for the same group is dropped,
+#   - groups are sent concurrently, each group's messages in order.
+# When Redis falls behind and SCAN_WS_QUEUE_SIZE messages are waiting, new ones are
+# dropped and counted (stats()) rather than ever blocking a scan. flush() sends what
+# is still queued when the worker process shuts down (core/celery.py).
+
+import asyncio
+import threading
+from collections import deque
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+_queue = deque()
+_lock = threading.Lock()
+_loop = None
+_wakeup = None
+_sending = None
+_stats = {"published": 0, "sent": 0, "coalesced": 0, "dropped": 0, "failed": 0}
+
+
+def _start():
+    global _loop, _wakeup, _sending
+    _loop = asyncio.new_event_loop()
+    _wakeup = asyncio.Event()
+    _sending = asyncio.Lock()
+    threading.Thread(target=_loop.run_forever, name="ws-publisher", daemon=True).start()
+    asyncio.run_coroutine_threadsafe(_drain(), _loop)
+
+
+def publish(group: str, message: dict) -> bool:
+    """Queue message for group; False if it was dropped because the queue is full."""
+    with _lock:
+        if _loop is None:
+            _start()
+        if len(_queue) >= settings.SCAN_WS_QUEUE_SIZE:
+            _stats["dropped"] += 1
+            return False
+        _queue.append((group, message))
+        _stats["published"] += 1
+        wake = len(_queue) == 1  # otherwise the drainer has been woken already
+    if wake:
+        _loop.call_soon_threadsafe(_wakeup.set)
+    return True
+
+
+def flush(timeout: float = 5.0) -> bool:
+    """Send everything queued so far, waiting at most timeout seconds; False if that wasn't enough."""
+    with _lock:
+        loop = _loop
+    if loop is None:
+        return True
+    future = asyncio.run_coroutine_threadsafe(_send_queued(get_channel_layer()), loop)
+    try:
+        future.result(timeout)
+    except Exception:  # only the timeout: sends never raise
+        future.cancel()
+        return False
+    return True
+
+
+def stats() -> dict:
+    with _lock:
+        return {**_stats, "queued": len(_queue)}
+
+
+def _count(key: str, n: int = 1):
+    with _lock:
+        _stats[key] += n
+
+
+def _superseded(previous: dict, message: dict) -> bool:
+    # The progress bar only shows the latest state; the final "complete" update is never dropped
+    return previous.get("type") == message.get("type") == "scan.update" and previous.get("status") == "running"
+
+
+async def _drain():
+    layer = get_channel_layer()
+    while True:
+        await _wakeup.wait()
+        _wakeup.clear()
+        await _send_queued(layer)
+
+
+async def _send_queued(layer):
+    # One sender at a time (the drainer or a flush), so each group's messages stay in order
+    async with _sending:
+        while True:
+            with _lock:
+                batch = [_queue.popleft() for _ in range(min(len(_queue), settings.SCAN_WS_BATCH_SIZE))]
+            if not batch:
+                return
+            await _send(layer, batch)
+
+
+async def _send(layer, batch):
+    by_group = {}
+    for group, message in batch:
+        messages = by_group.setdefault(group, [])
+        if messages and _superseded(messages[-1], message):
+            messages.pop()
+            _count("coalesced")
+        messages.append(message)
+    await asyncio.gather(*(_send_group(layer, group, messages) for group, messages in by_group.items()))
+
+
+async def _send_group(layer, group: str, messages):
+    for message in messages:
+        try:
+            await asyncio.wait_for(layer.group_send(group, message), settings.SCAN_WS_SEND_TIMEOUT)
+            _count("sent")
+        except Exception:
+            _count("failed")  # Never crash (or stall) anything because of a WebSocket
@@ -0,0 +1,23 @@
+# scanner_tasks/registry.py
+
+# Scheduling metadata attached to check functions, read by scanner/tasks.py.
+#   cost:        "cheap" (a few HTTP requests) or "heavy" (external tools such as nmap/nikto)
+#   network:     False for checks that never touch the target (not short-circuited when it's down)
+#   version:     bump when a check's logic changes, so cached results from the old logic are ignored
+#   incremental: False for checks with inputs other than HTTP pages (TLS handshakes, tools),
+#                which must re-run even when every page they read is unchanged
+#   cache_ttl:   seconds a result may be reused across scans (0 = never); defaults by cost
+#   crawl:       True for checks that read every crawled page (crawler.py); their cached and
+#                carried-forward results are only reused by scans with the same crawl limits
+
+
+def check_meta(**meta):
+    """Decorator: attach metadata to a check function."""
+    def wrap(func):
+        func.check_meta = {**getattr(func, "check_meta", {}), **meta}
+        return func
+    return wrap
+
+
+def get_meta(func, key, default=None):
+    return getattr(func, "check_meta", {}).get(key, default)
@@ -0,0 +1,202 @@
+# scanner_tasks/resolver.py
+
+# Worker-wide DNS cache. Answers are kept for their TTL (clamped to
+# SCAN_DNS_MIN_TTL..SCAN_DNS_MAX_TTL), so dozens of checks and concurrent scans of
+# the same site cost one lookup. The pooled requests session and httpx clients
+# (sessions.py) connect through it with the connection classes and network backend
+# below, and nothing else in the worker does; inside pinned(ctx) every connection
+# to a host goes to the address that scan resolved first, so round-robin DNS can't give
+# one scan's checks different servers. The Host header and TLS SNI keep the name.
+
+import asyncio
+import contextvars
+import ipaddress
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+import dns.exception
+import dns.resolver
+import httpcore
+from django.conf import settings
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NameResolutionError, NewConnectionError
+from urllib3.util import connection as urllib3_connection
+from . import profiling
+
+
+@dataclass(frozen=True)
+class Resolution:
+    host: str
+    addresses: tuple = ()
+    ttl: float = 0
+    elapsed_ms: float = 0
+    cached: bool = False
+    error: str | None = None
+
+    @property
+    def address(self) -> str | None:
+        return self.addresses[0] if self.addresses else None
+
+
+MAX_CACHED_HOSTS = 10_000
+LOOKUP_STRIPES = 256
+
+_cache = {}          # host -> (Resolution, monotonic expiry)
+_lock = threading.Lock()
+_host_locks = [threading.Lock() for _ in range(LOOKUP_STRIPES)]  # striped: bounded however many hosts are scanned
+_resolver = None
+_pin = contextvars.ContextVar("dns_pin", default=None)
+
+
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+def _dns():
+    global _resolver
+    if _resolver is None:
+        _resolver = dns.resolver.Resolver()
+        _resolver.lifetime = settings.SCAN_DNS_TIMEOUT
+    return _resolver
+
+
+def _lookup(host: str):
+    """(addresses, ttl) from DNS; falls back to the system resolver (hosts file, search domains)."""
+    addresses, ttls = [], []
+    for rdtype in ("A", "AAAA"):
+        try:
+            answer = _dns().resolve(host, rdtype)
+        except dns.exception.DNSException:
+            continue
+        addresses += [rr.to_text() for rr in answer]
+        ttls.append(answer.rrset.ttl)
+    if addresses:
+        return tuple(addresses), min(ttls)
+    infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    return tuple(dict.fromkeys(info[4][0] for info in infos)), settings.SCAN_DNS_MIN_TTL
+
+
+def resolve(host: str) -> Resolution:
+    """Resolve host through the worker's cache; never raises (see Resolution.error)."""
+    host = host.lower().rstrip(".")
+    if _is_ip(host):
+        return Resolution(host=host, addresses=(host,), cached=True)
+
+    with _host_locks[hash(host) % LOOKUP_STRIPES]:  # concurrent checks wait for one lookup instead of stampeding the resolver
+        hit = _cache.get(host)
+        if hit and hit[1] > time.monotonic():
+            return replace(hit[0], cached=True, elapsed_ms=0)
+
+        start = time.perf_counter()
+        try:
+            addresses, ttl = _lookup(host)
+            ttl = min(max(ttl, settings.SCAN_DNS_MIN_TTL), settings.SCAN_DNS_MAX_TTL)
+            result = Resolution(host=host, addresses=addresses, ttl=ttl)
+        except OSError as e:
+            result = Resolution(host=host, ttl=settings.SCAN_DNS_NEGATIVE_TTL, error=str(e))
+        result = replace(result, elapsed_ms=(time.perf_counter() - start) * 1000)
+        with _lock:
+            if len(_cache) >= MAX_CACHED_HOSTS:
+                now = time.monotonic()
+                for stale in [h for h, (_, expiry) in _cache.items() if expiry <= now]:
+                    del _cache[stale]
+            _cache[host] = (result, time.monotonic() + result.ttl)
+    return result
+
+
+def address_for(host: str) -> str:
+    """Address to connect to for host: the current scan's pin, else the cached answer."""
+    pin = _pin.get()
+    address = pin.address(host) if pin is not None else resolve(host).address
+    return address or host  # unresolvable: let the socket call raise its usual error
+
+
+@contextmanager
+def pinned(ctx):
+    """Connections opened inside go to the addresses ctx (a ScanContext) pinned."""
+    token = _pin.set(ctx)
+    try:
+        yield
+    finally:
+        _pin.reset(token)
+
+
+def _create_connection(address, *args, **kwargs):
+    host, port = address
+    start = time.perf_counter()
+    ip = address_for(host)
+    resolved = time.perf_counter()
+    profiling.phase("dns", (resolved - start) * 1000)
+    try:
+        return urllib3_connection.create_connection((ip, port), *args, **kwargs)
+    finally:
+        profiling.phase("connect", (time.perf_counter() - resolved) * 1000)
+
+
+class PinnedHTTPConnection(HTTPConnection):
+    """urllib3 connection that connects to address_for(host); the Host header and TLS SNI keep the name."""
+
+    def _new_conn(self):
+        # HTTPConnection._new_conn, with _create_connection in place of urllib3's
+        try:
+            return _create_connection(
+                (self._dns_host, self.port),
+                self.timeout,
+                source_address=self.source_address,
+                socket_options=self.socket_options,
+            )
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+        except socket.timeout as e:
+            raise ConnectTimeoutError(
+                self, f"Connection to {self.host} timed out. (connect timeout={self.timeout})"
+            ) from e
+        except OSError as e:
+            raise NewConnectionError(self, f"Failed to establish a new connection: {e}") from e
+
+
+class PinnedHTTPSConnection(PinnedHTTPConnection, HTTPSConnection):
+    pass
+
+
+class PinnedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = PinnedHTTPConnection
+
+
+class PinnedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = PinnedHTTPSConnection
+
+
+# For a PoolManager's pool_classes_by_scheme (sessions.PinnedAdapter)
+POOL_CLASSES = {"http": PinnedHTTPConnectionPool, "https": PinnedHTTPSConnectionPool}
+
+
+class PinnedBackend(httpcore.AsyncNetworkBackend):
+    """httpcore network backend that connects to address_for(host); TLS still uses the name."""
+
+    def __init__(self):
+        self._backend = httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        # New connections only (the pool keeps them alive); a cold lookup must not stall the loop
+        start = time.perf_counter()
+        address = await asyncio.to_thread(address_for, host)
+        resolved = time.perf_counter()
+        profiling.phase("dns", (resolved - start) * 1000)
+        try:
+            return await self._backend.connect_tcp(address, port, timeout, local_address, socket_options)
+        finally:
+            profiling.phase("connect", (time.perf_counter() - resolved) * 1000)
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds):
+        await self._backend.sleep(seconds)
@@ -0,0 +1,104 @@
+# scanner_tasks/result_cache.py
+
+# Cross-scan cache of check results, shared by every firm scanning the same site.
+# Tenant-safe by construction: a check only ever sees (domain, ctx), so what it
+# returns is an observation of the public site, never firm data. Keys are
+#   scancache:{domain}:g{generation}:{check id}:v{check version}[:{crawl scope}]
+# and invalidate() bumps the domain's generation instead of hunting keys down.
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from .crawler import scope
+from .registry import get_meta
+
+CACHEABLE_STATUSES = ("pass", "fail", "warn")  # errors, skips and cancellations are never reused
+STATS_KEYS = {"hits": "scancache:stats:hits", "misses": "scancache:stats:misses"}
+
+
+def normalize_domain(domain: str) -> str:
+    domain = domain.strip().lower().replace("https://", "").replace("http://", "")
+    return domain.split("/")[0].split(":")[0].rstrip(".")
+
+
+def check_id(test_func) -> str:
+    return f"{test_func.__module__.rsplit('.', 1)[-1]}.{test_func.__name__}"
+
+
+def cacheable(test_func) -> bool:
+    # Checks that never touch the target are instant anyway; only site observations are shared
+    return (
+        settings.SCAN_RESULT_CACHE
+        and get_meta(test_func, "network", True)
+        and ttl_for(test_func) > 0
+    )
+
+
+def ttl_for(test_func) -> int:
+    ttl = get_meta(test_func, "cache_ttl")
+    if ttl is not None:
+        return ttl
+    if get_meta(test_func, "cost", "cheap") == "heavy":
+        return settings.SCAN_RESULT_CACHE_HEAVY_TTL
+    return settings.SCAN_RESULT_CACHE_TTL
+
+
+def _generation(domain: str) -> int:
+    return cache.get(f"scancache:{domain}:gen", 0)
+
+
+def _key(test_func, domain: str, tier: str) -> str:
+    domain = normalize_domain(domain)
+    version = get_meta(test_func, "version", 1)
+    # A 200-page enterprise crawl and a homepage-only free scan don't answer the same question
+    crawl = f":{scope(tier)}" if get_meta(test_func, "crawl", False) else ""
+    return f"scancache:{domain}:g{_generation(domain)}:{check_id(test_func)}:v{version}{crawl}"
+
+
+def _bump(key: str):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def lookup(test_func, domain: str, tier: str = "free") -> dict | None:
+    """A copy of the cached result marked with when it was observed, or None on a miss."""
+    try:
+        entry = cache.get(_key(test_func, domain, tier))
+        _bump(STATS_KEYS["hits" if entry else "misses"])
+    except Exception:
+        return None  # cache down: just run the check
+    if not entry:
+        return None
+    return {**entry["result"], "cached": True, "cached_at": entry["at"]}
+
+
+def store(test_func, domain: str, result: dict, tier: str = "free"):
+    if result.get("status") not in CACHEABLE_STATUSES or result.get("cached"):
+        return
+    try:
+        cache.set(
+            _key(test_func, domain, tier),
+            {"result": result, "at": timezone.now().isoformat()},
+            timeout=ttl_for(test_func),
+        )
+    except Exception:
+        pass
+
+
+def invalidate(domain: str):
+    """Drop every cached result for domain (used by "force fresh scan")."""
+    key = f"scancache:{normalize_domain(domain)}:gen"
+    try:
+        _bump(key)
+    except Exception:
+        pass
+
+
+def stats() -> dict:
+    try:
+        values = cache.get_many(list(STATS_KEYS.values()))
+    except Exception:
+        values = {}
+    return {name: values.get(key, 0) for name, key in STATS_KEYS.items()}
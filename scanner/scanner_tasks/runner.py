@@ -0,0 +1,179 @@
+# scanner_tasks/runner.py
+
+import asyncio
+import inspect
+import queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from . import aio, profiling, result_cache, tracing
+from .context import HostUnreachable, ScanContext
+from .registry import get_meta
+
+
+def cancelled_result(test_name):
+    return {"title": test_name, "status": "cancelled", "details": "Skipped: scan cancelled"}
+
+
+def unreachable_result(test_name, reason):
+    return {"title": test_name, "status": "unreachable", "details": f"Skipped: host unreachable ({reason})"}
+
+
+def _short_circuit(test_name, test_func, ctx: ScanContext):
+    if ctx.cancelled():
+        return cancelled_result(test_name)
+    reason = ctx.unreachable()
+    if reason and get_meta(test_func, "network", True):
+        return unreachable_result(test_name, reason)
+    return None
+
+
+def _cached(test_func, domain: str, ctx: ScanContext):
+    if not result_cache.cacheable(test_func):
+        return None
+    return result_cache.lookup(test_func, domain, ctx.tier)
+
+
+def _remember(test_func, domain: str, ctx: ScanContext, profile, result: dict) -> dict:
+    # A check that lost a request may still say "pass"; that describes our connection, not the site
+    flaky = profile.errors or profile.timeouts or ctx.unreachable()
+    if result_cache.cacheable(test_func) and not flaky:
+        result_cache.store(test_func, domain, result, ctx.tier)
+    return result
+
+
+def _profile(test_name, ctx: ScanContext, skipped) -> profiling.CheckProfile | None:
+    if skipped:
+        if skipped.get("cached"):
+            ctx.profiles[test_name] = profiling.CheckProfile(cached=True)
+        return None
+    return ctx.profiles.setdefault(test_name, profiling.CheckProfile())
+
+
+@contextmanager
+def _checked(test_name, ctx: ScanContext, profile, blocking=True):
+    # Inputs and profile of the check, and its span in the scan's trace (under the task that owns ctx)
+    with tracing.span(f"check {test_name}", ctx.span, stage="check") as span:
+        try:
+            with ctx.tracking(test_name), profiling.measure(profile, blocking):
+                yield
+        finally:
+            span.set(**tracing.network(profile))
+
+
+async def _tracked(test_name, coro, ctx: ScanContext, profile):
+    # Context variables don't cross into the engine loop: start tracking inside the task
+    with _checked(test_name, ctx, profile, blocking=False):
+        return await coro
+
+
+def run_check(test_name, test_func, domain: str, ctx: ScanContext):
+    skipped = _short_circuit(test_name, test_func, ctx) or _cached(test_func, domain, ctx)
+    profile = _profile(test_name, ctx, skipped)
+    if skipped:
+        return skipped
+    try:
+        if inspect.iscoroutinefunction(test_func):
+            coro = _tracked(test_name, test_func(domain, ctx), ctx, profile)
+            return _remember(test_func, domain, ctx, profile, aio.run_sync(coro))
+        with _checked(test_name, ctx, profile):
+            return _remember(test_func, domain, ctx, profile, test_func(domain, ctx))
+    except HostUnreachable as e:
+        # The breaker tripped during the check: what it saw is not a finding
+        return unreachable_result(test_name, str(e))
+    except Exception as e:
+        profile.exception = type(e).__name__
+        return {"title": test_name, "status": "error", "details": str(e)}
+
+
+async def arun_check(test_name, test_func, domain: str, ctx: ScanContext):
+    skipped = _short_circuit(test_name, test_func, ctx) or _cached(test_func, domain, ctx)
+    profile = _profile(test_name, ctx, skipped)
+    if skipped:
+        return skipped
+    try:
+        # to_thread copies the context, so blocking checks are tracked and profiled too
+        with _checked(test_name, ctx, profile, blocking=False):
+            if inspect.iscoroutinefunction(test_func):
+                return _remember(test_func, domain, ctx, profile, await test_func(domain, ctx))
+            # Adapter: blocking checks run on the loop's default executor
+            result = await asyncio.to_thread(profiling.cpu_timed, profile, test_func, domain, ctx)
+            return _remember(test_func, domain, ctx, profile, result)
+    except HostUnreachable as e:
+        return unreachable_result(test_name, str(e))
+    except Exception as e:
+        profile.exception = type(e).__name__
+        return {"title": test_name, "status": "error", "details": str(e)}
+
+
+def run_checks(tests, domain: str, ctx: ScanContext, workers: int = 1, on_result=None):
+    """
+    Run (test_name, test_func) pairs and return their results in list order.
+
+    With workers > 1 the checks run on a bounded thread pool sharing ctx.
+    on_result(done, test_name, result) is called from the calling thread as
+    each check completes, so it may safely touch the DB. Once ctx.cancelled()
+    turns true, checks that have not started yet come back as "cancelled";
+    once the target's breaker trips, network checks come back "unreachable".
+    Results still fresh in the cross-scan cache (result_cache.py) are reused
+    and marked "cached".
+    """
+    results = [None] * len(tests)
+
+    if workers <= 1:
+        for idx, (test_name, test_func) in enumerate(tests):
+            results[idx] = run_check(test_name, test_func, domain, ctx)
+            if on_result:
+                on_result(idx + 1, test_name, results[idx])
+        return results
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan-check") as pool:
+        futures = {
+            pool.submit(run_check, test_name, test_func, domain, ctx): idx
+            for idx, (test_name, test_func) in enumerate(tests)
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            idx = futures[future]
+            results[idx] = future.result()
+            if on_result:
+                on_result(done, tests[idx][0], results[idx])
+    return results
+
+
+async def _run_async(tests, domain: str, ctx: ScanContext, concurrency: int, report):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(idx, test_name, test_func):
+        async with semaphore:
+            report((idx, await arun_check(test_name, test_func, domain, ctx)))
+
+    await asyncio.gather(*(one(idx, name, func) for idx, (name, func) in enumerate(tests)))
+
+
+def run_checks_async(tests, domain: str, ctx: ScanContext, concurrency: int = 16, on_result=None):
+    """
+    Same contract as run_checks, but the checks run as coroutines on the
+    worker's shared engine loop, so many scans in one process multiplex
+    their outbound requests. on_result still fires on the calling thread.
+    """
+    completed = queue.Queue()
+    future = aio.submit(_run_async(tests, domain, ctx, concurrency, completed.put))
+
+    results = [None] * len(tests)
+    done = 0
+    while done < len(tests):
+        try:
+            idx, result = completed.get(timeout=1)
+        except queue.Empty:
+            if not future.done():
+                continue
+            future.result()  # re-raise if the loop side died
+            try:
+                # Every report() happened before the future completed, the last ones maybe after our get() gave up
+                idx, result = completed.get_nowait()
+            except queue.Empty:
+                raise RuntimeError(f"{len(tests) - done} of {len(tests)} checks never reported") from None
+        done += 1
+        results[idx] = result
+        if on_result:
+            on_result(done, tests[idx][0], result)
+    return results
@@ -0,0 +1,123 @@
+# scanner_tasks/sandbox.py
+
+import os
+import signal
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from django.conf import settings
+
+try:
+    import resource
+except ImportError:  # Windows dev boxes: no rlimits, tools still run
+    resource = None
+
+_live = set()
+_live_lock = threading.Lock()
+
+
+@dataclass
+class ToolResult:
+    returncode: int | None
+    stdout: str
+    killed: str | None = None  # "timeout", "cancelled" or None
+
+    @property
+    def ok(self) -> bool:
+        return self.killed is None and self.returncode == 0
+
+
+def _apply_limits(pid: int, cpu_seconds: int, memory_mb: int):
+    # prlimit on the child rather than preexec_fn: preexec_fn is unsafe in threaded workers
+    if resource is None or not hasattr(resource, "prlimit"):
+        return
+    try:
+        resource.prlimit(pid, resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+        memory = memory_mb * 1024 * 1024
+        resource.prlimit(pid, resource.RLIMIT_AS, (memory, memory))
+    except (OSError, ValueError):
+        pass
+
+
+def _kill(proc: subprocess.Popen, grace: float = 5.0):
+    """SIGTERM the tool's whole process group, then SIGKILL whatever is left."""
+    if proc.poll() is not None:
+        return
+    try:
+        if os.name == "nt":
+            proc.terminate()
+        else:
+            os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=grace)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        pass
+    if proc.poll() is None:
+        try:
+            if os.name == "nt":
+                proc.kill()
+            else:
+                os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        proc.wait()
+
+
+def run_tool(cmd, timeout: int, should_stop=None,
+             cpu_seconds: int | None = None, memory_mb: int | None = None) -> ToolResult:
+    """
+    Run an external scanner (nmap, nikto) under CPU/memory rlimits in its own
+    process group. stdout is drained as it arrives so a chatty tool can't fill
+    the pipe; should_stop() is polled so a cancelled scan kills the tool
+    instead of waiting it out.
+    """
+    cpu_seconds = cpu_seconds or getattr(settings, "SCAN_TOOL_CPU_SECONDS", 300)
+    memory_mb = memory_mb or getattr(settings, "SCAN_TOOL_MEMORY_MB", 512)
+
+    proc = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+        start_new_session=True,
+    )
+    _apply_limits(proc.pid, cpu_seconds, memory_mb)
+    with _live_lock:
+        _live.add(proc)
+
+    lines = []
+
+    def pump():
+        for line in proc.stdout:
+            lines.append(line)
+
+    reader = threading.Thread(target=pump, name="tool-stdout", daemon=True)
+    reader.start()
+
+    killed = None
+    deadline = time.monotonic() + timeout
+    try:
+        while proc.poll() is None:
+            if should_stop and should_stop():
+                killed = "cancelled"
+                break
+            if time.monotonic() > deadline:
+                killed = "timeout"
+                break
+            time.sleep(0.5)
+    finally:
+        # Also reached on SystemExit / revoke: never leave an orphaned scanner behind
+        _kill(proc)
+        reader.join(timeout=5)
+        with _live_lock:
+            _live.discard(proc)
+
+    return ToolResult(returncode=proc.returncode, stdout="".join(lines), killed=killed)
+
+
+def kill_all_tools():
+    """Kill every tool this process started; wired to Celery's worker_process_shutdown."""
+    with _live_lock:
+        procs = list(_live)
+    for proc in procs:
+        _kill(proc, grace=1.0)
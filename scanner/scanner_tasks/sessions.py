@@ -0,0 +1,83 @@
+# scanner_tasks/sessions.py
+
+import threading
+from http import cookiejar
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from . import aio, profiling, resolver
+
+_session = None
+_aclients = {}
+_lock = threading.Lock()
+
+
+def _pool_size() -> int:
+    return getattr(settings, "SCAN_HTTP_POOL_SIZE", 20)
+
+
+class PinnedAdapter(HTTPAdapter):
+    """Pools whose connections go through the resolver's cache and scan pins; other sessions are untouched."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = resolver.POOL_CLASSES
+
+
+def get_session() -> requests.Session:
+    """
+    Keep-alive session owned by this worker process and shared by every scan in it.
+    Connections are pooled per host; cookies are never stored, so scans can't leak
+    state into each other.
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            profiling.install()
+            session = requests.Session()
+            adapter = PinnedAdapter(
+                pool_connections=getattr(settings, "SCAN_HTTP_POOL_HOSTS", 50),
+                pool_maxsize=_pool_size(),
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            # Advertises br when the Brotli package is installed (it is in requirements)
+            session.headers.update(make_headers(accept_encoding=True))
+            session.cookies.set_policy(cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+            _session = session
+    return _session
+
+
+def get_async_client(verify: bool = True) -> httpx.AsyncClient:
+    """Pooled async client for the engine loop; httpx fixes verify per client."""
+    if verify not in _aclients:
+        size = _pool_size()
+        transport = httpx.AsyncHTTPTransport(
+            verify=verify,
+            limits=httpx.Limits(max_connections=size * 4, max_keepalive_connections=size),
+        )
+        # httpx has no public hook for name resolution; httpcore's pool takes a network backend
+        transport._pool._network_backend = resolver.PinnedBackend()
+        client = httpx.AsyncClient(transport=transport)
+        client.cookies.jar.set_policy(cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        _aclients[verify] = client
+    return _aclients[verify]
+
+
+async def _aclose_clients():
+    for client in list(_aclients.values()):
+        await client.aclose()
+    _aclients.clear()
+
+
+def close_sessions():
+    """Drop pooled connections; wired to Celery's worker_process_shutdown."""
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+    if _aclients:
+        aio.run_sync(_aclose_clients())
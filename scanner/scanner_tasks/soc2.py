@@ -1,6 +1,10 @@
 # scanner_tasks/soc2.py
 
-def check_soc2_access_reviews(domain: str):
+from .context import ScanContext
+from .registry import check_meta
+
+@check_meta(network=False)
+def check_soc2_access_reviews(domain: str, ctx: ScanContext | None = None):
     return {
         "title": "Access Reviews (SOC 2)",
         "status": "warn",
@@ -0,0 +1,286 @@
+# scanner_tasks/tracing.py
+
+# Lightweight spans across a scan: StartScanView.post → Celery queue → task → checks
+# → post_save receivers → PDF render. The current span lives in a context variable.
+# Celery carries it to the worker as a W3C "traceparent" task header (core/celery.py),
+# and there each task gets two spans: a "queue" span from publish to start (timed
+# from the published_at header) and a span of its own. Checks run on pool threads and
+# on the engine loop, so they name their parent explicitly (ScanContext.span).
+# Finished spans go to a bounded in-memory queue. One "trace-exporter" daemon thread
+# per process drains it every EXPORT_INTERVAL seconds into:
+#   - Redis (trace:<trace id>, kept SCAN_TRACE_TTL seconds), read by the trace page of a scan,
+#   - SCAN_TRACE_FILE, one JSON span per line, if set,
+#   - SCAN_TRACE_OTLP_ENDPOINT (OTLP/HTTP JSON, e.g. http://collector:4318/v1/traces), if set.
+# Nothing here raises into a scan or waits on an exporter. When the queue is full,
+# spans are dropped.
+
+import contextvars
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+import redis
+import requests
+from django.conf import settings
+
+EXPORT_INTERVAL = 1.0
+MAX_QUEUED = 10_000
+NETWORK = ("dns_ms", "connect_ms", "tls_ms", "ttfb_ms")  # the wait-on-network phases of a check's requests
+
+_current = contextvars.ContextVar("trace_span", default=None)
+_queue = deque()
+_lock = threading.Lock()
+_tasks = {}  # Celery task id -> (its span, the context token that made it current)
+_pid = None
+_client = None
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    parent_id: str | None = None
+    span_id: str = field(default_factory=lambda: secrets.token_hex(8))
+    start: int = field(default_factory=time.time_ns)  # epoch ns, like OTLP
+    end: int | None = None
+    attributes: dict = field(default_factory=dict)
+    error: str | None = None  # class name of the exception that ended it
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self, end: int | None = None):
+        self.end = end or time.time_ns()
+        _export(self)
+
+
+def current() -> Span | None:
+    return _current.get()
+
+
+def trace_id() -> str:
+    span = _current.get()
+    return span.trace_id if span else ""
+
+
+def _ids(parent) -> tuple[str, str | None]:
+    if isinstance(parent, Span):
+        return parent.trace_id, parent.span_id
+    if isinstance(parent, str):  # a traceparent header
+        parts = parent.split("-")
+        if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+            return parts[1], parts[2]
+    return secrets.token_hex(16), None  # root of a new trace
+
+
+def start(name: str, parent=None, **attributes) -> Span:
+    """A span under parent (a Span or traceparent; default the current span), not made current."""
+    trace, parent_id = _ids(parent if parent is not None else _current.get())
+    return Span(name, trace, parent_id, attributes=attributes)
+
+
+@contextmanager
+def span(name: str, parent=None, **attributes):
+    """Run the block as a span, current while it runs."""
+    s = start(name, parent, **attributes)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        s.finish()
+
+
+def traced(name: str, **attributes):
+    """Decorator form of span()."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def network(profile) -> dict:
+    """Span attributes of a check from its profiling.CheckProfile."""
+    return {name: round(getattr(profile, name), 1) for name in ("requests", "bytes", *NETWORK, "timeouts", "errors")}
+
+
+# --- Celery (signal handlers in core/celery.py) ---
+
+def task_started(task):
+    """task_prerun: a queue span (publish → now) and the task's own span, made current."""
+    request = task.request
+    parent = request.get("traceparent") or _current.get()  # eager calls run in the caller's context
+    now = time.time_ns()
+    task_span = start(f"task {task.name.rsplit('.', 1)[-1]}", parent, stage="task", task=task.name)
+    published_at = request.get("published_at")
+    if published_at:
+        queue = (request.delivery_info or {}).get("routing_key") or "celery"
+        wait = start(f"queue {queue}", parent, stage="queue", task=task.name)
+        wait.start = min(int(published_at * 1e9), now)  # clocks of different hosts may disagree
+        wait.finish(now)
+    _tasks[request.id] = (task_span, _current.set(task_span))
+
+
+def task_finished(task, state=None):
+    """task_postrun: end the task's span and restore the context it was started in."""
+    entry = _tasks.pop(task.request.id, None)
+    if entry is None:
+        return
+    task_span, token = entry
+    try:
+        _current.reset(token)
+    except ValueError:
+        pass  # postrun ran in another context than prerun; nothing to restore
+    if state and state != "SUCCESS":
+        task_span.error = state
+    task_span.finish()
+
+
+# --- Export ---
+
+def _redis():
+    global _client
+    if _client is None:
+        _client = redis.from_url(settings.SCAN_TRACE_REDIS_URL, socket_timeout=1, socket_connect_timeout=1)
+    return _client
+
+
+def _export(s: Span):
+    global _pid
+    if not settings.SCAN_TRACING:
+        return
+    with _lock:
+        if _pid != os.getpid():  # first span, or a forked worker
+            _queue.clear()
+            _pid = os.getpid()
+            threading.Thread(target=_run, name="trace-exporter", daemon=True).start()
+        if len(_queue) < MAX_QUEUED:
+            _queue.append(asdict(s))
+
+
+def _run():
+    while True:
+        time.sleep(EXPORT_INTERVAL)
+        flush()
+
+
+def flush():
+    """Send the finished spans of this process to every configured exporter."""
+    with _lock:
+        batch = list(_queue)
+        _queue.clear()
+    if not batch:
+        return
+    for exporter in (_to_redis, _to_file, _to_otlp):
+        try:
+            exporter(batch)
+        except Exception:
+            pass  # an exporter being down never affects a scan, or the other exporters
+
+
+def _to_redis(batch):
+    pipe = _redis().pipeline(transaction=False)
+    for trace in {s["trace_id"] for s in batch}:
+        pipe.rpush(f"trace:{trace}", *(json.dumps(s) for s in batch if s["trace_id"] == trace))
+        pipe.expire(f"trace:{trace}", settings.SCAN_TRACE_TTL)
+    pipe.execute()
+
+
+def _to_file(batch):
+    if settings.SCAN_TRACE_FILE:
+        with open(settings.SCAN_TRACE_FILE, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(s) + "\n" for s in batch))
+
+
+def _attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _to_otlp(batch):
+    if not settings.SCAN_TRACE_OTLP_ENDPOINT:
+        return
+    spans = [{
+        "traceId": s["trace_id"],
+        "spanId": s["span_id"],
+        "parentSpanId": s["parent_id"] or "",
+        "name": s["name"],
+        "kind": 1,  # SPAN_KIND_INTERNAL
+        "startTimeUnixNano": str(s["start"]),
+        "endTimeUnixNano": str(s["end"]),
+        "attributes": [_attribute(key, value) for key, value in s["attributes"].items()],
+        "status": {"code": 2, "message": s["error"]} if s["error"] else {"code": 1},
+    } for s in batch]
+    requests.post(settings.SCAN_TRACE_OTLP_ENDPOINT, timeout=5, json={"resourceSpans": [{
+        "resource": {"attributes": [_attribute("service.name", "complylaw-scanner")]},
+        "scopeSpans": [{"scope": {"name": "scanner.scanner_tasks.tracing"}, "spans": spans}],
+    }]})
+
+
+# --- Trace page ---
+
+def load(trace: str) -> list[dict]:
+    """The spans of a trace still kept in Redis, in no particular order."""
+    if not trace:
+        return []
+    try:
+        return [json.loads(s) for s in _redis().lrange(f"trace:{trace}", 0, -1)]
+    except Exception:
+        return []
+
+
+def timeline(spans: list[dict]) -> tuple[list[dict], dict]:
+    """Waterfall rows (depth-first, offsets in % of the trace) and per-stage totals in ms."""
+    if not spans:
+        return [], {}
+    t0 = min(s["start"] for s in spans)
+    total = max(max(s["end"] for s in spans) - t0, 1)
+    children = {}
+    for s in sorted(spans, key=lambda s: s["start"]):
+        children.setdefault(s["parent_id"], []).append(s)
+    ids = {s["span_id"] for s in spans}
+    roots = [s for parent, kids in children.items() if parent not in ids for s in kids]  # parents not exported (yet)
+
+    rows = []
+
+    def walk(s, depth):
+        rows.append({
+            **s,
+            "depth": depth,
+            "stage": s["attributes"].get("stage", ""),
+            "ms": (s["end"] - s["start"]) / 1e6,
+            "offset": (s["start"] - t0) * 100 / total,
+            "width": max((s["end"] - s["start"]) * 100 / total, 0.2),
+        })
+        for child in children.get(s["span_id"], []):
+            walk(child, depth + 1)
+
+    for root in sorted(roots, key=lambda s: s["start"]):
+        walk(root, 0)
+    totals = {
+        "trace": total / 1e6,
+        "queue": sum(row["ms"] for row in rows if row["stage"] == "queue"),
+        "network": sum(row["attributes"].get(name, 0) for row in rows if row["stage"] == "check" for name in NETWORK),
+        "render": sum(row["ms"] for row in rows if row["stage"] == "render"),
+    }
+    return rows, totals
@@ -1,15 +1,26 @@
 # scanner/tasks.py — TIER-BASED + PERFORMANCE
 
-from .models import ScanResult
+from .models import ScanResult, ScanBatch
 from django.utils import timezone
+from django.conf import settings
+from django.core.cache import cache
 import time
 import random
-from celery import shared_task
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from collections import deque
+from datetime import timedelta
+from django.db import transaction
+from celery import shared_task, chord
 from django.contrib.messages import get_messages
 from django.contrib.sessions.models import Session
 from .scanner_tasks.helpers import connect_to_external_scanner
+from .scanner_tasks.context import ScanContext
+from .scanner_tasks.cancel import is_cancelled, request_cancel
+from .scanner_tasks.preflight import preflight
+from .scanner_tasks.runner import run_checks, run_checks_async, cancelled_result
+from .scanner_tasks.registry import get_meta
+from .scanner_tasks.progress import ScanProgress
+from .scanner_tasks import publisher
+from .scanner_tasks import result_cache, incremental, profiling, metrics, tracing
 from .scanner_tasks.gdpr import (
     check_gdpr_dsar, check_gdpr_dpia, check_gdpr_retention, check_gdpr_dpo,
     crawl_sitemap, check_cookies, check_privacy_policy
@@ -77,14 +88,22 @@ TIERS = {
     "enterprise": ENTERPRISE_TESTS,
 }
 
+# Every check by name, so subtasks can be sent over the (JSON) broker
+CHECKS = dict(ENTERPRISE_TESTS)
+
 
 @shared_task(bind=True)
-def run_compliance_scan(self, scan_id):
+def run_compliance_scan(self, scan_id, fresh=False):
     try:
         scan = ScanResult.objects.select_for_update().get(pk=scan_id)
     except ScanResult.DoesNotExist:
         return "Scan not found"
 
+    # Cancelled while still queued
+    if scan.status == 'CANCELLED' or is_cancelled(scan.pk):
+        _release_batch_slot(scan)
+        return "Scan cancelled"
+
     domain = scan.domain.strip().lower().replace("https://", "").replace("http://", "").split("/")[0]
 
     # Get user tier
@@ -99,45 +118,349 @@ def run_compliance_scan(self, scan_id):
     scan.status = 'RUNNING'
     scan.progress = 0
     scan.current_step = "Starting scan..."
+    scan.started_at = timezone.now()
+    scan.trace_id = tracing.trace_id()  # this task's trace: StartScanView's, when it started the scan
     #scan.scan_log = f"[{timezone.now():%H:%M:%S}] Scan started for {domain}\n"
     #scan.save(update_fields=['status', 'progress', 'current_step'])
-    scan.save(update_fields=['status', 'progress', 'current_step', 'scan_log'])
+    scan.save(update_fields=['status', 'progress', 'current_step', 'started_at', 'scan_log', 'trace_id'])
 
     # Use a list to collect logs → write only 2–3 times total
     log_buffer = [f"[{timezone.now():%H:%M:%S}] Scan started → {domain} ({user_tier.capitalize()} Tier)"]
 
-    channel_layer = get_channel_layer()
-    raw_data = {
-        "findings": [],
-        "recommendations": [],
-        "scanned_urls": 0,
-        "issues_found": 0,
-        "vulnerabilities": []
-    }
-    findings, breach_alerts, checklist = [], [], {}
-
     total_tests = len(selected_tests)
     progress_per_test = 90 / max(total_tests, 1)
 
     # === Run Tests ===
     external_results = connect_to_external_scanner(domain)
-    _update_scan(scan, progress=5, step="Connecting...", log_buffer=log_buffer)
+    progress = ScanProgress(scan)  # coalesces the per-check updates below into a few writes
+    progress.update(5, "Connecting...", milestone=True)
+
+    ctx = ScanContext(domain, scan.id, user_tier)  # shared fetch cache: each URL is downloaded once per scan
+
+    # Preflight: one DNS lookup + TCP probe instead of every check waiting out its own timeout.
+    # The address resolved here is the one every check of this scan connects to.
+    resolution = ctx.resolve(domain)
+    if resolution.addresses and resolution.address != domain:
+        log_buffer.append(
+            f"[{timezone.now():%H:%M:%S}] DNS: {domain} → {resolution.address} in {resolution.elapsed_ms:.0f} ms"
+            f"{' (cached)' if resolution.cached else ''}, TTL {resolution.ttl:.0f}s"
+        )
+    with tracing.span("preflight", stage="network"):
+        reach = preflight(domain, resolution=resolution)
+    log_buffer.append(f"[{timezone.now():%H:%M:%S}] Preflight: {reach.summary()}")
+    if not reach.reachable:
+        _save_unreachable(scan, reach, log_buffer)
+        _record_metrics(scan, user_tier)
+        return
+
+    if fresh:
+        # "Force fresh scan": drop what any firm cached for this site; new results refill it
+        result_cache.invalidate(domain)
+        log_buffer.append(f"[{timezone.now():%H:%M:%S}] Fresh scan requested: cached results ignored")
+
+    mode = settings.SCAN_EXECUTION_MODE
+    concurrency = settings.SCAN_TIER_CONCURRENCY.get(user_tier, 1)
+
+    # Progress follows completed checks, whatever order they finish in; done counts from the first carried check
+    def on_result(done, test_name, result):
+        percent = min(95, 5 + int(done * progress_per_test))
+        log_buffer.append(f"[{timezone.now():%H:%M:%S}] [{percent}%] {test_name}: {_status_label(result)}")
+        progress.update(percent, test_name)
+        if mode == "sequential":
+            time.sleep(0.4)
+
+    # Incremental: revalidate what the last scan read; checks whose inputs didn't change aren't re-run
+    baseline = None
+    if settings.SCAN_INCREMENTAL and not fresh:
+        baseline = incremental.load_baseline(_previous_scan(scan))
+    carried = {}
+    if baseline:
+        unchanged = incremental.revalidate(ctx, baseline, workers=concurrency)
+        carried = baseline.carry_forward(selected_tests, user_tier)
+        log_buffer.append(
+            f"[{timezone.now():%H:%M:%S}] Incremental: {len(unchanged)}/{len(baseline.inputs)} inputs unchanged "
+            f"since scan #{baseline.scan_id}, {len(carried)} checks carried forward"
+        )
+        for done, (name, result) in enumerate(carried.items(), start=1):
+            on_result(done, name, result)
+
+    carried_tests = [(name, func) for name, func in selected_tests if name in carried]
+    cheap_tests, heavy_tests = _split_by_cost([test for test in selected_tests if test[0] not in carried])
+
+    if mode == "fanout":
+        record = incremental.build_record(ctx, carried_tests, [carried[name] for name, _ in carried_tests], baseline, carried)
+        groups = ([cheap_tests] if cheap_tests else []) + [[test] for test in heavy_tests]
+        progress.flush()
+        _dispatch_groups(scan, domain, user_tier, groups, total_tests, external_results, log_buffer,
+                         [[name, result] for name, result in carried.items()], record, ctx.pins(),
+                         profiling.summary(ctx))
+        return
+
+    def on_cheap_result(done, test_name, result):
+        on_result(len(carried) + done, test_name, result)
+
+    if mode == "async":
+        results = run_checks_async(cheap_tests, domain, ctx, concurrency=concurrency, on_result=on_cheap_result)
+    else:
+        workers = concurrency if mode == "threaded" else 1
+        results = run_checks(cheap_tests, domain, ctx, workers=workers, on_result=on_cheap_result)
+
+    by_name = {**carried, **{name: result for (name, _), result in zip(cheap_tests, results)}}
+    done_tests = carried_tests + cheap_tests
+    record = incremental.build_record(ctx, done_tests, [by_name[name] for name, _ in done_tests], baseline, carried)
+
+    if heavy_tests and not ctx.cancelled():
+        # nmap/nikto go to the heavy-tool queue and finalize_scan merges; they only run in this process when
+        # no heavy worker is deployed. A cached tool result skips that queue (and whatever enterprise backlog
+        # is sitting on it).
+        groups = []
+        for name, func in heavy_tests:
+            hit = result_cache.lookup(func, domain, user_tier) if result_cache.cacheable(func) else None
+            if hit:
+                by_name[name] = hit
+                on_result(len(by_name), name, hit)
+            else:
+                groups.append([(name, func)])
+        if groups and not settings.SCAN_HEAVY_QUEUE:
+            # Queued for a worker that doesn't exist, the scan would stay RUNNING for good: one tool at a time here
+            heavy_done = len(by_name)
+
+            def on_heavy_result(done, test_name, result):
+                on_result(heavy_done + done, test_name, result)
+
+            inline = [test for group in groups for test in group]
+            results = run_checks(inline, domain, ctx, workers=1, on_result=on_heavy_result)
+            by_name.update({name: result for (name, _), result in zip(inline, results)})
+            done_tests += inline
+            record = incremental.build_record(ctx, done_tests, [by_name[name] for name, _ in done_tests], baseline,
+                                              carried)
+        elif groups:
+            progress.flush()
+            _dispatch_groups(scan, domain, user_tier, groups, total_tests, external_results, log_buffer,
+                             [[name, result] for name, result in by_name.items()], record, ctx.pins(),
+                             profiling.summary(ctx))
+            return
+    else:
+        by_name.update({name: cancelled_result(name) for name, _ in heavy_tests})  # only non-empty if cancelled
+
+    results = [by_name[name] for name, _ in selected_tests]
+    _finalize_scan(scan, domain, results, external_results, log_buffer, record, profiling.summary(ctx), user_tier)
+
+
+def _status_label(result):
+    status = result.get("status", "error").upper()
+    if result.get("carried_from"):
+        return f"{status} (carried from scan #{result['carried_from']})"
+    if result.get("cached"):
+        return f"{status} (cached)"
+    return status
+
+
+def _previous_scan(scan):
+    # Served by the (firm, scan_date) index
+    return (
+        ScanResult.objects
+        .filter(firm_id=scan.firm_id, domain=scan.domain, status="COMPLETED", scan_date__lt=scan.scan_date)
+        .order_by("-scan_date")
+        .first()
+    )
+
+
+# === FAN-OUT: checks as Celery subtasks, merged by a chord callback ===
+def _is_heavy(test_func):
+    return get_meta(test_func, "cost", "cheap") == "heavy"
+
+
+def _split_by_cost(tests):
+    """Cheap checks stay together (one ScanContext); heavy tools are scheduled one per subtask."""
+    cheap = [(name, func) for name, func in tests if not _is_heavy(func)]
+    heavy = [(name, func) for name, func in tests if _is_heavy(func)]
+    return cheap, heavy
+
+
+def _dispatch_groups(scan, domain, user_tier, groups, total_tests, external_results, log_buffer,
+                     carried=None, record=None, pins=None, profile=None):
+    # Groups on other workers continue the progress count from the checks already done here
+    cache.set(f"scan:{scan.id}:done", len(carried or []), timeout=60 * 60 * 6)
+    header = []
+    for group in groups:
+        # pins: subtasks on other workers connect to the address this scan resolved
+        sig = run_check_group.s(scan.id, domain, user_tier, [name for name, _ in group], total_tests, pins)
+        if settings.SCAN_HEAVY_QUEUE and any(_is_heavy(func) for _, func in group):
+            # Own queue + own worker concurrency: enterprise bursts can't starve free-tier scans
+            sig = sig.set(queue=settings.SCAN_HEAVY_QUEUE)
+        header.append(sig)
+    # Without the errback, a group that raises (or whose worker dies) would leave the scan RUNNING for good
+    callback = finalize_scan.s(scan.id, domain, user_tier, external_results, log_buffer, carried, record, profile)
+    chord(header)(callback.on_error(fail_scan.s(scan.id, user_tier)))
+
+
+@shared_task
+def run_check_group(scan_id, domain, user_tier, test_names, total_tests, pins=None):
+    tests = [(name, CHECKS[name]) for name in test_names]
+    scan = ScanResult.objects.get(pk=scan_id)
+    progress_per_test = 90 / max(total_tests, 1)
+    log_lines = []
+    progress = ScanProgress(scan)
+
+    def on_result(done, test_name, result):
+        # Groups finish independently on different workers; count completions in Redis
+        done_total = cache.incr(f"scan:{scan_id}:done")
+        percent = min(95, 5 + int(done_total * progress_per_test))
+        log_lines.append(f"[{timezone.now():%H:%M:%S}] [{percent}%] {test_name}: {_status_label(result)}")
+        progress.update(percent, test_name)
+
+    workers = settings.SCAN_TIER_CONCURRENCY.get(user_tier, 1)
+    ctx = ScanContext(domain, scan_id, user_tier, pins=pins)
+    results = run_checks(tests, domain, ctx, workers=workers, on_result=on_result)
+    progress.flush()
+    return {
+        "results": list(zip(test_names, results)),
+        "log": log_lines,
+        "record": incremental.build_record(ctx, tests, results),
+        "profile": profiling.summary(ctx),
+    }
 
-    for idx, (test_name, test_func) in enumerate(selected_tests):
-        progress = min(95, 5 + int((idx + 1) * progress_per_test))
 
-        _update_scan(scan, progress=progress, step=test_name, log_buffer=log_buffer)
+@shared_task
+def finalize_scan(group_results, scan_id, domain, user_tier, external_results=None, log_lines=None, carried=None,
+                  record=None, profile=None):
+    by_name, log_buffer = dict(carried or []), list(log_lines or [])
+    record = incremental.merge_records([record] + [part.get("record") for part in group_results])
+    profile = profiling.merge([profile] + [part.get("profile") for part in group_results])
+    for part in group_results:
+        by_name.update(dict(part["results"]))
+        log_buffer.extend(part["log"])
+
+    # Back into TIERS order so reports stay stable
+    results = [
+        by_name.get(name, {"title": name, "status": "error", "details": "Check did not report"})
+        for name, _ in TIERS.get(user_tier, FREE_TESTS)
+    ]
+    scan = ScanResult.objects.get(pk=scan_id)
+    _finalize_scan(scan, domain, results, external_results, log_buffer, record, profile, user_tier)
+
+
+@shared_task
+def fail_scan(request, exc, traceback, scan_id, user_tier="free"):
+    """Chord errback: a check group failed, so finalize_scan will never run. May be called once per failed group."""
+    failed = ScanResult.objects.filter(pk=scan_id, status="RUNNING").update(
+        status="FAILED", completed_at=timezone.now(), current_step=f"Scan failed ({type(exc).__name__})"[:200],
+    )
+    if not failed:
+        return
+    scan = ScanResult.objects.get(pk=scan_id)
+    _release_batch_slot(scan)
+    _record_metrics(scan, user_tier)
+    publisher.publish(
+        f"scan_{scan.id}",
+        {"type": "scan.update", "progress": scan.progress, "step": scan.current_step, "status": "failed"}
+    )
+
+
+# === BATCHES: portfolio scans fed to the workers a few at a time ===
+@shared_task
+def pump_batches():
+    """
+    Start queued batch scans, round-robin across firms (oldest batch first
+    within a firm), keeping at most SCAN_BATCH_MAX_INFLIGHT of them running.
+    Called when a batch is submitted and whenever one of its scans finishes
+    or is cancelled. Single-domain scans from StartScanView don't wait here.
+
+    A scan RUNNING for longer than SCAN_BATCH_STALE_AFTER lost its worker (or
+    its task) and would otherwise hold a slot, and its batch, open for good:
+    it is failed here and asked to stop in case the worker is merely slow.
+    """
+    with transaction.atomic():
+        # Row locks serialize concurrent pumps, so the cap can't be overshot
+        active = list(
+            ScanBatch.objects.select_for_update()
+            .filter(status__in=["PENDING", "RUNNING"])
+            .order_by("created_at")
+        )
+        if not active:
+            return
+
+        stale = list(
+            ScanResult.objects.filter(
+                batch__in=active, status="RUNNING",
+                started_at__lt=timezone.now() - timedelta(seconds=settings.SCAN_BATCH_STALE_AFTER),
+            ).values_list("pk", flat=True)
+        )
+        if stale:
+            ScanResult.objects.filter(pk__in=stale).update(
+                status="FAILED", completed_at=timezone.now(), current_step="Scan timed out",
+            )
+            for pk in stale:
+                request_cancel(pk)
+
+        in_flight = ScanResult.objects.filter(batch__in=active, status="RUNNING").count()
+        slots = settings.SCAN_BATCH_MAX_INFLIGHT - in_flight
+
+        picked = []
+        if slots > 0:
+            queues = {}
+            pending = (
+                ScanResult.objects.filter(batch__in=active, status="PENDING")
+                .order_by("batch__created_at", "pk")
+                .values_list("pk", "firm_id")
+            )
+            for pk, firm_id in pending:
+                queues.setdefault(firm_id, deque()).append(pk)
+            while queues and len(picked) < slots:
+                for firm_id in list(queues):
+                    if len(picked) >= slots:
+                        break
+                    picked.append(queues[firm_id].popleft())
+                    if not queues[firm_id]:
+                        del queues[firm_id]
+            ScanResult.objects.filter(pk__in=picked).update(
+                status="RUNNING", current_step="Queued", started_at=timezone.now(),
+            )
+
+        busy = set(
+            ScanResult.objects.filter(batch__in=active, status__in=["PENDING", "RUNNING"])
+            .values_list("batch_id", flat=True)
+        )
+        for batch in active:
+            if batch.pk in busy and batch.status != "RUNNING":
+                batch.status = "RUNNING"
+                batch.save(update_fields=["status"])
+            elif batch.pk not in busy:
+                batch.status = "COMPLETED"
+                batch.completed_at = timezone.now()
+                batch.save(update_fields=["status", "completed_at"])
 
-        try:
-            result = test_func(domain)
-        except Exception as e:
-            result = {"title": test_name, "status": "error", "details": str(e)}
+        transaction.on_commit(lambda: [run_compliance_scan.delay(pk) for pk in picked])
 
-        # Log result
-        status = result.get("status", "error").upper()
-        log_buffer.append(f"[{timezone.now():%H:%M:%S}] [{progress}%] {test_name}: {status}")
 
-        # Collect findings
+def _release_batch_slot(scan):
+    if scan.batch_id:
+        pump_batches.delay()
+
+
+# === FINALIZE: grading, recommendations, raw data, completion notifications ===
+@tracing.traced("finalize")
+def _finalize_scan(scan, domain, results, external_results, log_buffer, record=None, profile=None,
+                   user_tier="free"):
+    raw_data = {
+        "findings": [],
+        "recommendations": [],
+        "scanned_urls": 0,
+        "issues_found": 0,
+        "vulnerabilities": []
+    }
+    if record:
+        raw_data["incremental"] = record  # what the next scan of this domain revalidates
+    scan.profile = profile or {}  # per-check timings and traffic, shown to staff on the status page
+    breach_alerts, checklist = [], {}
+    cancelled = is_cancelled(scan.id)
+    unreachable = [r for r in results if r.get("status") == "unreachable"]
+
+    # Collect in TIERS order so reports stay stable
+    for result in results:
+        if result.get("status") in ("cancelled", "unreachable"):
+            continue
         if not external_results:
             if result.get("status") in ["fail", "warn"]:
                 raw_data["findings"].append(result)
@@ -153,10 +476,22 @@ def run_compliance_scan(self, scan_id):
             if "cookie" in title:
                 checklist['cookie_banner'] = result["status"] == "pass"
 
-        time.sleep(0.4)
+    reused = sum(1 for result in results if result.get("cached"))
+    if reused:
+        log_buffer.append(f"[{timezone.now():%H:%M:%S}] Result cache: {reused}/{len(results)} checks reused")
+
+    if cancelled:
+        _save_cancelled(scan, results, raw_data, breach_alerts, checklist, log_buffer)
+        _record_metrics(scan, user_tier, profile)
+        return
+    if unreachable and not external_results:
+        # The site went down mid-scan: a grade over the checks that did run would flatter it
+        _save_interrupted(scan, results, unreachable, raw_data, breach_alerts, checklist, log_buffer)
+        _record_metrics(scan, user_tier, profile)
+        return
 
     # === Finalize ===
-    _update_scan(scan, progress=98, step="Generating report...", log_buffer=log_buffer)
+    ScanProgress(scan).update(98, "Generating report...", milestone=True)
 
     if external_results:
         scan.grade = external_results.get("grade", "C")
@@ -181,12 +516,13 @@ def run_compliance_scan(self, scan_id):
     scan.progress = 100
     scan.current_step = "Complete!"
 
-    scan.save()
-    
+    with tracing.span("scan.save", stage="db"):  # post_save receivers: the compliance report and its PDF
+        scan.save()
+    _record_metrics(scan, user_tier, profile)
     
     # Send beautiful live toast: "abc.com scan completed!"
     try:
-        async_to_sync(get_channel_layer().group_send)(
+        publisher.publish(
             f"user_{scan.user.id}",
             {
                 "type": "scan_notification",
@@ -203,49 +539,96 @@ def run_compliance_scan(self, scan_id):
 
     # Final WebSocket
     _send_ws_complete(scan)
+    _release_batch_slot(scan)
 
 
-# === HELPER: Safe update (only 4–6 DB writes total!) ===
-def _update_scan(scan, progress, step, log_buffer):
-    scan.progress = progress
-    scan.current_step = step
-    scan.save(update_fields=['progress', 'current_step'])
-    
-    # Send WebSocket
-    try:
-        async_to_sync(get_channel_layer().group_send)(
-            f"scan_{scan.id}",
-            {
-                "type": "scan.update",
-                "progress": progress,
-                "step": step,
-                "status": "running"
-            }
-        )
-    except:
-        pass  # Never crash scan due to WS
+def _save_cancelled(scan, results, raw_data, breach_alerts, checklist, log_buffer):
+    # Keep what already ran; a partial scan gets no grade and no report
+    ran = sum(1 for r in results if r.get("status") != "cancelled")
+    log_buffer.append("[Cancelled by user]")
+    log_buffer.append(f"[CANCELLED] Checks run: {ran}/{len(results)} | Issues so far: {len(raw_data['findings'])}")
+    scan.scan_log = "\n".join(log_buffer[-100:])
+    scan.set_raw_data(raw_data)
+    scan.set_breach_alerts(breach_alerts)
+    scan.set_checklist_status(checklist)
+    scan.status = 'CANCELLED'
+    scan.completed_at = timezone.now()
+    scan.current_step = "Cancelled"
+    scan.save()
+    _release_batch_slot(scan)
+    publisher.publish(
+        f"scan_{scan.id}",
+        {"type": "scan.update", "progress": scan.progress, "step": "Cancelled", "status": "cancelled"}
+    )
+
+
+def _save_interrupted(scan, results, unreachable, raw_data, breach_alerts, checklist, log_buffer):
+    # Like a cancelled scan: keep the findings so far, but no grade and no report
+    log_buffer.append(f"[FAILED] Host became unreachable: {unreachable[0].get('details', '')}")
+    log_buffer.append(f"[FAILED] Checks run: {len(results) - len(unreachable)}/{len(results)} | "
+                      f"Issues so far: {len(raw_data['findings'])}")
+    scan.scan_log = "\n".join(log_buffer[-100:])
+    scan.set_raw_data(raw_data)
+    scan.set_breach_alerts(breach_alerts)
+    scan.set_checklist_status(checklist)
+    scan.status = 'FAILED'
+    scan.completed_at = timezone.now()
+    scan.current_step = "Site became unreachable"
+    scan.save()
+    _release_batch_slot(scan)
+    publisher.publish(
+        f"scan_{scan.id}",
+        {"type": "scan.update", "progress": scan.progress, "step": "Site became unreachable", "status": "failed"}
+    )
+
+
+def _record_metrics(scan, user_tier, profile=None):
+    # In-process counters only; scanner_tasks/metrics.py sums them across workers
+    status = scan.status.lower()
+    metrics.inc("scans_total", tier=user_tier, status=status)
+    if status == "completed":
+        metrics.observe("scan_duration_seconds", (scan.completed_at - scan.scan_date).total_seconds(), tier=user_tier)
+    for name, check in (profile or {}).get("checks", {}).items():
+        if check.get("cached"):
+            metrics.inc("check_runs_total", check=name, outcome="cached")
+            continue
+        metrics.inc("check_runs_total", check=name, outcome="error" if check.get("exception") else "ok")
+        metrics.observe("check_duration_seconds", check["wall_ms"] / 1000, check=name)
+
+
+def _save_unreachable(scan, reach, log_buffer):
+    # Nothing to grade: fail fast so the user can fix the domain and retry
+    log_buffer.append(f"[FAILED] {reach.summary()}")
+    scan.scan_log = "\n".join(log_buffer[-100:])
+    scan.set_raw_data({"findings": [], "recommendations": [], "vulnerabilities": [],
+                       "reachability": {"host": reach.host, "addresses": list(reach.addresses), "error": reach.error}})
+    scan.status = 'FAILED'
+    scan.completed_at = timezone.now()
+    scan.current_step = "Site unreachable"
+    scan.save()
+    _release_batch_slot(scan)
+    publisher.publish(
+        f"scan_{scan.id}",
+        {"type": "scan.update", "progress": scan.progress, "step": "Site unreachable", "status": "failed"}
+    )
 
 
 def _send_ws_complete(scan):
-    try:
-        async_to_sync(get_channel_layer().group_send)(
-            f"scan_{scan.id}",
-            {"type": "scan.complete_trigger", "force_reload": True, "progress": 100}
-        )
-        async_to_sync(get_channel_layer().group_send)(
-            f"scan_{scan.id}",
-            {
-                "type": "scan.update",
-                "progress": 100,
-                "message": f"{domain} scan completed!",
-                "grade": scan.grade,
-                "risk_score": scan.risk_score,
-                "status": "complete"
-                
-            }
-        )
-    except:
-        pass
+    publisher.publish(
+        f"scan_{scan.id}",
+        {"type": "scan.complete_trigger", "force_reload": True, "progress": 100}
+    )
+    publisher.publish(
+        f"scan_{scan.id}",
+        {
+            "type": "scan.update",
+            "progress": 100,
+            "message": f"{scan.domain} scan completed!",
+            "grade": scan.grade,
+            "risk_score": scan.risk_score,
+            "status": "complete"
+        }
+    )
 
 
 def generate_recommendations(findings):
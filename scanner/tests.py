@@ -1,3 +1,648 @@
-from django.test import TestCase
+import asyncio
+import io
+import queue
+import random
+import ssl
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import redis
+import requests
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import FirmProfile, UserAccount
+from . import tasks
+from .models import ScanBatch, ScanResult
+from .scanner_tasks import (
+    cancel, clauses, context, encryption, incremental, limiter, owasp, parsing, profiling, resolver, runner,
+    sessions,
+)
+from .scanner_tasks.context import HostUnreachable, ScanContext
+from .scanner_tasks.registry import check_meta
+
+try:
+    import fakeredis
+except ImportError:  # optional: without it the limiter's Redis script isn't exercised
+    fakeredis = None
+
+
+def _check(name, delay=0.0):
+    def check(domain, ctx):
+        time.sleep(delay)
+        return {"title": name, "status": "pass", "details": domain}
+    return check
+
+
+def _acheck(name, delay=0.0):
+    async def check(domain, ctx):
+        await asyncio.sleep(delay)
+        return {"title": name, "status": "pass", "details": domain}
+    return check
+
+
+def _tests(factory, count=12):
+    # Later checks finish first, so completion order is the reverse of list order
+    return [(f"check {i}", factory(f"check {i}", delay=(count - i) * 0.005)) for i in range(count)]
+
+
+class _TimingOutQueue(queue.Queue):
+    """A queue whose blocking get() always gives up, as if every report() raced the timeout."""
+
+    def get(self, block=True, timeout=None):
+        if block:
+            raise queue.Empty
+        return super().get(block=False)
+
+
+def _submit_and_finish(coro):
+    # Run the whole batch before run_checks_async starts reading the queue
+    future = Future()
+    future.set_result(asyncio.run(coro))
+    return future
+
+
+@override_settings(SCAN_RESULT_CACHE=False)
+class RunChecksTests(SimpleTestCase):
+
+    def assert_complete(self, tests, results):
+        self.assertEqual([r["title"] for r in results], [name for name, _ in tests])
+
+    def test_sequential_results_in_list_order(self):
+        tests = _tests(_check, count=4)
+        self.assert_complete(tests, runner.run_checks(tests, "example.com", ScanContext("example.com")))
+
+    def test_threaded_results_in_list_order(self):
+        tests = _tests(_check)
+        seen = []
+        results = runner.run_checks(tests, "example.com", ScanContext("example.com"), workers=4,
+                                    on_result=lambda done, name, result: seen.append((done, threading.get_ident())))
+        self.assert_complete(tests, results)
+        self.assertEqual([done for done, _ in seen], list(range(1, len(tests) + 1)))
+        self.assertEqual({thread for _, thread in seen}, {threading.get_ident()})  # on_result on the caller
+
+    def test_async_results_in_list_order(self):
+        for factory in (_acheck, _check):  # coroutines, and blocking checks through the adapter
+            tests = _tests(factory)
+            seen = []
+            results = runner.run_checks_async(tests, "example.com", ScanContext("example.com"), concurrency=4,
+                                              on_result=lambda done, name, result: seen.append(done))
+            self.assert_complete(tests, results)
+            self.assertEqual(seen, list(range(1, len(tests) + 1)))
+
+    def test_async_drains_reports_that_beat_the_timeout(self):
+        tests = _tests(_acheck, count=5)
+        with mock.patch.object(runner.queue, "Queue", _TimingOutQueue), \
+                mock.patch.object(runner.aio, "submit", _submit_and_finish):
+            results = runner.run_checks_async(tests, "example.com", ScanContext("example.com"))
+        self.assert_complete(tests, results)
+
+    def test_async_raises_when_checks_never_report(self):
+        tests = _tests(_acheck, count=3)
+
+        def submit_losing_one(coro):
+            coro.close()
+            future = Future()
+            future.set_result(None)
+            return future
+
+        with mock.patch.object(runner.aio, "submit", submit_losing_one):
+            with self.assertRaises(RuntimeError):
+                runner.run_checks_async(tests, "example.com", ScanContext("example.com"))
+
+    def test_async_reraises_when_the_loop_side_dies(self):
+        def submit_failing(coro):
+            coro.close()
+            future = Future()
+            future.set_exception(ValueError("boom"))
+            return future
+
+        with mock.patch.object(runner.aio, "submit", submit_failing):
+            with self.assertRaises(ValueError):
+                runner.run_checks_async(_tests(_acheck, count=2), "example.com", ScanContext("example.com"))
+
+    def test_exceptions_become_error_results(self):
+        def broken(domain, ctx):
+            raise ValueError("boom")
+
+        ctx = ScanContext("example.com")
+        for run in (runner.run_checks, runner.run_checks_async):
+            [result] = run([("broken", broken)], "example.com", ctx)
+            self.assertEqual((result["status"], result["details"]), ("error", "boom"))
+        self.assertEqual(ctx.profiles["broken"].exception, "ValueError")
+
+    def test_cancelled_scan_skips_every_check(self):
+        called = []
+        ctx = ScanContext("example.com")
+        ctx._cancelled = True
+        tests = [(f"check {i}", lambda domain, ctx, i=i: called.append(i)) for i in range(3)]
+        for run in (runner.run_checks, runner.run_checks_async):
+            results = run(tests, "example.com", ctx)
+            self.assertEqual([r["status"] for r in results], ["cancelled"] * 3)
+        self.assertEqual(called, [])
+
+    def test_unreachable_host_skips_network_checks_only(self):
+        @check_meta(network=False)
+        def offline(domain, ctx):
+            return {"title": "offline", "status": "pass"}
+
+        ctx = ScanContext("example.com")
+        ctx.trip("example.com", "3 connection failures")
+        tests = [("network", _check("network")), ("offline", offline)]
+        for run in (runner.run_checks, runner.run_checks_async):
+            network, local = run(tests, "example.com", ctx)
+            self.assertEqual(network["status"], "unreachable")
+            self.assertIn("3 connection failures", network["details"])
+            self.assertEqual(local["status"], "pass")
+
+    def test_breaker_tripping_mid_check_makes_it_unreachable(self):
+        def swallowing(domain, ctx):
+            ctx.trip("example.com", "3 connection failures")
+            try:
+                ctx.get(timeout=1)
+            except HostUnreachable:
+                raise
+            except Exception:
+                return {"title": "swallowing", "status": "fail", "details": "Site down"}
+
+        for run in (runner.run_checks, runner.run_checks_async):
+            [result] = run([("swallowing", swallowing)], "example.com", ScanContext("example.com"))
+            self.assertEqual(result["status"], "unreachable")
+
+    def test_results_of_checks_that_lost_a_request_are_not_cached(self):
+        def flaky(domain, ctx):
+            profiling.current().add(errors=1)  # as profiling.request() counts a failed fetch
+            return {"title": "flaky", "status": "pass"}
+
+        with mock.patch.object(runner.result_cache, "cacheable", return_value=True), \
+                mock.patch.object(runner.result_cache, "lookup", return_value=None), \
+                mock.patch.object(runner.result_cache, "store") as store:
+            for run in (runner.run_checks, runner.run_checks_async):
+                run([("flaky", flaky), ("steady", _check("steady"))], "example.com", ScanContext("example.com"))
+        self.assertEqual([c.args[2]["title"] for c in store.call_args_list], ["steady", "steady"])
+
+
+def _occurrences(keywords, text):
+    # Brute force: every (start, end, keyword) with keyword at text[start:end]
+    return sorted(
+        (start, start + len(keyword), keyword)
+        for keyword in set(keywords)
+        for start in range(len(text) - len(keyword) + 1)
+        if text.startswith(keyword, start)
+    )
+
+
+class AutomatonTests(SimpleTestCase):
+
+    def automata(self, keywords):
+        with mock.patch.object(clauses, "ahocorasick", None):
+            yield clauses.Automaton(keywords)  # the pure-Python fallback, always
+        if clauses.ahocorasick is not None:
+            yield clauses.Automaton(keywords)
+
+    def test_finds_what_brute_force_finds(self):
+        rng = random.Random(1234)
+        for _ in range(300):
+            # A tiny alphabet makes overlaps, shared prefixes and keywords inside keywords common
+            keywords = ["".join(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 6))]
+            text = "".join(rng.choice("abcd") for _ in range(rng.randint(0, 40)))
+            for automaton in self.automata(keywords):
+                found = list(automaton.finditer(text))
+                self.assertEqual(sorted(found), _occurrences(keywords, text), (keywords, text))
+                self.assertEqual([end for _, end, _ in found], sorted(end for _, end, _ in found))
+
+    def test_empty_inputs(self):
+        for automaton in self.automata([]):
+            self.assertEqual(list(automaton.finditer("abc")), [])
+        for automaton in self.automata(["a"]):
+            self.assertEqual(list(automaton.finditer("")), [])
+
+
+class ClauseSetTests(SimpleTestCase):
+
+    def test_keyword_shared_by_clauses_matches_each(self):
+        matches = clauses.POLICY.scan("contact our dpo")
+        self.assertIn("gdpr.dpo", matches)
+        self.assertIn("gdpr.terms", matches)
+        self.assertEqual(matches.get("gdpr.dpo"), [clauses.Match("gdpr.dpo", "dpo", 12, 15)])
+        self.assertEqual(matches.get("gdpr.terms"), [clauses.Match("gdpr.terms", "dpo", 12, 15)])
+        self.assertNotIn("ccpa", matches)
+
+    def test_keywords_are_lowercased(self):
+        clause_set = clauses.ClauseSet({"mfa": ("Two-Factor", "MFA")})
+        self.assertEqual(clause_set.scan("we use two-factor and mfa").keywords("mfa"), {"two-factor", "mfa"})
+
+    def test_snippet(self):
+        text = "x " * 50 + "our\n  data protection officer\tis" + " y" * 50
+        matches = clauses.POLICY.scan(text)
+        snippet = matches.snippet("gdpr.dpo", width=40)
+        self.assertIn("our data protection officer is", snippet)  # whitespace collapsed
+        self.assertTrue(snippet.startswith("…") and snippet.endswith("…"))
+        self.assertLessEqual(len(snippet), 40 + 2)
+        self.assertIsNone(matches.snippet("ccpa"))
+
+    def test_snippet_quotes_the_first_match_without_ellipsis_at_the_edges(self):
+        matches = clauses.POLICY.scan("ccpa rights for california residents")
+        self.assertEqual(matches.snippet("ccpa"), "ccpa rights for california residents")
+        self.assertEqual(matches.snippet("ccpa", width=4), "ccpa…")
+
+
+PAGE = """
+<html><head><title>Firm</title><script src="/app.js"></script><style>p { color: red }</style></head>
+<body>
+  <nav><a href="/menu">Menu</a></nav>
+  <p>Our <b>Privacy</b> notice.</p>
+  <a href="/privacy"> Privacy Policy </a>
+  <form action="https://firm.example/contact" method="POST"></form>
+  <form></form>
+  <script>var hidden = "not text";</script>
+  <div class="site-footer"><a href="/terms">Terms</a></div>
+  <footer><a href="/cookies">Cookies</a> footer text</footer>
+</body></html>
+"""
+
+
+class ParseTests(SimpleTestCase):
+
+    def installed_backends(self):
+        names = ["html.parser"]
+        if parsing.BS4_FEATURES == "lxml":
+            names.append("lxml")
+        if parsing.LexborHTMLParser is not None:
+            names.append("selectolax")
+        return names
+
+    def parse_with(self, name):
+        with override_settings(SCAN_HTML_BACKEND=name):
+            return parsing.parse(PAGE, "https://firm.example/")
+
+    def test_extracts(self):
+        page = self.parse_with("html.parser")
+        self.assertEqual([(a.href, a.text, a.footer) for a in page.anchors], [
+            ("/menu", "Menu", False), ("/privacy", "Privacy Policy", False),
+            ("/terms", "Terms", True), ("/cookies", "Cookies", True),
+        ])
+        self.assertEqual(page.forms, (parsing.Form("https://firm.example/contact", "post"), parsing.Form("", "get")))
+        self.assertEqual(page.scripts, ("/app.js",))
+        self.assertEqual(" ".join(page.text.split()), "firm our privacy notice. privacy policy terms")
+
+    def test_backends_agree(self):
+        pages = [self.parse_with(name) for name in self.installed_backends()]
+        if len(pages) < 2:
+            self.skipTest("only one HTML backend installed")
+        first = pages[0]
+        for page in pages[1:]:
+            self.assertEqual((page.anchors, page.forms, page.scripts), (first.anchors, first.forms, first.scripts), page.backend)
+            self.assertEqual(page.text.split(), first.text.split(), page.backend)
+
+    def test_missing_backend_falls_back(self):
+        with mock.patch.object(parsing, "LexborHTMLParser", None):
+            self.assertEqual(self.parse_with("selectolax").backend, parsing.BS4_FEATURES)
+
+
+def _verify_failed():
+    return ssl.SSLCertVerificationError(1, "[SSL: CERTIFICATE_VERIFY_FAILED] certificate verify failed: self-signed certificate")
+
+
+class _BadCertSession:
+    def request(self, method, url, **kwargs):
+        raise requests.exceptions.SSLError(_verify_failed())
+
+
+class _BadCertClient:
+    def build_request(self, method, url, **kwargs):
+        return httpx.Request(method, url)
+
+    async def send(self, request, **kwargs):
+        try:
+            raise _verify_failed()
+        except ssl.SSLError as e:
+            raise httpx.ConnectError(str(e), request=request) from e  # as httpx reports a failed handshake
+
+
+@override_settings(SCAN_RESULT_CACHE=False, SCAN_LIMITER=False, SCAN_BREAKER_THRESHOLD=3)
+class BreakerTests(TestCase):
+
+    def test_refused_connections_trip_it(self):
+        ctx = ScanContext("example.com")
+        for _ in range(3):
+            ctx._record("https://example.com/", requests.exceptions.ConnectionError("Connection refused"))
+        self.assertIn("3 connection failures", ctx.unreachable())
+
+    def test_a_bad_certificate_is_a_finding_not_an_outage(self):
+        firm_user = UserAccount.objects.create(username="owner", email="owner@firm.example")
+        firm = FirmProfile.objects.create(firm_name="Firm", email="firm@firm.example", domain="firm.example", user=firm_user)
+        scan = ScanResult.objects.create(firm=firm, domain="badcert.example", scan_id="badcert")
+        ctx = ScanContext("badcert.example", pins={"badcert.example": "192.0.2.1"})
+        tests = [
+            ("SSL/TLS", encryption.check_ssl_tls),
+            ("Headers", owasp.check_missing_security_headers),  # strict HEAD and GET
+            ("Admin", owasp.check_broken_access_control),       # strict async GETs
+            ("Injection", owasp.check_sql_injection),
+            ("Misconfig", owasp.check_security_misconfig),
+        ]
+        probe = encryption.TLSProbe(host="badcert.example", error=str(_verify_failed()))
+        with mock.patch.object(context, "get_session", _BadCertSession), \
+                mock.patch.object(context, "get_async_client", lambda verify=True: _BadCertClient()), \
+                mock.patch.object(encryption, "probe_tls", return_value=probe):
+            results = runner.run_checks(tests, "badcert.example", ctx)
+
+        self.assertIsNone(ctx.unreachable())
+        self.assertNotIn("unreachable", [r["status"] for r in results])
+        tasks._finalize_scan(scan, "badcert.example", results, None, [])
+        scan.refresh_from_db()
+        self.assertEqual(scan.status, "COMPLETED")
+        self.assertIsNotNone(scan.grade)
+        [tls] = [f for f in scan.get_raw_data()["findings"] if f["title"] == "SSL/TLS"]
+        self.assertEqual(tls["status"], "fail")
+
+
+class _Site:
+    """Stands in for the scan session: serves bodies by URL and records how each was requested."""
+
+    def __init__(self, pages):
+        self.pages = pages  # url -> body, or an exception to raise
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs.get("verify", True)))
+        body = self.pages[url]
+        if isinstance(body, Exception):
+            raise body
+        response = requests.Response()
+        response.status_code, response.url, response.raw = 200, url, io.BytesIO(body)
+        response.headers["Content-Type"] = "text/html"
+        response.elapsed = timedelta(0)
+        return response
+
+
+def _reads_policy(domain, ctx):
+    text = ctx.page_text("https://firm.example/privacy")  # lenient about certificates
+    return {"title": "Policy", "status": "pass" if "gdpr" in text else "fail"}
+
+
+@override_settings(SCAN_LIMITER=False, SCAN_RESULT_CACHE=False, SCAN_INCREMENTAL_MAX_AGE_DAYS=7)
+class IncrementalTests(SimpleTestCase):
+    url = "https://firm.example/privacy"
+
+    def scan(self, site, func=None):
+        ctx = ScanContext("firm.example", pins={"firm.example": "192.0.2.1"})
+        with mock.patch.object(context, "get_session", lambda: site):
+            results = runner.run_checks([("Policy", func or _reads_policy)], "firm.example", ctx)
+        return ctx, results
+
+    def baseline(self, body=b"<p>GDPR</p>"):
+        ctx, results = self.scan(_Site({self.url: body}))
+        record = incremental.build_record(ctx, [("Policy", _reads_policy)], results)
+        return incremental.Baseline(scan_id=1, inputs=record["inputs"], checks=record["checks"])
+
+    def revalidate(self, site, baseline):
+        ctx = ScanContext("firm.example", pins={"firm.example": "192.0.2.1"})
+        with mock.patch.object(context, "get_session", lambda: site):
+            incremental.revalidate(ctx, baseline)
+        return ctx, baseline.carry_forward([("Policy", _reads_policy)])
+
+    def test_input_keys_round_trip(self):
+        for verify in (True, False):
+            key = context.input_key("GET", "https://firm.example/a|b", True, verify)
+            self.assertEqual(context.parse_input_key(key), ("GET", "https://firm.example/a|b", True, verify))
+        # Keys stored before verify was part of them were all strict reads
+        self.assertEqual(context.parse_input_key("HEAD|0|https://firm.example/"), ("HEAD", "https://firm.example/", False, True))
+
+    def test_unchanged_inputs_carry_the_check_forward(self):
+        site = _Site({self.url: b"<p>GDPR</p>"})
+        ctx, carried = self.revalidate(site, self.baseline())
+        self.assertEqual(carried["Policy"]["carried_from"], 1)
+        self.assertEqual(site.calls, [("GET", self.url, False)])  # re-read as leniently as the check read it
+        with mock.patch.object(context, "get_session", lambda: site):
+            ctx.page_text(self.url)
+        self.assertEqual(len(site.calls), 1)  # a re-run check reuses the revalidation response
+
+    def test_changed_or_stale_inputs_do_not(self):
+        _, carried = self.revalidate(_Site({self.url: b"<p>No policy</p>"}), self.baseline())
+        self.assertEqual(carried, {})
+
+        baseline = self.baseline()
+        baseline.checks["Policy"]["evaluated_at"] = "2000-01-01T00:00:00+00:00"
+        _, carried = self.revalidate(_Site({self.url: b"<p>GDPR</p>"}), baseline)
+        self.assertEqual(carried, {})
+
+    def test_failed_inputs_are_not_recorded(self):
+        ctx, results = self.scan(_Site({self.url: requests.exceptions.ConnectionError("refused")}))
+        self.assertEqual(incremental.build_record(ctx, [("Policy", _reads_policy)], results), {"inputs": {}, "checks": {}})
+
+    def test_failed_revalidations_do_not_trip_the_breaker(self):
+        [(key, state)] = self.baseline().inputs.items()
+        site = _Site({self.url: requests.exceptions.ConnectionError("Connection refused")})
+        ctx = ScanContext("firm.example", pins={"firm.example": "192.0.2.1"})
+        with mock.patch.object(context, "get_session", lambda: site):
+            for _ in range(3):
+                self.assertFalse(ctx.revalidate(key, state))
+        self.assertIsNone(ctx.unreachable())  # the checks that re-run will find out for themselves
+
+
+@override_settings(SCAN_BATCH_MAX_INFLIGHT=3)
+class BatchTests(TestCase):
+
+    def setUp(self):
+        self.addCleanup(cache.clear)  # cancel flags outlive the rows, whose pks the next test reuses
+        self.firms = []
+        for name in ("a", "b"):
+            owner = UserAccount.objects.create(username=f"owner-{name}", email=f"owner@{name}.example")
+            firm = FirmProfile.objects.create(firm_name=name, email=f"firm@{name}.example", domain=f"{name}.example",
+                                              user=owner, subscription_tier="enterprise")
+            owner.firm = firm
+            owner.save(update_fields=["firm"])
+            self.firms.append(firm)
+
+    def batch(self, firm, count, status="PENDING"):
+        batch = ScanBatch.objects.create(firm=firm, total=count)
+        return [
+            ScanResult.objects.create(firm=firm, batch=batch, domain=f"{i}.{firm.domain}", status=status,
+                                      scan_id=f"{firm.pk}-{batch.pk}-{i}")
+            for i in range(count)
+        ]
+
+    def pump(self):
+        with mock.patch.object(tasks.run_compliance_scan, "delay") as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            tasks.pump_batches()
+        return [call.args[0] for call in delay.call_args_list]
+
+    def test_slots_are_shared_round_robin_across_firms(self):
+        a = self.batch(self.firms[0], 4)
+        b = self.batch(self.firms[1], 2)
+        self.assertEqual(self.pump(), [a[0].pk, b[0].pk, a[1].pk])
+        self.assertEqual(self.pump(), [])  # every slot is taken
+        ScanResult.objects.filter(pk=b[0].pk).update(status="COMPLETED")
+        self.assertEqual(self.pump(), [a[2].pk])  # each pump starts again from the oldest batch
+
+    def test_a_scan_lost_with_its_worker_gives_up_its_slot(self):
+        lost = self.batch(self.firms[0], 3, status="RUNNING")
+        ScanResult.objects.filter(pk=lost[0].pk).update(started_at=timezone.now() - timedelta(days=1))
+        ScanResult.objects.filter(pk__in=[s.pk for s in lost[1:]]).update(started_at=timezone.now())
+        waiting = self.batch(self.firms[1], 1)
+
+        self.assertEqual(self.pump(), [waiting[0].pk])
+        lost[0].refresh_from_db()
+        self.assertEqual((lost[0].status, lost[0].current_step), ("FAILED", "Scan timed out"))
+        self.assertTrue(cancel.is_cancelled(lost[0].pk))  # in case its worker is merely slow
+        self.assertEqual(ScanResult.objects.filter(status="RUNNING").count(), 3)
+
+    def test_cancelling_the_last_queued_scan_completes_the_batch(self):
+        done, queued = self.batch(self.firms[0], 2)
+        ScanResult.objects.filter(pk=done.pk).update(status="COMPLETED")
+        self.client.force_login(self.firms[0].users.get())
+        with mock.patch.object(tasks.run_compliance_scan, "delay"), self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("scanner:cancel", args=[queued.pk]))
+        self.assertEqual(ScanBatch.objects.get().status, "COMPLETED")
+
+    def test_malformed_json_is_rejected(self):
+        self.client.force_login(self.firms[0].users.get())
+        for body in (["a.com"], {"domains": ["a.com", 1]}, {"domains": {"a.com": 1}}, {"domains": ["a.com"], "name": 1}):
+            response = self.client.post(reverse("scanner:bulk_scan"), body, content_type="application/json")
+            self.assertEqual(response.status_code, 400, body)
+        self.assertFalse(ScanBatch.objects.exists())
+
+
+@override_settings(SCAN_EXECUTION_MODE="sequential", SCAN_HEAVY_QUEUE="", SCAN_INCREMENTAL=False,
+                   SCAN_RESULT_CACHE=False)
+class HeavyToolTests(TestCase):
+
+    def test_without_a_heavy_worker_tools_run_in_the_scan(self):
+        owner = UserAccount.objects.create(username="owner", email="owner@firm.example")
+        firm = FirmProfile.objects.create(firm_name="Firm", email="firm@firm.example", domain="firm.example", user=owner)
+        scan = ScanResult.objects.create(firm=firm, domain="firm.example", scan_id="heavy")
+        tests = [("Headers", _check("Headers")), ("Nmap", check_meta(cost="heavy")(_check("Nmap")))]
+        reach = mock.Mock(reachable=True, summary=lambda: "reachable")
+        resolution = mock.Mock(addresses=[], address="firm.example")
+        with mock.patch.dict(tasks.TIERS, {"free": tests}), \
+                mock.patch.object(tasks, "connect_to_external_scanner", return_value=None), \
+                mock.patch.object(tasks, "preflight", return_value=reach), \
+                mock.patch.object(ScanContext, "resolve", return_value=resolution), \
+                mock.patch.object(tasks, "_dispatch_groups") as dispatch, \
+                mock.patch.object(tasks.time, "sleep"):
+            tasks.run_compliance_scan(scan.pk)
+
+        dispatch.assert_not_called()
+        scan.refresh_from_db()
+        self.assertEqual(scan.status, "COMPLETED")
+        self.assertIn("Nmap: PASS", scan.scan_log)
+
+
+class _Hello(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "5")
+        self.end_headers()
+        self.wfile.write(self.headers["Host"].split(":")[0].encode()[:5])
+
+    def log_message(self, *args):
+        pass
+
+
+class PinningTests(SimpleTestCase):
+
+    def setUp(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _Hello)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.url = f"http://site.invalid:{server.server_port}/"
+        self.ctx = ScanContext("site.invalid", pins={"site.invalid": "127.0.0.1"})
+
+    def test_the_scan_session_connects_to_the_pinned_address(self):
+        with resolver.pinned(self.ctx):
+            response = sessions.get_session().get(self.url, timeout=5)
+        self.assertEqual(response.text, "site.")  # the Host header keeps the name
+
+    def test_other_sessions_resolve_as_usual(self):
+        # Stripe, OTLP and the external scanner go through plain requests, pinned scan or not
+        with resolver.pinned(self.ctx), self.assertRaises(requests.exceptions.ConnectionError):
+            requests.Session().get(self.url, timeout=5)
+
+
+@override_settings(SCAN_LIMITER=True, SCAN_HOST_RATE=5, SCAN_HOST_BURST=2, SCAN_TIER_RATE={"free": 100},
+                   SCAN_MAX_INFLIGHT=50, SCAN_LIMITER_MAX_WAIT=5)
+class LimiterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.addCleanup(setattr, limiter, "_down_until", 0.0)
+        limiter._down_until = 0.0
+
+    def use(self, client, script=None):
+        script = script or client.register_script(limiter._ACQUIRE)
+        patcher = mock.patch.object(limiter, "_redis", return_value=(client, script))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @unittest.skipUnless(fakeredis, "needs fakeredis[lua]")
+    def test_each_host_gets_its_burst_then_waits_for_a_token(self):
+        self.use(fakeredis.FakeRedis())
+        self.assertEqual([limiter._try_acquire("a.example", "free", str(i)) for i in range(2)], [0, 0])
+        wait = limiter._try_acquire("a.example", "free", "2")
+        self.assertTrue(0 < wait <= 1 / 5, wait)
+        self.assertEqual(limiter._try_acquire("b.example", "free", "3"), 0)
+
+    @unittest.skipUnless(fakeredis, "needs fakeredis[lua]")
+    @override_settings(SCAN_HOST_BURST=10, SCAN_MAX_INFLIGHT=2)
+    def test_in_flight_requests_are_capped_until_released(self):
+        self.use(fakeredis.FakeRedis())
+        self.assertEqual([limiter._try_acquire(f"{i}.example", "free", str(i)) for i in range(2)], [0, 0])
+        self.assertEqual(limiter._try_acquire("2.example", "free", "2"), 0.05)
+        limiter._release("0")
+        self.assertEqual(limiter._try_acquire("2.example", "free", "2"), 0)
+
+    @unittest.skipUnless(fakeredis, "needs fakeredis[lua]")
+    def test_retry_after_pauses_the_host_for_everyone(self):
+        self.use(fakeredis.FakeRedis())
+        limiter.observe("https://a.example/x", 200, "30")
+        limiter.observe("https://a.example/x", 429, "Wed, 21 Oct 2026 07:28:00 GMT")
+        self.assertEqual(limiter._try_acquire("a.example", "free", "0"), 0)
+
+        limiter.observe("https://a.example/x", 429, "2")
+        self.assertTrue(1.5 < limiter._try_acquire("a.example", "free", "1") <= 2)
+        self.assertEqual(limiter._try_acquire("b.example", "free", "2"), 0)
+
+    @unittest.skipUnless(fakeredis, "needs fakeredis[lua]")
+    def test_one_tool_run_per_host(self):
+        self.use(fakeredis.FakeRedis())
+        order = []
+
+        def second():
+            with limiter.exclusive_tool("a.example"):
+                order.append("second")
+
+        with limiter.exclusive_tool("A.example"):
+            thread = threading.Thread(target=second)
+            thread.start()
+            time.sleep(0.3)
+            order.append("first")
+        thread.join(timeout=5)
+        self.assertEqual(order, ["first", "second"])
+
+    def test_a_redis_outage_lets_requests_through_unthrottled_for_a_while(self):
+        script = mock.Mock(side_effect=redis.ConnectionError("down"))
+        self.use(mock.Mock(), script)
+        with mock.patch.object(limiter.time, "sleep") as sleep:
+            for _ in range(3):
+                with limiter.permit("https://a.example/", "free"):
+                    pass
+            with limiter.exclusive_tool("a.example"):
+                pass
+        sleep.assert_not_called()
+        self.assertEqual(script.call_count, 1)  # later permits don't pay the timeout again
+
+        limiter._down_until = time.monotonic() - 1  # RETRY_REDIS_AFTER is up
+        with limiter.permit("https://a.example/", "free"):
+            pass
+        self.assertEqual(script.call_count, 2)
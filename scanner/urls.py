@@ -20,11 +20,21 @@ urlpatterns = [
     # Scan Details + HTMX Partial
     path('scan/<int:pk>/', views.ScanStatusView.as_view(), name='scan_status'),
     path('scan/<int:pk>/partial/', views.scan_status_partial, name='scan_status_partial'),
+    path('scan/<int:pk>/trace/', views.ScanTraceView.as_view(), name='scan_trace'),
 
     # PDF Generation
     path('scan/<int:pk>/pdf/', views.generate_pdf, name='pdf'),
 
+    # Bulk (portfolio) scans
+    path('bulk/', views.BulkScanView.as_view(), name='bulk_scan'),
+    path('batch/<int:pk>/', views.BatchStatusView.as_view(), name='batch_status'),
+    path('batch/<int:pk>/partial/', views.batch_status_partial, name='batch_status_partial'),
+    path('batch/<int:pk>/progress/', views.batch_progress, name='batch_progress'),
+
     # Actions
     path('scan/<int:pk>/cancel/', views.CancelScanView.as_view(), name='cancel'),
     path('scan/<int:pk>/retry/', views.RetryScanView.as_view(), name='retry'),
+
+    # Prometheus scrape target
+    path('metrics/', views.prometheus_metrics, name='metrics'),
 ]
\ No newline at end of file
@@ -1,6 +1,7 @@
 # scanner/views.py
 from django.views.generic import ListView, DetailView, View, TemplateView
-from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.contrib.auth.decorators import login_required
 from django.urls import reverse, reverse_lazy
 from django_htmx.http import HttpResponseLocation, HttpResponseClientRefresh
 from django_ratelimit.decorators import ratelimit
@@ -16,17 +17,37 @@ import json
 import uuid
 import re
 import io
+import hmac
+import time
 from weasyprint import HTML
 from django.core.files.base import ContentFile
 
-from .models import ScanResult
-from .tasks import run_compliance_scan
+from django.conf import settings
+from .models import ScanResult, ScanBatch
+from .tasks import run_compliance_scan, pump_batches, _release_batch_slot
+from .scanner_tasks.cancel import request_cancel
+from .scanner_tasks import metrics, tracing
 from reports.models import ComplianceReport
 
 
 
+DOMAIN_RE = re.compile(r'^[a-z0-9-]+(\.[a-z0-9-]+)*\.[a-z]{2,}$')
+
+
 def keep_alive(request):
     return HttpResponse("OK")  # Call this every 10min via cron or external ping
+
+
+# === PROMETHEUS METRICS (scanner_tasks/metrics.py) ===
+def prometheus_metrics(request):
+    token = settings.SCAN_METRICS_TOKEN
+    if token:
+        allowed = hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+    else:
+        allowed = request.user.is_staff
+    if not allowed:
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
     
     
 
@@ -76,6 +97,7 @@ class RunScanModalView(LoginRequiredMixin, TemplateView):
 @method_decorator(ratelimit(key='user', rate='2/h', method='POST', block=True), name='dispatch')
 class StartScanView(LoginRequiredMixin, View):
     
+    @tracing.traced("StartScanView.post", stage="request")
     def post(self, request):
         
         domain = request.POST.get('domain', '').strip().lower()
@@ -83,7 +105,7 @@ class StartScanView(LoginRequiredMixin, View):
             messages.error(request, "Please enter a domain.")
             return redirect('scanner:run_scan')
 
-        if not re.match(r'^[a-z0-9-]+(\.[a-z0-9-]+)*\.[a-z]{2,}$', domain):
+        if not DOMAIN_RE.match(domain):
             messages.error(request, "Invalid domain format.")
             return redirect('scanner:run_scan')
 
@@ -101,11 +123,13 @@ class StartScanView(LoginRequiredMixin, View):
             status='PENDING',
             scan_id=str(uuid.uuid4())[:8]
         )
+        tracing.current().set(scan=scan.pk, domain=domain)
         #print(scan.id)
         #print(scan.status)
 
         
-        run_compliance_scan.delay(scan.pk)
+        # "Force fresh scan" skips results other scans of this site cached in the last minutes/hours
+        run_compliance_scan.delay(scan.pk, fresh=request.POST.get('fresh') == 'on')
         #messages.success(request, f"Scan started for <strong>{domain}</strong>.")
         messages.success(request, f"Scan started for {domain}", extra_tags="scan_started")
         
@@ -116,6 +140,144 @@ class StartScanView(LoginRequiredMixin, View):
         return redirect('scanner:dashboard')
 
 
+# === BULK (PORTFOLIO) SCAN: form upload or JSON ===
+def _parse_domains(raw):
+    """Split pasted / uploaded text into (unique valid domains, invalid entries)."""
+    valid, invalid = [], []
+    for token in re.split(r'[\s,;]+', raw):
+        domain = token.strip().lower().replace("https://", "").replace("http://", "").split("/")[0]
+        if not domain:
+            continue
+        if not DOMAIN_RE.match(domain):
+            invalid.append(token)
+        elif domain not in valid:
+            valid.append(domain)
+    return valid, invalid
+
+
+def _batch_quota(firm):
+    # Domains the firm's plan may have queued or running in batches at once (0: no bulk scans)
+    tier = firm.subscription_tier.lower() if firm else 'free'
+    return settings.SCAN_BATCH_MAX_DOMAINS.get(tier, 0)
+
+
+@method_decorator(ratelimit(key='user', rate='10/h', method='POST', block=True), name='dispatch')
+class BulkScanView(LoginRequiredMixin, View):
+    """
+    Scan a list of domains as one batch. Accepts a form (textarea and/or an
+    uploaded .txt/.csv) or JSON: {"name": "...", "domains": ["a.com", ...]}.
+    Scans are created in one bulk_create and started by pump_batches.
+    Only plans with a batch quota (SCAN_BATCH_MAX_DOMAINS) may use it.
+    """
+
+    def get(self, request):
+        quota = _batch_quota(request.user.firm)
+        if not quota:
+            messages.error(request, "Bulk scans are not included in your plan.")
+            return redirect('scanner:dashboard')
+        return render(request, 'scanner/bulk_scan.html', {"max_domains": quota})
+
+    def post(self, request):
+        as_json = request.content_type == 'application/json'
+        firm = request.user.firm
+        quota = _batch_quota(firm)
+        if not quota:
+            if as_json:
+                return JsonResponse({'error': 'Bulk scans are not included in your plan.'}, status=403)
+            messages.error(request, "Bulk scans are not included in your plan.")
+            return redirect('scanner:dashboard')
+        if as_json:
+            try:
+                payload = json.loads(request.body)
+            except ValueError:
+                return JsonResponse({'error': 'Invalid JSON'}, status=400)
+            if not isinstance(payload, dict):
+                payload = {'domains': None}
+            entries = payload.get('domains', [])
+            if isinstance(entries, str):
+                entries = [entries]
+            name = payload.get('name') or ''
+            if not isinstance(entries, list) or not all(isinstance(e, str) for e in entries) or not isinstance(name, str):
+                return JsonResponse({'error': 'Expected {"name": "...", "domains": ["a.com", ...]}'}, status=400)
+            name = name.strip()[:200]
+            raw = "\n".join(entries)
+        else:
+            name = request.POST.get('name', '').strip()[:200]
+            raw = request.POST.get('domains', '')
+            upload = request.FILES.get('domains_file')
+            if upload:
+                raw += "\n" + upload.read().decode('utf-8-sig', errors='ignore')
+
+        domains, invalid = _parse_domains(raw)
+        # Earlier batches still working count too, so the rate limit can't multiply the quota
+        queued = ScanResult.objects.filter(firm=firm, batch__isnull=False, status__in=['PENDING', 'RUNNING']).count()
+        error = None
+        if not domains:
+            error = "No valid domains found."
+        elif len(domains) > quota - queued:
+            error = (f"At most {quota} domains in batches at once: {queued} still queued or running, "
+                     f"{len(domains)} given.")
+        if error:
+            if as_json:
+                return JsonResponse({'error': error, 'invalid': invalid}, status=400)
+            messages.error(request, error)
+            return redirect('scanner:bulk_scan')
+
+        batch = ScanBatch.objects.create(firm=firm, name=name, total=len(domains))
+        ScanResult.objects.bulk_create([
+            ScanResult(firm=firm, batch=batch, domain=domain, status='PENDING', scan_id=str(uuid.uuid4())[:8])
+            for domain in domains
+        ], batch_size=500)
+        pump_batches.delay()
+
+        if as_json:
+            return JsonResponse({
+                'batch_id': batch.pk,
+                'total': batch.total,
+                'invalid': invalid,
+                'progress_url': reverse('scanner:batch_progress', args=[batch.pk]),
+            }, status=201)
+        messages.success(request, f"Batch of {batch.total} scans queued", extra_tags="scan_started")
+        if invalid:
+            messages.warning(request, f"Skipped {len(invalid)} invalid entries.")
+        return redirect('scanner:batch_status', pk=batch.pk)
+
+
+class BatchStatusView(LoginRequiredMixin, DetailView):
+    model = ScanBatch
+    template_name = 'scanner/batch_status.html'
+    context_object_name = 'batch'
+
+    def get_queryset(self):
+        return ScanBatch.objects.filter(firm=self.request.user.firm)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["summary"] = self.object.aggregate_progress()
+        context["scans"] = _batch_scans(self.object)
+        return context
+
+
+def _batch_scans(batch):
+    return batch.scans.only('id', 'domain', 'status', 'progress', 'grade', 'current_step').order_by('pk')
+
+
+@login_required
+def batch_status_partial(request, pk):
+    batch = get_object_or_404(ScanBatch, pk=pk, firm=request.user.firm)
+    return render(request, 'scanner/partials/batch_progress.html', {
+        'batch': batch, 'summary': batch.aggregate_progress(), 'scans': _batch_scans(batch),
+    })
+
+
+@login_required
+def batch_progress(request, pk):
+    """Aggregate progress of a batch as JSON (for API clients)."""
+    batch = get_object_or_404(ScanBatch, pk=pk, firm=request.user.firm)
+    return JsonResponse({'batch_id': batch.pk, 'name': batch.name, 'status': batch.status,
+                         **batch.aggregate_progress()})
+
+
 # === SCAN STATUS (Real-Time via HTMX) ===
 class ScanStatusView(LoginRequiredMixin, DetailView):
     model = ScanResult
@@ -132,6 +294,31 @@ class ScanStatusView(LoginRequiredMixin, DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["active_statuses"] = ("RUNNING", "PENDING")
+        profile = self.object.profile
+        if self.request.user.is_staff and profile:
+            context["profile_scan"] = profile.get("scan", {})
+            context["profile_checks"] = sorted(
+                ({"name": name, **row} for name, row in profile.get("checks", {}).items()),
+                key=lambda row: row["wall_ms"], reverse=True,
+            )
+        return context
+
+
+# === SCAN TRACE (staff): request → queue → checks → PDF, as a waterfall ===
+class ScanTraceView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
+    model = ScanResult
+    template_name = 'scanner/scan_trace.html'
+    context_object_name = 'scan'
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get_queryset(self):
+        return ScanResult.objects.filter(firm=self.request.user.firm)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["spans"], context["totals"] = tracing.timeline(tracing.load(self.object.trace_id))
         return context
 
 # === HTMX PARTIAL: Progress Update ===
@@ -158,9 +345,15 @@ class CancelScanView(LoginRequiredMixin, View):
     def post(self, request, pk):
         scan = get_object_or_404(ScanResult, pk=pk, firm=request.user.firm)
         if scan.status in ['PENDING', 'RUNNING']:
+            # Flag first: the running task polls it between checks and kills nmap/nikto
+            request_cancel(scan.pk)
+            queued = scan.status == 'PENDING'
             scan.status = 'CANCELLED'
             scan.scan_log += '\n[Cancelled by user]'
             scan.save()
+            if queued:
+                # No task will run for it, so nothing else pumps: its batch could never complete
+                _release_batch_slot(scan)
         return HttpResponseClientRefresh()
 
 
@@ -234,7 +427,11 @@ def generate_pdf(request, pk):
     html = HTML(string=html_string, base_url=request.build_absolute_uri('/'))
 
     pdf_file = io.BytesIO()
-    html.write_pdf(pdf_file)
+    started = time.perf_counter()
+    with tracing.span("write_pdf", stage="render", scan=scan.pk):
+        html.write_pdf(pdf_file)
+    metrics.observe("pdf_render_seconds", time.perf_counter() - started, source="download")
+    metrics.observe("pdf_size_bytes", pdf_file.tell(), source="download")
 
     response = HttpResponse(content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="Compliance_Report_{scan.domain}_{scan.scan_id}.pdf"'